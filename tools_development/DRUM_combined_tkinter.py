@@ -21,20 +21,25 @@ authors: Melinda Kernik and Valerie Collins
 """
 
 ##import necessary modules and return a message if any are not available
+import sys
+
 try:
-    import urllib.request
-    import math
-    from os import mkdir
+    from os import makedirs, mkdir
+    from os import path
     import tkinter.filedialog
     import tkinter.messagebox
     from tkinter import LabelFrame
     from tkinter import ttk
-    from bs4 import BeautifulSoup
     from string import Template
     from datetime import datetime
+    #These modules are in the tools_development folder, next to this script
+    import dspace_backend
+    from bitstream_writers import safe_relative_path
+    from file_summary import convert_size
+    import retry
 
-except Exception as e:
-    print(e)
+except ImportError as e:
+    sys.exit("The tool cannot start because a module is missing: " + str(e) + ". Keep this script in the tools_development folder, with the other scripts.")
 
 #Create message box if there is an error
 def show_error(text):
@@ -44,45 +49,26 @@ def show_error(text):
 def show_results(text):
     tkinter.messagebox.showinfo("Results", text)
 
-def convert_size(size_bytes):
-    """Convert file size in bytes to a more human readable format"""
-
-    if size_bytes == 0:
-        return "0B"
-    size_name = ("B", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB")
-    i = int(math.floor(math.log(size_bytes, 1024)))
-    p = math.pow(1024, i)
-    s = round(size_bytes / p, 2)
-    return "%s %s" % (s, size_name[i])
-
 
 def get_urls(handle_url):
+    """Find the item of a handle URL. Return the handle, the handle number and the item (see dspace_backend.py)."""
 
-    #Use the handle URL to construct a URL to get to the Dspace endpoint for the item
+    #Use the handle URL to find the Dspace endpoint for the item
     handle_split = handle_url.split ("/") [-2:]
     handle = str(handle_split[0]) + "/" + str(handle_split[1])
-    url = "https://conservancy.umn.edu/rest/handle/" + handle
 
-    #Try to access the Dspace endpoint. Return an error message and exit the script if the URL cannot be opened.
+    #Try to access the Dspace endpoint. Return an error message and exit the script if the item cannot be read.
     try:
-        response = urllib.request.urlopen(url)
+        item_dict = dspace_backend.get_backend("6").find_item(handle)
     except Exception as e:
-        show_error(url + " could not be opened. (" + str(e) + ")")
+        show_error(handle + " could not be opened. (" + str(e) + ")")
+        raise
 
-    #Read in the content at the item API endpoint and get the internal id for the item
-    presoup = BeautifulSoup(response, 'lxml')
-    item_info = presoup.p.text
-    item_dict = eval(item_info.replace('null', '"null"'))
-
-    internal_id = item_dict["id"]
-    
-    bitstream_url = "https://conservancy.umn.edu/rest/items/" + str(internal_id) + "/bitstreams?limit=250"
-    metadata_url = "https://conservancy.umn.edu/rest/items/" + str(internal_id) + "/metadata"
-    return handle, handle_split[1], bitstream_url, metadata_url
+    return handle, handle_split[1], item_dict
 
 
 def download_files (handle_url, outputDir):
-    full_handle, end_handle, bitstream_url, metadata_url = get_urls(handle_url)
+    full_handle, end_handle, item_dict = get_urls(handle_url)
     
     #Create a folder with the unique handle number of the submission. Return an error if that folder already exists.
     try:
@@ -94,46 +80,31 @@ def download_files (handle_url, outputDir):
         #print ("Folder (" + download_path + ") already exists.")
     
     
-    #Read in the content at the bitstream API endpoint. Default limit is 20 items per page.
-    #Extended to 250 to account for larger data submissions.
-    response = urllib.request.urlopen(bitstream_url)
-    item_soup = BeautifulSoup(response, 'lxml')
-    bitstream = item_soup.p.text
-    list_bitstream = eval(bitstream.replace('null', '"null"'))
+    #Read every page of the bitstream list (see dspace_backend.py)
+    list_bitstream = dspace_backend.get_backend("6").bitstream_entries(item_dict)
     
     #For each bitstream in the bundle "ORIGINAL", construct a download link and request the files    
     for x in list_bitstream:
         if x['bundleName'] == "ORIGINAL":
             try:
                 filename = x['name']
-                sequenceId = x['sequenceId']
-                #check for white spaces in bitstream filename & replace if needed
-                if ' ' in filename:
-                    newfilename = filename.replace(' ', '%20')
-                    print("New filename: " + newfilename)
-                    download = "https://conservancy.umn.edu/bitstream/handle/" + full_handle + "/" + newfilename + "?sequence=" + str(sequenceId) + "&isAllowed=y/"
-                    print (download)
-                    urllib.request.urlretrieve(download, (download_path + "\\" + filename))
-                else:
-                    download = "https://conservancy.umn.edu/bitstream/handle/" + full_handle + "/" + filename + "?sequence=" + str(sequenceId) + "&isAllowed=y/"
-                    print (download)
-                    urllib.request.urlretrieve(download, (download_path + "\\" + filename))
-            except:
-                print ("Cannot download: " + filename + ". There may be spaces in the file name.  Please try downloading manually." )
-                pass
+                #Folders in the file name are kept, but the file cannot be saved outside the submission folder
+                file_path = path.join(download_path, *safe_relative_path(filename).split("/"))
+                makedirs(path.dirname(file_path), exist_ok=True)
+                download = dspace_backend.get_backend("6").handle_download_url(full_handle, x)
+                print (download)
+                retry.urlretrieve(download, file_path)
+            except Exception as e:
+                print ("Cannot download: " + filename + ". Please try downloading manually. (" + str(e) + ")")
     show_results("Finished downloading files for: " + handle_url)
 
 def metadata_log(handle_url, outputDir):
 
     ###Get API endpoint urls based on the submission handle
-    full_handle, end_handle, bitstream_url, metadata_url = get_urls(handle_url)
+    full_handle, end_handle, item_dict = get_urls(handle_url)
 
-    #Read in the content at the bitstream API endpoint. Default limit is 20 items per page.
-    #Extended to 250 to account for larger data submissions.
-    response = urllib.request.urlopen(bitstream_url)
-    item_soup = BeautifulSoup(response, 'lxml')
-    bitstream = item_soup.p.text
-    list_bitstream = eval(bitstream.replace('null', '"null"'))
+    #Read every page of the bitstream list (see dspace_backend.py)
+    list_bitstream = dspace_backend.get_backend("6").bitstream_entries(item_dict)
 
     #Create the item bitstream section of the log
     bitstream_string = ""
@@ -143,10 +114,7 @@ def metadata_log(handle_url, outputDir):
 
 
     #Read in the content at the metadata endpoint
-    response = urllib.request.urlopen(metadata_url)
-    soup = BeautifulSoup(response, 'lxml')
-    metadata = soup.p.string
-    list_metadata = eval(metadata.replace('null', '"null"'))
+    list_metadata = dspace_backend.get_backend("6").metadata(item_dict)
 
     #Create the original metadata section of the log
     metadata_string = ""
@@ -200,13 +168,10 @@ Original Metadata from Author:
 def automated_readme (handle_url, outputDir):
     
     ###Get API endpoint urls based on the submission handle
-    full_handle, end_handle, bitstream_url, metadata_url = get_urls(handle_url)
+    full_handle, end_handle, item_dict = get_urls(handle_url)
 
     #Read in the content at the metadata endpoint
-    response = urllib.request.urlopen(metadata_url)
-    soup = BeautifulSoup(response, 'lxml')
-    metadata = soup.p.string
-    list_metadata = eval(metadata.replace('null', '"null"'))
+    list_metadata = dspace_backend.get_backend("6").metadata(item_dict)
 
     #Create an dictionary to be filled with metadata values from the submission
     metadata_dict = {'readme_date': str(datetime.now().strftime("%Y-%m-%d")),
@@ -303,12 +268,8 @@ def automated_readme (handle_url, outputDir):
 
     ###Get item bitstream information from the submission
 
-    #Read in the content at the bitstream endpoint. Default limit is 20 items per page.
-    #Extended to 250 to account for larger data submissions.
-    response = urllib.request.urlopen(bitstream_url)
-    item_soup = BeautifulSoup(response, 'lxml')
-    bitstream = item_soup.p.text
-    list_bitstream = eval(bitstream.replace('null', '"null"'))
+    #Read every page of the bitstream list (see dspace_backend.py)
+    list_bitstream = dspace_backend.get_backend("6").bitstream_entries(item_dict)
 
     #Create the "File List" section of the readme and add it to the metadata dictionary
     file_list_string = "File List\n\n"
@@ -406,13 +367,10 @@ DATA-SPECIFIC INFORMATION FOR: """ + item + """\n-------------------------------
 def datacite_xml(handle_url, outputDir):
     
     ###Get API endpoint urls based on the submission handle
-    full_handle, end_handle, bitstream_url, metadata_url = get_urls(handle_url)
+    full_handle, end_handle, item_dict = get_urls(handle_url)
     
     #Read in the content at the metadata endpoint
-    response = urllib.request.urlopen(metadata_url)
-    soup = BeautifulSoup(response, 'lxml')
-    metadata = soup.p.string
-    list_metadata = eval(metadata.replace('null', '"null"'))
+    list_metadata = dspace_backend.get_backend("6").metadata(item_dict)
     
     
     #Create a list to hold the multi-valued metadata element "author"
@@ -5,12 +5,16 @@ script name:DRUM_downloadFiles_Dspace7.py
 inputs: -DRUM URL, handle, or DOI (i.e. https://conservancy.umn.edu/items/ad4695da-3d2a-4f74-8097-8c68418fba33, https://hdl.handle.net/11299/226188, or https://doi.org/10.13020/ksjb-4w36)
         -directory path for where files should be downloaded
 outputs: -folder named using the last 6 numbers of the submission handle
-         -downloaded content files from the DRUM submission
+         -downloaded content files from the DRUM submission (optionally as a BagIt bag)
 
 description: This tkinter script tool creates a folder named using the last
 6 numbers of the handle and downloads the content files from the
-submission into that folder. Known limitation: it cannot download files that
-are embargoed on the record.
+submission into that folder. If "Create BagIt bag" is checked, the folder is
+written as a BagIt bag: the files are saved in data/ and the manifests are
+computed while the files download. Embargoed and restricted files are skipped
+unless you "Log in" with a DRUM account that has access to them first.
+
+The download code is in ../dspace7_download.py and ../bitstream_writers.py
 
 Last modified: July 2024
 Original script: June 2022
@@ -19,32 +23,24 @@ Original script: June 2022
 """
 
 ##import necessary modules and return a message if any are not available
+import sys
+from os import path
+#The download code is shared with the other tools in the tools_development folder
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+
 try:
-    import urllib.request
-    import requests
-    import time
-    from math import floor
-    from math import log
-    from math import pow
-    from os import mkdir
-    from os import path
+    from os import mkdir, rmdir
+    from dspace_session import get_session, login, LoginError
+    from bitstream_writers import BagWriter
+    from dspace7_download import downloadFiles, get_item_api_url
+    from download_plan import InsufficientSpaceError
     import tkinter.filedialog
     import tkinter.messagebox
+    import tkinter.simpledialog
     from tkinter import ttk
     
-except Exception as e:
-    print(e)
-
-def convert_size(size_bytes):
-    """Convert file size in bytes to a more human readable format"""
-    
-    if size_bytes == 0:
-        return "0B"
-    size_name = ("B", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB")
-    i = int(floor(log(size_bytes, 1024)))
-    p = pow(1024, i)
-    s = round(size_bytes / p, 2)
-    return "%s %s" % (s, size_name[i])
+except ImportError as e:
+    sys.exit("The tool cannot start because a module is missing: " + str(e))
 
 #Create message box if there is an error
 def show_error(text):
@@ -67,25 +63,14 @@ def validate_input(link_url, outputDir):
     
     print ("Requesting information from DRUM API...")    
     
-    #Take the input entered by the notebook user and extract the item_uuid
-    drum_url_split = link_url.split ("/") [-2:]
-    item_uuid_test = str(drum_url_split[0])
-    if item_uuid_test == "items":
-      item_uuid = str(drum_url_split[1])
-    else:
-      resolved_url = requests.get(link_url)
-      r_new_url = resolved_url.url
-      drum_url_split = r_new_url.split ("/") [-2:]
-      item_uuid = str(drum_url_split[1])
-    
-    #Construct the link to the API endpoint
-    item_api_url = "https://conservancy.umn.edu/server/api/core/items/" + item_uuid
+    #Take the input entered by the user and construct the link to the API endpoint
+    item_api_url = get_item_api_url(link_url)
     
     #Try to access the Dspace endpoint. Return an error message and stop if the URL cannot be opened.
     try:
-        response = urllib.request.urlopen(item_api_url)
+        response = get_session().get(item_api_url)
+        response.raise_for_status()
         link_url_valid = True
-        response = requests.get(item_api_url)
         itemData = response.json()
         handle_uri = itemData['metadata']['dc.identifier.uri'][0]['value']
         handle_split = handle_uri.split ("/") [-2:]
@@ -113,60 +98,31 @@ def validate_input(link_url, outputDir):
         return True, item_api_url, download_path
 
 
-def downloadFiles (link_url, item_api_url, download_path):
-    """
-    Scrape information about the deposited files from the item bitstream API endpoint.
-    Construct a download link and use it to download the files to the submission
-    folder generated by the validate_input tool
-    """ 
-    response = requests.get(item_api_url)
-    itemData = response.json()
-    
-    bundles_url = itemData['_links']['bundles']['href']
-    bundles_response = requests.get(bundles_url)
-    bundlesData = bundles_response.json()
-    
-    for x in range(len(bundlesData['_embedded']['bundles'])):
-        if bundlesData['_embedded']['bundles'][x]['name'] == "ORIGINAL":
-            bitstreams_url = bundlesData['_embedded']['bundles'][x]['_links']['bitstreams']['href']
-    #print (bitstreams_url)
-    
-    bits_response = requests.get(bitstreams_url)
-    bitstreamsData = bits_response.json()
-    
-    downloaded_files = 0
-    passed_files = 0
-    for page in range(bitstreamsData['page']['totalPages']):
-        next_url = bitstreams_url + "?page=" + str(page)
-        response = requests.get(next_url)
-        bitstreamsDataExtra = response.json()
-        for x in range(len(bitstreamsDataExtra['_embedded']['bitstreams'])):
-            filename = bitstreamsDataExtra['_embedded']['bitstreams'][x]['name']
-            identifier = bitstreamsDataExtra['_embedded']['bitstreams'][x]['id']
-            filesize = convert_size(bitstreamsDataExtra['_embedded']['bitstreams'][x]['sizeBytes'])
-            download = "https://conservancy.umn.edu/bitstream/" + identifier + "/download"        
-            try:
-                print("Now downloading: " + filename + " (" + filesize + ") ...")
-                urllib.request.urlretrieve(download, (download_path + "//" + filename))
-                print(filename + " has been downloaded")
-                downloaded_files += 1
-                time.sleep(1)
-            except Exception as e:
-                print ("Cannot download: " + filename + ". Skipping file.  Please try downloading manually. More detail about the error: " + str(e))
-                passed_files += 1
-                pass
-    if downloaded_files >= 1:
-        show_results("Finished downloading " + str(downloaded_files) + " files from: \n" + link_url + "\n" + str(passed_files) + " were skipped due to a download error.")
-    else:
-        show_results("Finished, but no files were downloaded. Check whether the files are embargoed. They must be manually downloaded.")    
-        
-       
 # Create the GUI interface
 app = tkinter.Tk()
-app.geometry('700x300')
+app.geometry('700x370')
 app.title("DRUM Download Tools Dspace7")
 
 
+# Ask for a DRUM email and password and log in, so embargoed and restricted files can be downloaded
+def click_login():
+    email = tkinter.simpledialog.askstring("Log in", "DRUM email:", parent=app)
+    if not email:
+        return
+    session = get_session()
+    try:
+        if not session.use_cached_token(email):
+            password = tkinter.simpledialog.askstring("Log in", "DRUM password:", show="*", parent=app)
+            if not password:
+                return
+            login(email, password)
+        login_button['text'] = "Logged in as " + email
+    except LoginError as e:
+        show_error(str(e))
+    except Exception as e:
+        show_error("The tool could not log in. Check console for more error details.")
+        print("Could not log in: " + str(e))
+
 # Open the folder picker, create a folder in the selected location named with the handle number, and download the files.
 def click_download():
     #set user feedback to display while downloading
@@ -181,7 +137,22 @@ def click_download():
     if link_url and outputDir:
         valid, item_api_url, download_path = validate_input(link_url, outputDir)
         if valid:
-            downloadFiles(link_url, item_api_url, download_path)
+            writer = None
+            if create_bag.get():
+                writer = BagWriter(download_path)
+            try:
+                downloaded_files, passed_files = downloadFiles(link_url, item_api_url, download_path, writer)
+                if downloaded_files >= 1:
+                    show_results("Finished downloading " + str(downloaded_files) + " files from: \n" + link_url + "\n" + str(passed_files) + " were skipped due to a download error.")
+                else:
+                    show_results("Finished, but no files were downloaded. Check whether the files are embargoed. Log in to download them, or download them manually.")
+            except InsufficientSpaceError as e:
+                #Nothing was downloaded, so the new folder is removed again
+                try:
+                    rmdir(download_path)
+                except OSError:
+                    pass
+                show_error(str(e))
     
     #If the user has not entered the necessary information, request it
     elif outputDir:
@@ -194,7 +165,7 @@ def click_download():
     describe_text['text'] = """
     This tool creates a folder in the chosen directory named after the unique handle submission number (e.g. 226188).
     If the folder already exists, it will not download files.
-    Embargoed files will be skipped.\n"""
+    Embargoed files will be skipped unless you log in.\n"""
 
 # Create the window header
 header = tkinter.Label(app, text="DRUM Download Tool (Dspace7)", fg="blue", font=("Cabin", 24))
@@ -214,12 +185,21 @@ entry.pack(ipady=2)
 describe_text = tkinter.Label(app, text="""
 This tool creates a folder in the chosen directory named after the unique handle submission number (e.g. 226188).
 If the folder already exists, it will not download files.
-Embargoed files will be skipped.\n""")
+Embargoed files will be skipped unless you log in.\n""")
 describe_text.pack()
 
 # Draw the button that opens the folder picker for where to create the folder/download the files
 open_folder = tkinter.Button(app, text="Download files", command=click_download)
 open_folder.pack(ipady=2)
 
+# Draw the checkbox for saving the files as a BagIt bag
+create_bag = tkinter.BooleanVar(app, value=False)
+bag_option = tkinter.Checkbutton(app, text="Create BagIt bag", variable=create_bag)
+bag_option.pack()
+
+# Draw the button for logging in to download embargoed and restricted files
+login_button = tkinter.Button(app, text="Log in", command=click_login)
+login_button.pack(ipady=2)
+
 # Initialize Tk window
 app.mainloop()
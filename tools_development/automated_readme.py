@@ -4,41 +4,101 @@ Created on Fri Jun  3 12:03:55 2022
 
 @author: kerni016
 """
-import urllib.request
-from bs4 import BeautifulSoup
 from string import Template
 from datetime import datetime
+import spreadsheet_profile
+from bitstream_record import BitstreamRecord
+import dspace_backend
+import fingerprint
 
 
-def automated_readme (handle_url, outputDir):
-        
+#Change this when the readme template changes, so existing readmes are created again
+TEMPLATE_VERSION = 2
+
+
+def variable_label(index):
+    """Letter label for an entry in the variable list (A, B, ... Z, AA, AB, ...)"""
+    label = ""
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        label = chr(65 + remainder) + label
+    return label
+
+
+def automated_readme (handle_url, outputDir, profile_csv=True, force=False):
+    """
+    Create a readme for a submission. The readme is not created again if the item
+    and its files have not changed since it was written (see fingerprint.py),
+    unless force is True. Return the path of the readme.
+    """
+
     #Use the handle URL to construct a URL to get to the Dspace endpoint for the item
     handle_split = handle_url.split ("/") [-2:]
     handle = str(handle_split[0]) + "/" + str(handle_split[1])
-    url = "https://conservancy.umn.edu/rest/handle/" + handle
+    backend = dspace_backend.get_backend()
 
-    #Try to access the Dspace endpoint. Return an error message and exit the script if the URL cannot be opened.
+    #Try to access the Dspace endpoint. Return an error message and exit the script if the item cannot be read.
     try:
-        response = urllib.request.urlopen(url)
+        item_dict = backend.find_item(handle)
     except Exception as e:
-        print(url + " could not be opened. (" + str(e) + ")")
-
-    #Read in the content at the item API endpoint and get the internal id for the item
-    presoup = BeautifulSoup(response, 'lxml')
-    item_info = presoup.p.text
-    item_dict = eval(item_info.replace('null', '"null"'))
-
-    internal_id = item_dict["id"]
-    
-    bitstream_url = "https://conservancy.umn.edu/rest/items/" + str(internal_id) + "/bitstreams?limit=250"
-    metadata_url = "https://conservancy.umn.edu/rest/items/" + str(internal_id) + "/metadata"
-    
+        print(handle + " could not be opened. (" + str(e) + ")")
+        raise
+
+    #Read every page of the bitstream list. Only the fields that are used are kept from each bitstream (see bitstream_record.py).
+    list_bitstream = list(backend.iter_bitstreams(item_dict))
+
+    #Skip the item if the existing readme was made from the same inputs
+    item_fingerprint = fingerprint.make_fingerprint(item_dict.get("lastModified"), TEMPLATE_VERSION, list_bitstream)
+    existing_path = fingerprint.is_current(outputDir, "readme", handle_split[1], item_fingerprint)
+    if existing_path and not force:
+        print(handle + " has not changed since " + existing_path + " was created. Skipping.")
+        return existing_path
+
     #Read in the content at the metadata endpoint
-    response = urllib.request.urlopen(metadata_url)
-    soup = BeautifulSoup(response, 'lxml')
-    metadata = soup.p.string
-    list_metadata = eval(metadata.replace('null', '"null"'))
+    list_metadata = backend.metadata(item_dict)
+
+    #Read the header and sampled blocks of each CSV file to profile it
+    csv_samples = fetch_csv_samples(list_bitstream) if profile_csv else None
 
+    readme_full_string = render_readme(list_metadata, list_bitstream, csv_samples)
+
+    #Write the readme to a text file
+    readme_path = output_path(outputDir, handle_split[1])
+    f = open(readme_path,"w")
+    f.write(readme_full_string)
+    f.close()
+    fingerprint.record(outputDir, "readme", handle_split[1], item_fingerprint, readme_path)
+    return readme_path
+
+
+def output_path(outputDir, handle_number):
+    return outputDir + "/readme_" + str(handle_number) + ".txt"
+
+
+def fetch_csv_samples(list_bitstream):
+    """
+    Read the samples used to profile each CSV file in the ORIGINAL bundle, keyed by
+    bitstream uuid. A file that cannot be read is kept with the error message.
+    """
+    csv_samples = {}
+    backend = dspace_backend.get_backend()
+    for x in list_bitstream:
+        if x.bundle == "ORIGINAL" and x.name.lower().endswith(".csv"):
+            download = backend.download_url(x)
+            try:
+                csv_samples[x.uuid] = spreadsheet_profile.fetch_csv_samples(download, x.size)
+            except Exception as e:
+                csv_samples[x.uuid] = {'error': str(e)}
+    return csv_samples
+
+
+def render_readme(list_metadata, list_bitstream, csv_samples=None):
+    """
+    Return the text of the readme from the item's metadata and bitstream lists and
+    the CSV samples from fetch_csv_samples() (None to leave the CSV sections blank).
+    This does no network requests, so collection_pipeline.py can run it in another process.
+    """
     #Create an dictionary to be filled with metadata values from the submission
     metadata_dict = {'readme_date': str(datetime.now().strftime("%Y-%m-%d")),
                      'title':"",'date_published':"", "authors":"", "date_collected":"",
@@ -134,18 +194,11 @@ def automated_readme (handle_url, outputDir):
 
     ###Get item bitstream information from the submission
 
-    #Read in the content at the bitstream endpoint. Default limit is 20 items per page.
-    #Extended to 250 to account for larger data submissions.
-    response = urllib.request.urlopen(bitstream_url)
-    item_soup = BeautifulSoup(response, 'lxml')
-    bitstream = item_soup.p.text
-    list_bitstream = eval(bitstream.replace('null', '"null"'))
-
     #Create the "File List" section of the readme and add it to the metadata dictionary
     file_list_string = "File List\n\n"
     for x in list_bitstream:
-        if x['bundleName'] == "ORIGINAL":
-            file_list_string += ("\tFilename: " + x['name'] +" \n\tShort description:\n\n")
+        if x.bundle == "ORIGINAL":
+            file_list_string += ("\tFilename: " + x.name +" \n\tShort description:\n\n")
     metadata_dict ['file_list'] = file_list_string
 
 
@@ -195,40 +248,61 @@ METHODOLOGICAL INFORMATION
     spreadsheets = []
     data_specific_string = ""
     for x in list_bitstream:
-        if x['bundleName'] == "ORIGINAL":
-            if ".csv" in x['name']:
-                spreadsheets.append(x['name'])
+        if x.bundle == "ORIGINAL":
+            if ".csv" in x.name:
+                spreadsheets.append(x)
             #Will pick up a range of Excel formats including .xls, .xlsx, and .xlsm
-            if ".xls" in x['name']:
-                spreadsheets.append(x['name'])
+            if ".xls" in x.name:
+                spreadsheets.append(x)
 
     #If there are no files with .csv or .xls extensions in the submission, add a
     #placeholder "[FILENAME]" so that there will be one example section
     if not spreadsheets:
-        spreadsheets.append("[FILENAME]")
+        spreadsheets.append(BitstreamRecord("[FILENAME]", None, 0))
 
     for item in spreadsheets:
-        data_specific_string += """
------------------------------------------
-DATA-SPECIFIC INFORMATION FOR: """ + item + """\n-----------------------------------------\n
-1. Number of variables:\n
-2. Number of cases/rows:\n
-3. Missing data codes:\n
-\tCode/symbol\tDefinition
-\tCode/symbol\tDefinition\n
-4. Variable List\n
+        num_variables = ""
+        num_rows = ""
+        variable_string = """
 \tA. Name: <variable name>
 \t   Description: <description of the variable>
 \t\tValue labels if appropriate\n
 \tB. Name: <variable name>
 \t   Description: <description of the variable>
-\t\tValue labels if appropriate\n\n\n\n"""
+\t\tValue labels if appropriate\n"""
+
+        #Profile CSV files from the header and blocks sampled on the server with Range requests,
+        #instead of downloading them. Estimate the rows from the sampled blocks.
+        if csv_samples is not None and item.uuid in csv_samples:
+            try:
+                samples = csv_samples[item.uuid]
+                if 'error' in samples:
+                    raise IOError(samples['error'])
+                profile = spreadsheet_profile.profile_csv_samples(samples)
+                num_variables = " " + str(len(profile['variables']))
+                if profile['rows'] is not None:
+                    num_rows = " " + str(profile['rows'])
+                    if profile['estimated']:
+                        num_rows = " ~" + str(profile['rows']) + " (estimated from a sample of the file)"
+                if profile['variables']:
+                    variable_string = ""
+                    for x in range(len(profile['variables'])):
+                        variable_string += "\n\t" + variable_label(x) + ". Name: " + profile['variables'][x] + """
+\t   Description: <description of the variable>
+\t\tValue labels if appropriate\n"""
+            except Exception as e:
+                print("Could not profile " + item.name + " (" + str(e) + ")")
+
+        data_specific_string += """
+-----------------------------------------
+DATA-SPECIFIC INFORMATION FOR: """ + item.name + """\n-----------------------------------------\n
+1. Number of variables:""" + num_variables + """\n
+2. Number of cases/rows:""" + num_rows + """\n
+3. Missing data codes:\n
+\tCode/symbol\tDefinition
+\tCode/symbol\tDefinition\n
+4. Variable List\n""" + variable_string + "\n\n\n"
 
     #Add the data-specific section(s) onto the end of the readme
     readme_full_string = readme_string + data_specific_string
-
-    #Write the readme to a text file
-    readme_path = outputDir + "/readme_" + str(handle_split[1]) + ".txt"
-    f = open(readme_path,"w")
-    f.write(readme_full_string)
-    f.close()
\ No newline at end of file
+    return readme_full_string
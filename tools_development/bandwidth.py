@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: A bandwidth cap shared by all of the downloads in a program. Every
+chunk that is downloaded (whole files and byte ranges) takes its size from one
+token bucket, so the total speed of all the download threads stays under the cap.
+The cap can change with the time of day, e.g. a limit during business hours and
+full speed at night. It is set with the DRUM_BANDWIDTH environment variable or
+the --bandwidth option of the download tools, as a comma separated list of rules:
+
+    5M                          always 5 MB per second
+    Mon-Fri 08:00-18:00=5M      5 MB per second on weekdays from 8 to 6, otherwise no cap
+    08:00-18:00=2M, 10M         2 MB per second during the day, 10 MB per second at night
+
+The first rule that matches the current time is used. Sizes are bytes per second
+with an optional K, M or G (1024 based). With no matching rule there is no cap.
+"""
+
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+
+DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+#Bytes that can be sent at once after the downloads were idle, in seconds of the cap
+BURST_SECONDS = 1
+
+
+def parse_rate(text):
+    """Bytes per second from text such as 500K, 5M or 1.5G"""
+    match = re.fullmatch(r"\s*([0-9.]+)\s*([kmg]?)b?\s*", text.lower())
+    if not match:
+        raise ValueError("Not a bandwidth: " + text)
+    rate = float(match.group(1)) * UNITS[match.group(2)]
+    if rate <= 0:
+        raise ValueError("The bandwidth must be more than 0: " + text)
+    return rate
+
+
+def parse_days(text):
+    """Set of weekday numbers (Monday is 0) from text such as Mon-Fri or Sat/Sun"""
+    days = set()
+    for part in text.lower().split("/"):
+        first, _, last = part.partition("-")
+        start = DAYS.index(first[:3])
+        end = DAYS.index(last[:3]) if last else start
+        day = start
+        days.add(day)
+        while day != end:
+            day = (day + 1) % 7
+            days.add(day)
+    return days
+
+
+def parse_minutes(text):
+    hours, minutes = text.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def parse_schedule(text):
+    """
+    Turn a schedule such as "Mon-Fri 08:00-18:00=5M, 10M" into a list of rules
+    (days, start minute, end minute, bytes per second). Missing days or times match always.
+    """
+    rules = []
+    for entry in text.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        when, _, rate = entry.rpartition("=")
+        days = None
+        start = end = None
+        for part in when.split():
+            if ":" in part:
+                start_text, end_text = part.split("-")
+                start, end = parse_minutes(start_text), parse_minutes(end_text)
+            else:
+                #Several days can be joined with / (e.g. Sat/Sun)
+                days = parse_days(part)
+        rules.append((days, start, end, parse_rate(rate)))
+    return rules
+
+
+def rule_matches(rule, now):
+    days, start, end, rate = rule
+    if days is not None and now.weekday() not in days:
+        return False
+    if start is None:
+        return True
+    minute = now.hour * 60 + now.minute
+    if start <= end:
+        return start <= minute < end
+    #A time range over midnight, e.g. 22:00-06:00
+    return minute >= start or minute < end
+
+
+class BandwidthLimiter:
+    """Token bucket shared by all download threads, with the rate taken from a schedule"""
+
+    def __init__(self, schedule=None, share=1):
+        self.lock = threading.Lock()
+        self.set_schedule(schedule, share)
+
+    def set_schedule(self, schedule, share=1):
+        """
+        Use a new schedule (a string or a list of rules). With share > 1 the cap is
+        divided between that many processes that each have their own limiter.
+        """
+        if isinstance(schedule, str):
+            schedule = parse_schedule(schedule)
+        with self.lock:
+            self.schedule = schedule or []
+            self.share = share
+            self.tokens = 0
+            self.last = time.monotonic()
+
+    def rate(self, now=None):
+        """Current cap in bytes per second, or None for no cap"""
+        now = now or datetime.now()
+        for rule in self.schedule:
+            if rule_matches(rule, now):
+                return rule[3] / self.share
+        return None
+
+    def consume(self, size_bytes):
+        """Wait until size_bytes more can be downloaded under the cap"""
+        if not self.schedule:
+            return
+        rate = self.rate()
+        if rate is None:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(rate * BURST_SECONDS, self.tokens + (now - self.last) * rate)
+            self.last = now
+            #Each thread takes its bytes straight away and then waits for the debt it
+            #leaves, so threads that arrive later wait their turn behind it
+            self.tokens -= size_bytes
+            wait = -self.tokens / rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+    def throttle(self, chunks):
+        """Pass the chunks of a download through, keeping to the cap"""
+        for chunk in chunks:
+            self.consume(len(chunk))
+            yield chunk
+
+
+#Shared by all of the downloads in this program
+LIMITER = BandwidthLimiter(os.environ.get("DRUM_BANDWIDTH", ""))
+
+
+def set_schedule(schedule, share=1):
+    LIMITER.set_schedule(schedule, share)
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+script name: benchmark_generators.py
+
+description: Time the metadata log, readme and DataCite XML generators, and the
+same sections of the DRUMToolsDspace7 notebook, on synthetic items of different
+sizes: 10, 1,000 and 50,000 bitstreams, and 1 to 500 authors with a long abstract.
+Nothing is requested from DRUM. For each generator and item size, the fastest of
+a few runs (wall time) and the peak memory allocated during one run (tracemalloc)
+are saved in a JSON file. Two result files, e.g. from before and after a change,
+can be compared to find generators that became slower or use more memory.
+
+The DSpace 6 generators are timed with their render functions, which build the
+text without any network requests. The notebook sections are run cell by cell
+from the .ipynb file with drum_item returning the synthetic item and the Colab
+file download turned off. The documents they write go to a temporary folder.
+
+example:
+    python benchmark_generators.py --output before.json
+    python benchmark_generators.py --output after.json --bitstreams 10 1000
+    python benchmark_generators.py --compare before.json after.json
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from datetime import datetime
+from os import path
+import automated_readme
+import datacite_xml
+import metadata_log
+from bitstream_record import records_from_list, records_from_page
+from file_summary import convert_size
+
+
+BITSTREAM_COUNTS = (10, 1000, 50000)
+AUTHOR_COUNTS = (1, 50, 500)
+#Words in the synthetic abstract
+ABSTRACT_WORDS = 5000
+#Bitstreams per page of the DSpace 7 list, the same as the API default
+PAGE_SIZE = 20
+REPEATS = 3
+NOTEBOOK_PATH = path.join(path.dirname(path.dirname(path.abspath(__file__))), "DRUMToolsDspace7.ipynb")
+#Markdown headings that start each section of the notebook
+NOTEBOOK_SECTIONS = {'notebook_log': "## CREATE CURATOR LOG",
+                     'notebook_readme': "## CREATE README FILE",
+                     'notebook_xml': "## CREATE DataCite XML FILE"}
+#A generator is reported if it takes this much more time or memory than before
+REGRESSION_RATIO = 1.25
+EXTENSIONS = ("csv", "txt", "tif", "xlsx", "py", "R", "zip", "json", "pdf", "nc")
+
+
+def synthetic_files(count):
+    """
+    Name, size, checksum and description of `count` files, spread over several
+    folder-like prefixes and extensions, with a few duplicates
+    """
+    files = []
+    for n in range(count):
+        extension = EXTENSIONS[n % len(EXTENSIONS)]
+        name = "site_" + str(n % 37).zfill(2) + "_sample_" + str(n).zfill(6) + "." + extension
+        size_bytes = (n * 7919) % 50000000 + 1
+        #Every 50th file has the same content as the file before it
+        seed = n - 1 if n % 50 == 49 else n
+        checksum = hashlib.md5(str(seed).encode()).hexdigest()
+        if seed != n:
+            size_bytes = (seed * 7919) % 50000000 + 1
+        description = "Measurements for sample " + str(n) if n % 3 == 0 else ""
+        files.append((name, size_bytes, checksum, description, extension))
+    return files
+
+
+def synthetic_values(authors):
+    """Metadata field -> values for an item with `authors` authors and a long abstract"""
+    words = ("soil", "moisture", "was", "measured", "at", "each", "site", "during", "the", "growing", "season")
+    abstract = " ".join(words[n % len(words)] for n in range(ABSTRACT_WORDS)) + "."
+    values = {'dc.title': ["Synthetic dataset with " + str(authors) + " authors"],
+              'dc.identifier.uri': ["http://hdl.handle.net/11299/999999"],
+              'dc.contributor.author': ["Author" + str(n) + ", Given" + str(n) for n in range(authors)],
+              'dc.contributor.contactname': ["Author0, Given0"],
+              'dc.contributor.contactemail': ["author0@example.org"],
+              'dc.date.available': ["2024-05-01T12:00:00Z"],
+              'dc.date.collectedbegin': ["2020-01-01"],
+              'dc.date.collectedend': ["2023-12-31"],
+              'dc.description.abstract': [abstract],
+              'dc.description': ["Technical notes " * 50],
+              'dc.description.sponsorship': ["Funder " + str(n) for n in range(5)],
+              'dc.subject': ["Subject " + str(n) for n in range(20)],
+              'dc.rights': ["Attribution 4.0 International"],
+              'dc.rights.uri': ["http://creativecommons.org/licenses/by/4.0/"],
+              'dc.relation.isreferencedby': ["Reference " + str(n) for n in range(5)]}
+    return values
+
+
+def dspace6_item(bitstreams, authors):
+    """Bitstream records and metadata list made from lists in the form of the DSpace 6 REST API"""
+    list_bitstream = []
+    for name, size_bytes, checksum, description, extension in synthetic_files(bitstreams):
+        list_bitstream.append({'uuid': hashlib.md5(name.encode()).hexdigest(), 'name': name, 'sizeBytes': size_bytes,
+                               'bundleName': "ORIGINAL", 'description': description, 'format': extension,
+                               'mimeType': "application/octet-stream", 'checkSum': {'value': checksum, 'checkSumAlgorithm': "MD5"}})
+    list_metadata = []
+    for key, values in synthetic_values(authors).items():
+        for value in values:
+            list_metadata.append({'key': key, 'value': value, 'language': None})
+    return records_from_list(list_bitstream), list_metadata
+
+
+def dspace7_item(bitstreams, authors):
+    """A drum_item.DrumItem holding a synthetic item, as if it had been fetched"""
+    from drum_item import DrumItem
+    item = DrumItem.__new__(DrumItem)
+    item.link_url = "https://hdl.handle.net/11299/999999"
+    item.item_uuid = "00000000-0000-0000-0000-000000000000"
+    item.item_api_url = "https://conservancy.umn.edu/server/api/core/items/" + item.item_uuid
+    item.lock = threading.Lock()
+    metadata = {key: [{'value': value} for value in values] for key, values in synthetic_values(authors).items()}
+    item.data = {'name': metadata['dc.title'][0]['value'], 'metadata': metadata}
+    bitstreams_url = item.item_api_url + "/bundles/ORIGINAL/bitstreams"
+    item._bundles = {'_embedded': {'bundles': [{'name': "ORIGINAL", '_links': {'bitstreams': {'href': bitstreams_url}}}]}}
+    entries = []
+    for name, size_bytes, checksum, description, extension in synthetic_files(bitstreams):
+        entries.append({'id': hashlib.md5(name.encode()).hexdigest(), 'name': name, 'sizeBytes': size_bytes,
+                        'checkSum': {'value': checksum, 'checkSumAlgorithm': "MD5"},
+                        'metadata': {'dc.description': [{'value': description}]} if description else {}})
+    #The item keeps the bitstream records made from each page of the list, as when it is fetched
+    item._bitstreams = []
+    for page in range(0, len(entries), PAGE_SIZE):
+        item._bitstreams.extend(records_from_page({'_embedded': {'bitstreams': entries[page:page + PAGE_SIZE]}}))
+    item._expected_count = len(entries)
+    return item
+
+
+def notebook_sections(notebook_path=NOTEBOOK_PATH):
+    """Section name -> the code of its cells, from the notebook file"""
+    with open(notebook_path, encoding="utf-8") as f:
+        cells = json.load(f)['cells']
+    sections = {}
+    current = None
+    for cell in cells:
+        source = "".join(cell['source'])
+        #Sections end at the next heading of the same level or higher (not at ### subheadings)
+        if cell['cell_type'] == "markdown" and source.startswith("#") and not source.startswith("###"):
+            current = None
+            for name, heading in NOTEBOOK_SECTIONS.items():
+                if source.startswith(heading):
+                    current = name
+                    sections[name] = []
+        elif cell['cell_type'] == "code" and current is not None:
+            #Shell commands and the Colab download module only work in Colab
+            lines = [line for line in source.split("\n") if not line.lstrip().startswith("!") and "google.colab" not in line]
+            sections[current].append(compile("\n".join(lines), current, "exec"))
+    return sections
+
+
+def notebook_runner(code, item):
+    """A function that runs the cells of a notebook section on the synthetic item"""
+    def run():
+        namespace = {'drum_item': types.SimpleNamespace(get_item=lambda link_url: item),
+                     'files': types.SimpleNamespace(download=lambda filename: None),
+                     'convert_size': convert_size,
+                     'link_url': item.link_url}
+        with contextlib.redirect_stdout(io.StringIO()):
+            for cell in code:
+                exec(cell, namespace)
+    return run
+
+
+def generators(bitstreams, authors, sections):
+    """Generator name -> a function with no arguments that creates its document"""
+    list_bitstream, list_metadata = dspace6_item(bitstreams, authors)
+    functions = {'metadata_log': lambda: metadata_log.render_metadata_log("11299/999999", list_bitstream, list_metadata),
+                 'automated_readme': lambda: automated_readme.render_readme(list_metadata, list_bitstream),
+                 'datacite_xml': lambda: datacite_xml.render_datacite_xml(list_metadata)}
+    if sections:
+        item = dspace7_item(bitstreams, authors)
+        for name, code in sections.items():
+            functions[name] = notebook_runner(code, item)
+    return functions
+
+
+def measure(function, repeats=REPEATS):
+    """Fastest wall time of `repeats` runs, and the peak memory of one traced run"""
+    times = []
+    for x in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    #tracemalloc slows the code down, so the traced run is not timed
+    tracemalloc.start()
+    try:
+        function()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(times), peak_bytes
+
+
+def run_benchmarks(bitstream_counts=BITSTREAM_COUNTS, author_counts=AUTHOR_COUNTS, repeats=REPEATS, notebook=True, only=None):
+    """Time every generator on every item size. Return the results as a list of dictionaries."""
+    sections = notebook_sections() if notebook and path.exists(NOTEBOOK_PATH) else {}
+    results = []
+    working_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        #The notebook sections save their documents in the current folder
+        os.chdir(temp_dir)
+        try:
+            for bitstreams in bitstream_counts:
+                for authors in author_counts:
+                    for name, function in generators(bitstreams, authors, sections).items():
+                        if only and name not in only:
+                            continue
+                        seconds, peak_bytes = measure(function, repeats)
+                        results.append({'generator': name, 'bitstreams': bitstreams, 'authors': authors,
+                                        'seconds': seconds, 'peak_bytes': peak_bytes})
+                        print(name + " " + str(bitstreams) + " bitstreams, " + str(authors) + " authors: "
+                              + str(round(seconds, 4)) + " s, " + convert_size(peak_bytes))
+        finally:
+            os.chdir(working_dir)
+    return results
+
+
+def save_results(results, output_path, label=None):
+    report = {'label': label or path.basename(output_path),
+              'created': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+              'python': platform.python_version(),
+              'machine': platform.platform(),
+              'results': results}
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=1)
+
+
+def compare_results(before_path, after_path, ratio=REGRESSION_RATIO):
+    """
+    Return a table of the time and memory of each generator in two result files,
+    and the number of cases that got worse by more than `ratio`
+    """
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    old = {(r['generator'], r['bitstreams'], r['authors']): r for r in before['results']}
+    lines = ["Before: " + before['label'] + " (" + before['created'] + ")",
+             "After: " + after['label'] + " (" + after['created'] + ")",
+             "generator\tbitstreams\tauthors\tseconds before\tseconds after\tmemory before\tmemory after"]
+    regressions = 0
+    for r in after['results']:
+        key = (r['generator'], r['bitstreams'], r['authors'])
+        if key not in old:
+            continue
+        o = old[key]
+        slower = r['seconds'] > o['seconds'] * ratio
+        larger = r['peak_bytes'] > o['peak_bytes'] * ratio
+        flag = ""
+        if slower or larger:
+            regressions += 1
+            flag = "\t<- " + ("slower" if slower else "") + (" and " if slower and larger else "") + ("more memory" if larger else "")
+        lines.append(r['generator'] + "\t" + str(r['bitstreams']) + "\t" + str(r['authors']) + "\t"
+                     + str(round(o['seconds'], 4)) + "\t" + str(round(r['seconds'], 4)) + "\t"
+                     + convert_size(o['peak_bytes']) + "\t" + convert_size(r['peak_bytes']) + flag)
+    return "\n".join(lines), regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the DRUM document generators on synthetic items.")
+    parser.add_argument("--output", default="benchmark_" + datetime.now().strftime("%Y%m%d") + ".json", help="JSON file to save the results in")
+    parser.add_argument("--label", help="name for this run, e.g. a version or commit")
+    parser.add_argument("--bitstreams", nargs="+", type=int, default=list(BITSTREAM_COUNTS))
+    parser.add_argument("--authors", nargs="+", type=int, default=list(AUTHOR_COUNTS))
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--generators", nargs="+", help="only run these generators, e.g. metadata_log notebook_readme")
+    parser.add_argument("--no-notebook", action="store_true", help="do not run the notebook sections")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        table, regressions = compare_results(args.compare[0], args.compare[1])
+        print(table)
+        print(str(regressions) + " cases are slower or use more memory than before (by more than " + str(int((REGRESSION_RATIO - 1) * 100)) + "%).")
+        return
+    results = run_benchmarks(args.bitstreams, args.authors, args.repeats, not args.no_notebook, args.generators)
+    save_results(results, args.output, args.label)
+    print("Saved " + str(len(results)) + " results in " + args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: One lazy iterator over the bitstreams of a DRUM (DSpace 7) item,
+shared by the downloader, the verify tool and drum_item.py (and through it the
+curator log and readme sections of the notebook). Bitstreams are yielded as
+BitstreamRecords (see bitstream_record.py) as each page of the list arrives.
+While the caller works on one page, the next page is requested in a background
+thread, so reading the list and using it overlap, and work on the first files
+can start before the whole list has been read.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from bitstream_record import records_from_page
+import dspace_backend
+
+
+DEFAULT_BUNDLES = ("ORIGINAL",)
+
+
+class BitstreamPages:
+    """
+    Iterate over the bitstreams of one bundle, page by page. total (the number
+    of bitstreams the API reports) is set once the first page has been read.
+    With cache, the pages are kept in the shared cache of dspace_backend.py.
+    """
+
+    def __init__(self, bitstreams_url, bundle="ORIGINAL", prefetch=True, cache=False):
+        self.bitstreams_url = bitstreams_url
+        self.bundle = bundle
+        self.prefetch = prefetch
+        self.cache = cache
+        self.total = None
+
+    def fetch_page(self, page):
+        return dspace_backend.get_backend("7").bitstream_page(self.bitstreams_url, page, self.cache)
+
+    def __iter__(self):
+        executor = ThreadPoolExecutor(max_workers=1) if self.prefetch else None
+        next_page = None
+        try:
+            bitstreamsData = self.fetch_page(0)
+            self.total = bitstreamsData['page']['totalElements']
+            total_pages = bitstreamsData['page']['totalPages']
+            for page in range(total_pages):
+                if executor is not None and page + 1 < total_pages:
+                    next_page = executor.submit(self.fetch_page, page + 1)
+                #The page is converted to records first, so its data is not kept while they are used
+                records = records_from_page(bitstreamsData, self.bundle)
+                bitstreamsData = None
+                for record in records:
+                    yield record
+                if page + 1 < total_pages:
+                    bitstreamsData = next_page.result() if next_page is not None else self.fetch_page(page + 1)
+                    next_page = None
+        finally:
+            #A caller that stops early does not wait for a page it will not use
+            if next_page is not None:
+                next_page.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+
+def bundle_bitstream_urls(itemData, bundles=DEFAULT_BUNDLES):
+    """(bundle name, bitstreams endpoint) of each of the given bundles of an item (of every bundle if bundles is None)"""
+    bundlesData = dspace_backend.get_backend("7").bundles(itemData)
+    urls = []
+    for bundle in bundlesData['_embedded']['bundles']:
+        if bundles is None or bundle['name'] in bundles:
+            urls.append((bundle['name'], bundle['_links']['bitstreams']['href']))
+    return urls
+
+
+def iter_bitstreams(itemData, bundles=DEFAULT_BUNDLES, prefetch=True, cache=False):
+    """Yield the BitstreamRecords of the ORIGINAL bundle of an item (or of the given bundles) as they are listed"""
+    for bundle_name, bitstreams_url in bundle_bitstream_urls(itemData, bundles):
+        for record in BitstreamPages(bitstreams_url, bundle_name, prefetch, cache):
+            yield record
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: A compact record for one bitstream in a listing. The bitstream lists
+from the API repeat links, the whole metadata block and other fields the tools
+never read, for every file. When a page of the list is read, each entry is turned
+into a BitstreamRecord holding only the fields that are used:
+    name, uuid, size, checksum (and its algorithm), format, description, bundle
+The record uses __slots__, so it has no per-object dictionary, and the strings
+that repeat across files (bundle, checksum algorithm, format) are shared. The
+page dictionaries are dropped as soon as they are converted, so a listing of
+100,000 files takes a small fraction of the memory of the JSON pages.
+"""
+
+import sys
+
+
+class BitstreamRecord:
+    """The fields of one bitstream that the generators and downloaders use"""
+
+    __slots__ = ("name", "uuid", "size", "checksum", "checksum_algorithm", "format", "description", "bundle")
+
+    def __init__(self, name, uuid, size, checksum=None, checksum_algorithm=None, format=None, description="", bundle="ORIGINAL"):
+        self.name = name
+        self.uuid = uuid
+        self.size = size
+        self.checksum = checksum
+        self.checksum_algorithm = sys.intern(checksum_algorithm) if checksum_algorithm else None
+        self.format = sys.intern(format) if format else None
+        self.description = description
+        self.bundle = sys.intern(bundle)
+
+    def __repr__(self):
+        return "BitstreamRecord(" + repr(self.name) + ", " + repr(self.uuid) + ", " + str(self.size) + ", bundle=" + repr(self.bundle) + ")"
+
+    def checksum_dict(self):
+        """The checksum in the form of the API ("checkSum"), or None if there is none"""
+        if not self.checksum:
+            return None
+        return {'checkSumAlgorithm': self.checksum_algorithm, 'value': self.checksum}
+
+    @classmethod
+    def from_dspace7(cls, entry, bundle="ORIGINAL"):
+        """Make a record from an entry of a DSpace 7 bitstreams page"""
+        checksum = entry.get('checkSum') or {}
+        descriptions = (entry.get('metadata') or {}).get('dc.description')
+        return cls(entry['name'], entry['id'], entry['sizeBytes'], checksum.get('value'), checksum.get('checkSumAlgorithm'),
+                   None, descriptions[0]['value'] if descriptions else "", bundle)
+
+    @classmethod
+    def from_dspace6(cls, entry):
+        """
+        Make a record from an entry of the DSpace 6 REST bitstreams list. Values
+        that are null (or "null", as the tools used to read the list) are left out.
+        """
+        def value(key):
+            found = entry.get(key)
+            return None if found in (None, "null") else found
+        checksum = value('checkSum') or {}
+        return cls(entry['name'], entry['uuid'], entry['sizeBytes'], checksum.get('value'), checksum.get('checkSumAlgorithm'),
+                   value('mimeType') or value('format'), value('description') or "", entry.get('bundleName', "ORIGINAL"))
+
+
+def records_from_page(bitstreamsData, bundle="ORIGINAL"):
+    """Records for the bitstreams on one page of a DSpace 7 bitstreams list"""
+    return [BitstreamRecord.from_dspace7(entry, bundle) for entry in bitstreamsData['_embedded']['bitstreams']]
+
+
+def records_from_list(list_bitstream):
+    """Records for a DSpace 6 REST bitstreams list"""
+    return [BitstreamRecord.from_dspace6(entry) for entry in list_bitstream]
@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: Destinations for downloaded bitstreams. Each writer takes the bytes of
+a file as they arrive from the server, so a file is only written to disk once.
+FolderWriter saves the files in the submission folder as before. BagWriter saves
+them in a BagIt bag and computes the MD5 and SHA-256 manifests from the same bytes,
+so the files do not need to be read a second time to create the bag. ZipWriter and
+TarWriter add each file to an archive as it arrives, without a temporary copy on disk.
+The archive can be a file or a stream such as stdout.
+"""
+
+import hashlib
+import re
+import tarfile
+import threading
+import time
+import zipfile
+from datetime import datetime
+from os import getpid, makedirs, remove, replace
+from os import path
+from ranged_download import download_ranged
+
+
+#Number of bytes requested from the server and written at a time
+CHUNK_SIZE = 1024 * 1024
+
+
+def safe_relative_path(filename):
+    """
+    Turn a bitstream name into a relative path inside the download folder. Folder
+    names in the bitstream name are kept, but it cannot point outside the folder.
+    """
+    parts = [part for part in re.split(r"[\\/]", filename) if part not in ("", ".", "..")]
+    return "/".join(parts) or "unnamed_file"
+
+
+def partial_path(file_path):
+    """
+    Path a file is written to until it is complete. An existing file at file_path
+    may be linked to the content store (see content_store.py), so it is replaced
+    once the new file is complete and is never opened for writing.
+    """
+    return file_path + "." + str(getpid()) + ".part"
+
+
+class FolderWriter:
+    """Write each bitstream to a file in the submission folder"""
+
+    #Several files can be written at the same time
+    parallel_safe = True
+
+    def __init__(self, download_path):
+        self.download_path = download_path
+        #Folder used to check the free space before downloading
+        self.target_dir = download_path
+
+    def file_path(self, relative_path):
+        return path.join(self.download_path, relative_path)
+
+    def add_file(self, filename, size_bytes, chunks):
+        """
+        Write the chunks of one file as they arrive. If the transfer fails, the
+        partial file is removed and the error is raised again.
+        """
+        relative_path = safe_relative_path(filename)
+        file_path = self.file_path(relative_path)
+        temporary_path = partial_path(file_path)
+        makedirs(path.dirname(file_path), exist_ok=True)
+        try:
+            with open(temporary_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    self.update(relative_path, chunk)
+            replace(temporary_path, file_path)
+        except BaseException:
+            if path.exists(temporary_path):
+                remove(temporary_path)
+            self.discard(relative_path)
+            raise
+        self.file_done(relative_path)
+        return file_path
+
+    def add_ranged_file(self, filename, size_bytes, download, workers):
+        """
+        Download a large file in byte ranges written in place (see ranged_download.py).
+        Archives are written in order, so only folder and bag writers have this method.
+        """
+        relative_path = safe_relative_path(filename)
+        file_path = self.file_path(relative_path)
+        temporary_path = partial_path(file_path)
+        makedirs(path.dirname(file_path), exist_ok=True)
+        try:
+            download_ranged(download, temporary_path, size_bytes, workers)
+            self.hash_file(relative_path, temporary_path)
+            replace(temporary_path, file_path)
+        except BaseException:
+            if path.exists(temporary_path):
+                remove(temporary_path)
+            self.discard(relative_path)
+            raise
+        self.file_done(relative_path)
+        return file_path
+
+    def add_stored_file(self, filename, size_bytes, stored_path, store):
+        """
+        Link a file that is already in the content store (see content_store.py) into
+        the folder instead of downloading it. Only folder and bag writers have this
+        method. Archives read the stored file through add_file.
+        """
+        relative_path = safe_relative_path(filename)
+        file_path = self.file_path(relative_path)
+        makedirs(path.dirname(file_path), exist_ok=True)
+        store.place(stored_path, file_path)
+        self.hash_file(relative_path, file_path)
+        self.file_done(relative_path)
+        return file_path
+
+    def hash_file(self, relative_path, file_path):
+        pass
+
+    def update(self, relative_path, chunk):
+        pass
+
+    def discard(self, relative_path):
+        pass
+
+    def file_done(self, relative_path):
+        pass
+
+    def close(self, itemData=None):
+        pass
+
+
+def archive_name(root, relative_path):
+    """Path of a file inside an archive, under a folder named after the submission"""
+    if root:
+        return root + "/" + relative_path
+    return relative_path
+
+
+def manifest_path(relative_path):
+    """
+    Encode line breaks in a path for a manifest line. "%" is left as it is, the
+    same as the Library of Congress bagit-python tool, so bags validate with it.
+    """
+    return relative_path.replace("\r", "%0D").replace("\n", "%0A")
+
+
+def bag_info_value(value):
+    """Keep a bag-info.txt value on one line"""
+    return " ".join(str(value).split())
+
+
+class BagWriter(FolderWriter):
+    """
+    Write the bitstreams as the payload of a BagIt bag (version 1.0). Files go in
+    data/ and their MD5 and SHA-256 checksums are computed while they are written.
+    close() writes bagit.txt, bag-info.txt, the payload manifests and the tag manifests.
+    """
+
+    algorithms = ("md5", "sha256")
+
+    def __init__(self, download_path):
+        FolderWriter.__init__(self, download_path)
+        #relative path -> [bytes written, hash objects] for a file that is being written
+        self.hashers = {}
+        #algorithm -> list of manifest lines
+        self.manifests = {algorithm: [] for algorithm in self.algorithms}
+        self.payload_bytes = 0
+        self.payload_files = 0
+        self.lock = threading.Lock()
+
+    def file_path(self, relative_path):
+        return path.join(self.download_path, "data", relative_path)
+
+    def update(self, relative_path, chunk):
+        if relative_path not in self.hashers:
+            self.hashers[relative_path] = [0, [hashlib.new(algorithm) for algorithm in self.algorithms]]
+        self.hashers[relative_path][0] += len(chunk)
+        for hasher in self.hashers[relative_path][1]:
+            hasher.update(chunk)
+
+    def discard(self, relative_path):
+        self.hashers.pop(relative_path, None)
+
+    def hash_file(self, relative_path, file_path):
+        #Ranges arrive out of order, so a file downloaded in ranges is read back once to hash it
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                self.update(relative_path, chunk)
+
+    def file_done(self, relative_path):
+        #An empty file never had a chunk to hash
+        size_bytes, hashers = self.hashers.pop(relative_path, [0, [hashlib.new(algorithm) for algorithm in self.algorithms]])
+        with self.lock:
+            for algorithm, hasher in zip(self.algorithms, hashers):
+                self.manifests[algorithm].append(hasher.hexdigest() + "  data/" + manifest_path(relative_path) + "\n")
+            self.payload_bytes += size_bytes
+            self.payload_files += 1
+
+    def close(self, itemData=None):
+        """Write the tag files once all of the payload has been downloaded"""
+        tag_files = {}
+        tag_files["bagit.txt"] = "BagIt-Version: 1.0\nTag-File-Character-Encoding: UTF-8\n"
+
+        bag_info = [("Source-Organization", "Data Repository for the University of Minnesota (DRUM)")]
+        if itemData:
+            metadata = itemData.get('metadata', {})
+            if 'dc.identifier.uri' in metadata:
+                bag_info.append(("External-Identifier", metadata['dc.identifier.uri'][0]['value']))
+            if 'dc.identifier.doi' in metadata:
+                bag_info.append(("External-Identifier", metadata['dc.identifier.doi'][0]['value']))
+            bag_info.append(("Title", itemData.get('name', "")))
+            for author in metadata.get('dc.contributor.author', []):
+                bag_info.append(("Author", author['value']))
+            if 'dc.contributor.contactname' in metadata:
+                bag_info.append(("Contact-Name", metadata['dc.contributor.contactname'][0]['value']))
+            if 'dc.contributor.contactemail' in metadata:
+                bag_info.append(("Contact-Email", metadata['dc.contributor.contactemail'][0]['value']))
+            if 'dc.date.available' in metadata:
+                bag_info.append(("Date-Available", metadata['dc.date.available'][0]['value']))
+            if 'dc.description.abstract' in metadata:
+                bag_info.append(("External-Description", metadata['dc.description.abstract'][0]['value']))
+        bag_info.append(("Bagging-Date", datetime.now().strftime("%Y-%m-%d")))
+        bag_info.append(("Payload-Oxum", str(self.payload_bytes) + "." + str(self.payload_files)))
+        tag_files["bag-info.txt"] = "".join(label + ": " + bag_info_value(value) + "\n" for label, value in bag_info)
+
+        for algorithm in self.algorithms:
+            tag_files["manifest-" + algorithm + ".txt"] = "".join(self.manifests[algorithm])
+
+        #The tag manifests list the checksums of the tag files written above
+        for name, text in tag_files.items():
+            with open(path.join(self.download_path, name), "w", encoding="utf-8", newline="\n") as f:
+                f.write(text)
+        for algorithm in self.algorithms:
+            tag_manifest = ""
+            for name, text in tag_files.items():
+                tag_manifest += hashlib.new(algorithm, text.encode("utf-8")).hexdigest() + "  " + name + "\n"
+            with open(path.join(self.download_path, "tagmanifest-" + algorithm + ".txt"), "w", encoding="utf-8", newline="\n") as f:
+                f.write(tag_manifest)
+
+
+class ZipWriter:
+    """
+    Add each bitstream to a ZIP archive as it downloads. ZIP64 extensions are
+    used for files over 4 GB, and the archive can be written to a stream that
+    cannot seek (e.g. stdout). Files are stored without compression unless
+    compress is True.
+    """
+
+    parallel_safe = False
+
+    def __init__(self, output, root="", compress=False):
+        #output is a file path or a binary file object
+        self.archive = zipfile.ZipFile(output, "w", allowZip64=True)
+        self.target_dir = path.dirname(path.abspath(output)) if isinstance(output, str) else None
+        self.root = root
+        self.compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        self.errors = []
+
+    def add_file(self, filename, size_bytes, chunks):
+        """
+        Write the chunks of one file into the archive. An entry cannot be taken
+        back out of a streamed archive, so if the transfer fails the partial entry
+        is listed in download_errors.txt and the error is raised again.
+        """
+        arcname = archive_name(self.root, safe_relative_path(filename))
+        info = zipfile.ZipInfo(arcname, time.localtime()[:6])
+        info.compress_type = self.compression
+        #Setting the expected size lets zipfile decide whether the entry needs ZIP64
+        info.file_size = size_bytes
+        try:
+            with self.archive.open(info, "w") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        except Exception as e:
+            self.errors.append(arcname + " is incomplete (" + str(e) + ")")
+            raise
+        return arcname
+
+    def close(self, itemData=None):
+        if self.errors:
+            self.archive.writestr(archive_name(self.root, "download_errors.txt"), "\n".join(self.errors) + "\n")
+        self.archive.close()
+
+
+class ChunkReader:
+    """
+    File-like reader over downloaded chunks for tarfile. A tar header records the
+    file size before the content, so if the transfer stops early the rest of the
+    entry is filled with zeros to keep the archive readable, and the error is kept.
+    """
+
+    def __init__(self, chunks, size_bytes):
+        self.chunks = chunks
+        self.remaining = size_bytes
+        self.buffer = b""
+        self.offset = 0
+        self.error = None
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        while len(self.buffer) - self.offset < size and self.error is None:
+            try:
+                chunk = next(self.chunks)
+            except StopIteration:
+                self.error = "the server sent fewer bytes than expected"
+                break
+            except Exception as e:
+                self.error = str(e)
+                break
+            self.buffer = self.buffer[self.offset:] + chunk
+            self.offset = 0
+        data = self.buffer[self.offset:self.offset + size]
+        self.offset += len(data)
+        if len(data) < size:
+            data += bytes(size - len(data))
+        self.remaining -= len(data)
+        return data
+
+
+class TarWriter:
+    """
+    Add each bitstream to a TAR archive (optionally gzip compressed) as it downloads.
+    The size from the bitstream API is used for each tar header, so nothing needs
+    to be saved to disk first. The archive can be written to stdout.
+    """
+
+    parallel_safe = False
+
+    def __init__(self, output, root="", compress=False):
+        self.target_dir = path.dirname(path.abspath(output)) if isinstance(output, str) else None
+        mode = "w|gz" if compress else "w|"
+        if isinstance(output, str):
+            self.archive = tarfile.open(output, mode, format=tarfile.PAX_FORMAT)
+        else:
+            self.archive = tarfile.open(fileobj=output, mode=mode, format=tarfile.PAX_FORMAT)
+        self.root = root
+        self.errors = []
+
+    def add_file(self, filename, size_bytes, chunks):
+        arcname = archive_name(self.root, safe_relative_path(filename))
+        info = tarfile.TarInfo(arcname)
+        info.size = size_bytes
+        info.mtime = time.time()
+        reader = ChunkReader(iter(chunks), size_bytes)
+        self.archive.addfile(info, reader)
+        if reader.error is not None:
+            self.errors.append(arcname + " is incomplete (" + reader.error + ")")
+            raise IOError(reader.error)
+        return arcname
+
+    def close(self, itemData=None):
+        if self.errors:
+            text = ("\n".join(self.errors) + "\n").encode("utf-8")
+            info = tarfile.TarInfo(archive_name(self.root, "download_errors.txt"))
+            info.size = len(text)
+            info.mtime = time.time()
+            self.archive.addfile(info, ChunkReader(iter([text]), len(text)))
+        self.archive.close()
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+script name: collection_pipeline.py
+
+description: Create the metadata logs, readmes and DataCite XMLs for many items,
+e.g. a whole collection, as a pipeline with three stages:
+    fetch  - threads read the item, bitstream and metadata endpoints and the CSV
+             samples (waiting on the network)
+    render - a pool of processes builds the text of each document (file
+             summaries, duplicate checks, CSV profiling and the templates)
+    write  - the documents are written, with their fingerprints and snapshots,
+             in the same order as the input
+The stages are joined by bounded queues, so a fast stage waits for a slow one
+instead of holding the whole collection in memory. Each item is fetched once for
+all three documents, and the documents of items that have not changed since they
+were created are skipped (see fingerprint.py).
+
+Duplicates are checked within each item. Use metadata_log.metadata_log_batch to
+also find files shared between items.
+
+example:
+    python collection_pipeline.py C:/curation --scope 7c6bb4d1-8f3c-4cdb-9ec4-4d58ea8ef9b4
+    python collection_pipeline.py C:/curation --handles handles.txt --processes 4 --failures failed.jsonl
+    python collection_pipeline.py C:/curation --failures failed.jsonl --retry-failed
+    python collection_pipeline.py C:/curation --handles handles.txt --kinds datacite_json
+"""
+
+import argparse
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from os import makedirs
+import automated_readme
+import dspace_backend
+import datacite_json
+import datacite_validate
+import datacite_xml
+import fingerprint
+import metadata_log
+import retry
+import snapshot_diff
+
+
+#Documents that can be created, with the module that renders each one
+KINDS = ("metadata_log", "readme", "datacite_xml", "datacite_json")
+MODULES = {'metadata_log': metadata_log, 'readme': automated_readme, 'datacite_xml': datacite_xml, 'datacite_json': datacite_json}
+#Documents created when no kinds are given
+DEFAULT_KINDS = ("metadata_log", "readme", "datacite_xml")
+FETCH_THREADS = 4
+#Number of items waiting between two stages
+QUEUE_SIZE = 16
+#Marks the end of the items in a queue
+DONE = None
+
+
+def fetch_item(handle_url, outputDir, kinds=DEFAULT_KINDS, force=False, profile_csv=True):
+    """
+    Fetch everything needed to render the documents of one item that are out of
+    date. The metadata and CSV samples are only read if a document needs them.
+    """
+    handle_split = handle_url.split ("/") [-2:]
+    handle = str(handle_split[0]) + "/" + str(handle_split[1])
+    record = {'handle_url': handle_url, 'handle': handle, 'handle_number': handle_split[1], 'kinds': [], 'fingerprints': {}}
+
+    backend = dspace_backend.get_backend()
+    item_dict = backend.find_item(handle)
+    record['item_dict'] = item_dict
+    #Every page of the bitstream list is read (see dspace_backend.py)
+    record['list_bitstream'] = list(backend.iter_bitstreams(item_dict))
+
+    for kind in kinds:
+        #The DataCite XML and JSON do not use the file list, the same as datacite_xml()
+        list_bitstream = record['list_bitstream'] if kind not in ("datacite_xml", "datacite_json") else None
+        item_fingerprint = fingerprint.make_fingerprint(item_dict.get("lastModified"), MODULES[kind].TEMPLATE_VERSION, list_bitstream)
+        if force or not fingerprint.is_current(outputDir, kind, record['handle_number'], item_fingerprint):
+            record['kinds'].append(kind)
+            record['fingerprints'][kind] = item_fingerprint
+
+    if record['kinds']:
+        record['list_metadata'] = backend.metadata(item_dict)
+    record['csv_samples'] = None
+    if "readme" in record['kinds'] and profile_csv:
+        record['csv_samples'] = automated_readme.fetch_csv_samples(record['list_bitstream'])
+    return record
+
+
+def render_item(record):
+    """Return the text of each document of an item that needs to be created. Runs in a worker process."""
+    documents = {}
+    if "metadata_log" in record['kinds']:
+        documents['metadata_log'] = metadata_log.render_metadata_log(record['handle'], record['list_bitstream'], record['list_metadata'])
+    if "readme" in record['kinds']:
+        documents['readme'] = automated_readme.render_readme(record['list_metadata'], record['list_bitstream'], record['csv_samples'])
+    if "datacite_xml" in record['kinds']:
+        documents['datacite_xml'] = datacite_xml.render_datacite_xml(record['list_metadata'])
+    if "datacite_json" in record['kinds']:
+        documents['datacite_json'] = datacite_json.render_datacite_json(record['list_metadata'])
+    return documents
+
+
+def write_item(record, documents, outputDir):
+    """Write the documents of an item, then save their fingerprints"""
+    if "metadata_log" in documents:
+        snapshot_diff.save_snapshot(outputDir, record['handle_number'], snapshot_diff.make_snapshot(record['list_metadata'], record['list_bitstream'], record['item_dict'].get("lastModified")))
+    paths = []
+    for kind, text in documents.items():
+        document_path = MODULES[kind].output_path(outputDir, record['handle_number'])
+        f = open(document_path,"w")
+        f.write(text)
+        f.close()
+        fingerprint.record(outputDir, kind, record['handle_number'], record['fingerprints'][kind], document_path)
+        paths.append(document_path)
+        #The schema is compiled once and reused for every item in the run
+        if kind == "datacite_xml":
+            errors = datacite_validate.validate_datacite_xml(text)
+            if errors:
+                print(datacite_validate.validation_report(document_path, errors))
+    return paths
+
+
+def run_pipeline(handle_urls, outputDir, kinds=DEFAULT_KINDS, force=False, profile_csv=True, fetch_threads=FETCH_THREADS, processes=None, queue_size=QUEUE_SIZE, failures=None):
+    """
+    Create the documents for each handle URL. Return the number of items written,
+    skipped because nothing changed, and failed. Failed items are recorded in
+    failures (a retry.FailureLog) if one is given.
+    """
+    makedirs(outputDir, exist_ok=True)
+    handle_urls = list(handle_urls)
+    inputs = queue.Queue(maxsize=queue_size)
+    fetched = queue.Queue(maxsize=queue_size)
+    rendered = queue.Queue(maxsize=queue_size)
+    #Limits the items anywhere in the pipeline, including items fetched early and
+    #waiting to be written in order
+    window = threading.BoundedSemaphore(queue_size * 3)
+
+    def feed():
+        for index, handle_url in enumerate(handle_urls):
+            window.acquire()
+            inputs.put((index, handle_url))
+        for x in range(fetch_threads):
+            inputs.put(DONE)
+
+    def fetch():
+        while True:
+            entry = inputs.get()
+            if entry is DONE:
+                fetched.put(DONE)
+                return
+            index, handle_url = entry
+            try:
+                fetched.put((index, fetch_item(handle_url, outputDir, kinds, force, profile_csv), None))
+            except Exception as e:
+                fetched.put((index, {'handle_url': handle_url}, "could not be read (" + str(e) + ")"))
+
+    def render(executor):
+        finished_fetchers = 0
+        while finished_fetchers < fetch_threads:
+            entry = fetched.get()
+            if entry is DONE:
+                finished_fetchers += 1
+                continue
+            index, record, error = entry
+            future = None
+            if error is None and record['kinds']:
+                future = executor.submit(render_item, record)
+            rendered.put((index, record, error, future))
+        rendered.put(DONE)
+
+    written = skipped = failed = 0
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        threads = [threading.Thread(target=feed, daemon=True)]
+        threads += [threading.Thread(target=fetch, daemon=True) for x in range(fetch_threads)]
+        threads.append(threading.Thread(target=render, args=(executor,), daemon=True))
+        for thread in threads:
+            thread.start()
+
+        #Write the items in input order. Items that arrive early wait in waiting.
+        waiting = {}
+        next_index = 0
+        while True:
+            entry = rendered.get()
+            if entry is DONE:
+                break
+            waiting[entry[0]] = entry
+            while next_index in waiting:
+                index, record, error, future = waiting.pop(next_index)
+                if error is None and future is not None:
+                    try:
+                        paths = write_item(record, future.result(), outputDir)
+                        print(record['handle_url'] + ": created " + ", ".join(paths))
+                        written += 1
+                    except Exception as e:
+                        error = "could not be created (" + str(e) + ")"
+                elif error is None:
+                    print(record['handle_url'] + " has not changed. Skipping.")
+                    skipped += 1
+                if error is not None:
+                    print(record['handle_url'] + " " + error)
+                    if failures is not None:
+                        failures.add(record['handle_url'], error)
+                    failed += 1
+                window.release()
+                next_index += 1
+        for thread in threads:
+            thread.join()
+    return written, skipped, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create curation documents for many DRUM items with a fetch, render and write pipeline.")
+    parser.add_argument("output_dir")
+    parser.add_argument("handle_urls", nargs="*", help="handle URLs of the items")
+    parser.add_argument("--handles", help="text file with one handle URL per line")
+    parser.add_argument("--scope", help="UUID of a collection or community: create documents for all of its items")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(DEFAULT_KINDS), help="documents to create (default: metadata_log readme datacite_xml)")
+    parser.add_argument("--force", action="store_true", help="create the documents even if the items have not changed")
+    parser.add_argument("--no-profile", action="store_true", help="do not profile CSV files for the readmes")
+    parser.add_argument("--fetch-threads", type=int, default=FETCH_THREADS)
+    parser.add_argument("--processes", type=int, help="number of render processes (default: one per CPU)")
+    parser.add_argument("--failures", help="file to record the items that failed in")
+    parser.add_argument("--retry-failed", action="store_true", help="also run the items recorded in --failures")
+    dspace_backend.add_arguments(parser)
+    args = parser.parse_args()
+    dspace_backend.from_args(args)
+
+    handle_urls = list(args.handle_urls)
+    failures = retry.FailureLog(args.failures) if args.failures else None
+    if args.retry_failed:
+        if failures is None:
+            parser.error("--retry-failed needs --failures")
+        handle_urls += [entry['link_url'] for entry in failures.take()]
+    if args.handles:
+        with open(args.handles) as f:
+            handle_urls += [line.strip() for line in f if line.strip()]
+    if args.scope:
+        import watch_collection
+        for item in watch_collection.changed_items(args.scope):
+            if item.get('handle'):
+                handle_urls.append("https://hdl.handle.net/" + item['handle'])
+    if not handle_urls:
+        parser.error("no items given")
+
+    written, skipped, failed = run_pipeline(handle_urls, args.output_dir, args.kinds, args.force, not args.no_profile, args.fetch_threads, args.processes, failures=failures)
+    print("Created documents for " + str(written) + " items. " + str(skipped) + " had not changed and " + str(failed) + " failed.")
+    if failed and failures is not None:
+        print("The failed items are listed in " + args.failures + ". Run again with --retry-failed to try only those.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: An optional local store of downloaded bitstreams, kept by checksum,
+so a file that was already downloaded for one item is not downloaded again for
+another. Many DRUM items deposit the same files again (shared codebooks, new
+versions of a dataset). When a bitstream's checksum (the API checkSum) is already
+in the store, the file is linked into the submission folder instead of being
+requested from DRUM. Files that are downloaded are added to the store.
+
+The store is a folder (it can be shared by several runs and worker processes),
+with each file saved as md5/<first two characters>/<checksum>. A file is only
+added once its MD5 checksum has been checked, and it is checked again before it
+is first used in a run (and whenever it has changed since), so a stored file that
+was changed through a link is removed from the store instead of being copied into
+other items. Files are linked in one of two ways:
+
+    hardlink  the folder and the store share the same file on disk, so it takes
+              no extra space. Changing the file in one folder changes it
+              everywhere, so downloaded files should be treated as read only.
+    reflink   a copy-on-write copy (Btrfs, XFS and other file systems that
+              support it), which takes no extra space until it is changed.
+
+If a link cannot be made (e.g. the store is on another drive, or the file system
+does not support reflinks), the file is copied from the store, which still saves
+downloading it.
+"""
+
+import shutil
+import threading
+from os import getpid, link, makedirs, remove, replace, stat
+from os import path
+from file_summary import convert_size
+from verify_download import md5_file
+
+try:
+    import fcntl
+except ImportError:
+    #Not available on Windows, where files are hardlinked or copied
+    fcntl = None
+
+
+#Ways a stored file can be placed in a submission folder
+LINK_MODES = ("hardlink", "reflink")
+#ioctl that clones a file on Linux (FICLONE in linux/fs.h)
+FICLONE = 0x40049409
+#The only algorithm DRUM reports for bitstreams
+ALGORITHM = "MD5"
+CHUNK_SIZE = 1024 * 1024
+
+
+def reflink(source, destination):
+    """Make a copy-on-write copy of a file. Raise OSError if the file system cannot."""
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this system")
+    with open(source, "rb") as src:
+        try:
+            with open(destination, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            if path.exists(destination):
+                remove(destination)
+            raise
+
+
+def copy_file(source, destination, mode):
+    """Link a file to a new path in the given mode, or copy it if it cannot be linked"""
+    if mode == "hardlink":
+        try:
+            link(source, destination)
+            return
+        except OSError:
+            pass
+    try:
+        reflink(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+class ContentStore:
+    """A folder of bitstreams kept by checksum"""
+
+    def __init__(self, root, mode="hardlink"):
+        if mode not in LINK_MODES:
+            raise ValueError("Unknown link mode: " + mode + " (use " + " or ".join(LINK_MODES) + ")")
+        self.root = root
+        self.mode = mode
+        self.lock = threading.Lock()
+        #Files and bytes taken from the store instead of being downloaded
+        self.linked_files = 0
+        self.linked_bytes = 0
+        #stored path -> (size, modification time) when its checksum was last checked
+        self.checked = {}
+        makedirs(root, exist_ok=True)
+
+    def stored_path(self, bitstream):
+        """Path where a bitstream is kept in the store, or None if it has no MD5 checksum"""
+        if not bitstream.checksum or (bitstream.checksum_algorithm or "").upper() != ALGORITHM:
+            return None
+        checksum = bitstream.checksum.lower()
+        return path.join(self.root, "md5", checksum[:2], checksum)
+
+    def find(self, bitstream):
+        """
+        Return the path of a bitstream in the store, or None if it is not there.
+        A stored file that no longer matches its checksum is removed from the store.
+        """
+        stored_path = self.stored_path(bitstream)
+        if stored_path is None or not path.isfile(stored_path):
+            return None
+        file_stat = stat(stored_path)
+        #A file of the wrong size is never used
+        if file_stat.st_size != bitstream.size:
+            return None
+        version = (file_stat.st_size, file_stat.st_mtime_ns)
+        with self.lock:
+            if self.checked.get(stored_path) == version:
+                return stored_path
+        if md5_file(stored_path) != bitstream.checksum.lower():
+            print(stored_path + " no longer matches its checksum, so it was removed from the content store")
+            try:
+                remove(stored_path)
+            except OSError:
+                pass
+            return None
+        with self.lock:
+            self.checked[stored_path] = version
+        return stored_path
+
+    def place(self, stored_path, destination):
+        """
+        Link (or copy) a stored file to a path in a submission folder. A file
+        already at the path is replaced, not written into.
+        """
+        temporary_path = destination + "." + str(getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        try:
+            copy_file(stored_path, temporary_path, self.mode)
+            replace(temporary_path, destination)
+        except OSError:
+            if path.exists(temporary_path):
+                remove(temporary_path)
+            raise
+
+    def read_chunks(self, stored_path):
+        """The content of a stored file in chunks, for archives"""
+        with open(stored_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                yield chunk
+
+    def used(self, bitstream):
+        """Count a bitstream that was taken from the store"""
+        with self.lock:
+            self.linked_files += 1
+            self.linked_bytes += bitstream.size
+
+    def add(self, bitstream, file_path):
+        """
+        Add a downloaded file to the store. It is only added if its MD5 checksum
+        matches the one DRUM reports. Return True if the store has the file.
+        """
+        stored_path = self.stored_path(bitstream)
+        if stored_path is None:
+            return False
+        if self.find(bitstream) is not None:
+            return True
+        if md5_file(file_path) != bitstream.checksum.lower():
+            print(file_path + " does not match its checksum from DRUM, so it was not added to the content store")
+            return False
+        makedirs(path.dirname(stored_path), exist_ok=True)
+        #The file is linked under a temporary name first, so other runs never see part of it
+        temporary_path = stored_path + "." + str(getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        try:
+            copy_file(file_path, temporary_path, self.mode)
+            replace(temporary_path, stored_path)
+        except OSError:
+            if path.exists(temporary_path):
+                remove(temporary_path)
+            raise
+        return True
+
+    def summary(self):
+        """Text describing the files taken from the store"""
+        return str(self.linked_files) + " files (" + convert_size(self.linked_bytes) + ") were taken from the content store instead of being downloaded."
@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+"""
+script name: datacite_json.py
+
+description: Create DataCite JSON (the JSON:API payload of the DataCite REST API)
+for DRUM submissions, with the same fields as the DataCite XML of datacite_xml.py,
+and send many of them to DataCite as draft DOIs at once instead of uploading each
+XML file by hand.
+
+Drafts are sent by a pool of threads sharing one connection pool. The requests
+are kept under a rate limit (the token bucket of bandwidth.py, counting requests
+instead of bytes) and busy or failing responses are retried with backoff (see
+retry.py). The DOI DataCite assigns to each draft is saved in datacite_dois.json
+next to the JSON files, so sending a file again updates its draft instead of
+creating another one, and creating the JSON again does not lose the DOI.
+
+The endpoint is the DataCite test API unless another is given with --endpoint or
+DATACITE_ENDPOINT (e.g. https://api.datacite.org). The repository account is
+given with --repository or DATACITE_REPOSITORY and the password with
+DATACITE_PASSWORD (or it is asked for). A local stub of the API can be run to
+try a batch without DataCite.
+
+example:
+    python datacite_json.py render C:/curation https://hdl.handle.net/11299/226188 https://hdl.handle.net/11299/226189
+    python datacite_json.py stub --port 8765
+    python datacite_json.py submit C:/curation/doi_metadata_*.json --endpoint http://localhost:8765 --prefix 10.5072
+    python datacite_json.py submit C:/curation/doi_metadata_*.json --repository UMN.DRUM --prefix 10.13020 --failures failed.jsonl
+"""
+
+import argparse
+import getpass
+import glob
+import json
+import os
+import random
+import re
+import string
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import path, replace
+import requests
+import urllib3
+import bandwidth
+import dspace_backend
+import fingerprint
+import retry
+
+
+#Change this when the JSON template changes, so existing files are created again
+TEMPLATE_VERSION = 1
+DEFAULT_ENDPOINT = "https://api.test.datacite.org"
+PUBLISHER = "Data Repository for the University of Minnesota (DRUM)"
+#Drafts sent at the same time, and requests per second to the endpoint
+WORKERS = 4
+RATE = 5
+TIMEOUT = 60
+#DOIs assigned to the JSON files of a folder
+DOIS_FILE = "datacite_dois.json"
+JSON_API_TYPE = "application/vnd.api+json"
+
+
+class DataCiteError(Exception):
+    """The endpoint refused a draft (e.g. missing fields or a wrong password)"""
+
+
+def datacite_json(handle_url, outputDir, force=False, prefix=None):
+    """
+    Create a DataCite JSON file for a submission. The file is not created again if
+    the item has not changed since it was written, unless force is True. With a
+    prefix (e.g. 10.13020), DataCite creates the DOI under that prefix.
+    Return the path of the JSON file.
+    """
+    handle_split = handle_url.split ("/") [-2:]
+    handle = str(handle_split[0]) + "/" + str(handle_split[1])
+    backend = dspace_backend.get_backend()
+
+    try:
+        item_dict = backend.find_item(handle)
+    except Exception as e:
+        print(handle + " could not be opened. (" + str(e) + ")")
+        raise
+
+    #Skip the item if the existing JSON was made from the same inputs
+    item_fingerprint = fingerprint.make_fingerprint(item_dict.get("lastModified"), TEMPLATE_VERSION)
+    #The prefix is part of the file, so a file made with another prefix is created again
+    if prefix:
+        item_fingerprint += "|" + prefix
+    existing_path = fingerprint.is_current(outputDir, "datacite_json", handle_split[1], item_fingerprint)
+    if existing_path and not force:
+        print(handle + " has not changed since " + existing_path + " was created. Skipping.")
+        return existing_path
+
+    list_metadata = backend.metadata(item_dict)
+    json_path = output_path(outputDir, handle_split[1])
+    f = open(json_path,"w")
+    f.write(render_datacite_json(list_metadata, prefix))
+    f.close()
+    fingerprint.record(outputDir, "datacite_json", handle_split[1], item_fingerprint, json_path)
+    return json_path
+
+
+def output_path(outputDir, handle_number):
+    return outputDir + "/doi_metadata_" + str(handle_number) + ".json"
+
+
+def datacite_attributes(list_metadata):
+    """The DataCite attributes of an item, from the same fields as the DataCite XML"""
+    title = ""
+    authors_list = []
+    abstract = ""
+    handle_uri = None
+    for x in range(len(list_metadata)):
+        if list_metadata[x]['key'] == 'dc.title':
+            title = list_metadata[x]['value']
+        if list_metadata[x]['key'] == 'dc.contributor.author':
+            authors_list.append(list_metadata[x]['value'])
+        if list_metadata[x]['key'] == 'dc.description.abstract':
+            abstract = list_metadata[x]['value']
+        if list_metadata[x]['key'] == 'dc.identifier.uri':
+            handle_uri = list_metadata[x]['value']
+
+    creators = []
+    for author in authors_list:
+        #Split up author name into family name and given name
+        author_split = author.split (", ") [:]
+        creator = {'name': author, 'nameType': "Personal", 'familyName': author_split[0].strip()}
+        if len(author_split) > 1:
+            creator['givenName'] = author_split[1]
+        creators.append(creator)
+
+    attributes = {'creators': creators,
+                  'titles': [{'title': title}],
+                  'publisher': PUBLISHER,
+                  'publicationYear': int(datetime.now().strftime("%Y")),
+                  'types': {'resourceTypeGeneral': "Dataset"},
+                  'descriptions': [{'description': abstract, 'descriptionType': "Abstract"}] if abstract else [],
+                  'schemaVersion': "http://datacite.org/schema/kernel-4"}
+    #The landing page. DataCite needs it before the DOI can be made findable.
+    if handle_uri:
+        attributes['url'] = handle_uri
+    return attributes
+
+
+def render_datacite_json(list_metadata, prefix=None):
+    """
+    Return the DataCite JSON payload for a draft DOI from the item's metadata list.
+    This does no network requests, so collection_pipeline.py can run it in another process.
+    """
+    attributes = datacite_attributes(list_metadata)
+    if prefix:
+        attributes['prefix'] = prefix
+    return json.dumps({'data': {'type': "dois", 'attributes': attributes}}, indent=2, ensure_ascii=False) + "\n"
+
+
+class DoiRegistry:
+    """The DOIs assigned to the JSON files of one folder, kept in datacite_dois.json"""
+
+    def __init__(self, folder):
+        self.path = path.join(folder, DOIS_FILE)
+        self.lock = threading.Lock()
+        try:
+            with open(self.path) as f:
+                self.dois = json.load(f)
+        except (OSError, ValueError):
+            self.dois = {}
+
+    def get(self, json_path):
+        with self.lock:
+            return self.dois.get(path.basename(json_path))
+
+    def set(self, json_path, doi):
+        with self.lock:
+            self.dois[path.basename(json_path)] = doi
+            with open(self.path + ".tmp", "w") as f:
+                json.dump(self.dois, f, indent=1, sort_keys=True)
+            replace(self.path + ".tmp", self.path)
+
+
+def not_sent(e):
+    """True for an error while connecting, before any of the request reached the endpoint"""
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(e, requests.exceptions.ConnectionError) and e.args:
+        reason = getattr(e.args[0], "reason", e.args[0])
+        return isinstance(reason, urllib3.exceptions.NewConnectionError)
+    return False
+
+
+def may_retry(e):
+    """
+    Whether a new draft (POST) can be sent again. Only a busy endpoint (429 or 503)
+    or a connection that was never made is retried. After any other error (e.g. a
+    500, 502 or 504, a timeout or a dropped connection) DataCite may have created
+    the draft, and a second POST would make another.
+    """
+    if isinstance(e, requests.exceptions.HTTPError):
+        return e.response is not None and e.response.status_code in (429, 503)
+    return not_sent(e)
+
+
+class DataCiteClient:
+    """
+    Send drafts to a DataCite-compatible endpoint over one pooled, rate-limited
+    session. Drafts without a prefix are sent with `prefix`, if one is given.
+    """
+
+    def __init__(self, endpoint=None, repository_id=None, password=None, workers=WORKERS, rate=RATE, prefix=None):
+        self.endpoint = (endpoint or os.environ.get("DATACITE_ENDPOINT") or DEFAULT_ENDPOINT).rstrip("/")
+        self.workers = workers
+        self.prefix = prefix
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({'Content-Type': JSON_API_TYPE, 'Accept': JSON_API_TYPE})
+        if repository_id:
+            self.session.auth = (repository_id, password)
+        self.limiter = bandwidth.BandwidthLimiter(str(rate))
+        #Failures of this endpoint do not pause the requests to DRUM
+        self.breaker = retry.CircuitBreaker()
+
+    def send(self, method, url, payload):
+        def request():
+            self.limiter.consume(1)
+            response = self.session.request(method, url, data=json.dumps(payload).encode("utf-8"), timeout=TIMEOUT)
+            if response.status_code in retry.TRANSIENT_STATUS:
+                response.raise_for_status()
+            return response
+        #Updating a draft (PUT) can be repeated safely, creating one (POST) cannot
+        retry_if = may_retry if method == "POST" else retry.is_transient
+        response = retry.retry_call(request, breaker=self.breaker, retry_if=retry_if)
+        if response.status_code >= 400:
+            try:
+                errors = "; ".join(error.get('title', "") for error in response.json().get('errors', []))
+            except ValueError:
+                errors = response.text[:200]
+            raise DataCiteError(str(response.status_code) + " " + (errors or response.reason))
+        return response.json()
+
+    def submit(self, payload, doi=None):
+        """Create a draft DOI (or update the draft `doi`). Return the DOI."""
+        if doi:
+            payload['data']['id'] = doi
+            payload['data']['attributes']['doi'] = doi
+            result = self.send("PUT", self.endpoint + "/dois/" + doi, payload)
+        else:
+            result = self.send("POST", self.endpoint + "/dois", payload)
+        return result['data']['id']
+
+    def submit_file(self, json_path, registry, failures=None):
+        """Send one JSON file and save its DOI. Return the DOI, or None if it failed."""
+        try:
+            with open(json_path, encoding="utf-8") as f:
+                payload = json.load(f)
+            #Only the payload that is sent gets the prefix. The file is not changed.
+            if self.prefix and not payload['data']['attributes'].get('prefix'):
+                payload['data']['attributes']['prefix'] = self.prefix
+            doi = self.submit(payload, registry.get(json_path))
+            registry.set(json_path, doi)
+            print(path.basename(json_path) + ": " + doi)
+            return doi
+        except Exception as e:
+            print(path.basename(json_path) + " could not be sent (" + str(e) + ")")
+            if failures is not None:
+                failures.add(json_path, e)
+            return None
+
+    def submit_files(self, json_paths, failures=None):
+        """Send many JSON files at the same time. Return a dictionary of path -> DOI (None if it failed)."""
+        registries = {}
+        for json_path in json_paths:
+            folder = path.dirname(path.abspath(json_path))
+            if folder not in registries:
+                registries[folder] = DoiRegistry(folder)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            dois = executor.map(lambda json_path: self.submit_file(json_path, registries[path.dirname(path.abspath(json_path))], failures), json_paths)
+            return dict(zip(json_paths, dois))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    A small stand-in for the DataCite REST API, to try a batch without DataCite:
+    POST /dois creates a draft, PUT /dois/<doi> creates or updates one, GET
+    /dois/<doi> returns one. Drafts are kept in memory. Set fail_rate on the
+    server to answer that share of the requests with 503, to try the retries.
+    """
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", JSON_API_TYPE)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_payload(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length))
+            attributes = payload['data']['attributes']
+        except (ValueError, KeyError, TypeError):
+            return None, [{'title': "Not a JSON:API document"}]
+        missing = [field for field in ("creators", "titles", "publisher", "publicationYear", "types") if not attributes.get(field)]
+        return attributes, [{'title': "Missing " + field} for field in missing]
+
+    def refuse(self):
+        """Answer 503 for a share of the requests, or 401 without the repository account"""
+        if random.random() < self.server.fail_rate:
+            self.send_json(503, {'errors': [{'title': "Service unavailable"}]})
+            return True
+        if self.server.password is not None and not self.headers.get("Authorization"):
+            self.send_json(401, {'errors': [{'title': "Bad credentials"}]})
+            return True
+        return False
+
+    def save(self, doi, attributes, status):
+        attributes = dict(attributes, doi=doi, state="draft")
+        with self.server.lock:
+            self.server.dois[doi] = attributes
+        self.send_json(status, {'data': {'id': doi, 'type': "dois", 'attributes': attributes}})
+
+    def do_POST(self):
+        if self.refuse():
+            return
+        if self.path.rstrip("/") != "/dois":
+            return self.send_json(404, {'errors': [{'title': "Not found"}]})
+        attributes, errors = self.read_payload()
+        if errors:
+            return self.send_json(422, {'errors': errors})
+        prefix = attributes.get('prefix') or self.server.prefix
+        suffix = "".join(random.choice(string.ascii_lowercase + string.digits) for x in range(8))
+        self.save(prefix + "/" + suffix[:4] + "-" + suffix[4:], attributes, 201)
+
+    def do_PUT(self):
+        if self.refuse():
+            return
+        match = re.match(r"^/dois/(.+)$", self.path)
+        if not match:
+            return self.send_json(404, {'errors': [{'title': "Not found"}]})
+        attributes, errors = self.read_payload()
+        if errors:
+            return self.send_json(422, {'errors': errors})
+        self.save(match.group(1), attributes, 200)
+
+    def do_GET(self):
+        match = re.match(r"^/dois/(.+)$", self.path)
+        with self.server.lock:
+            attributes = self.server.dois.get(match.group(1)) if match else None
+        if attributes is None:
+            return self.send_json(404, {'errors': [{'title': "Not found"}]})
+        self.send_json(200, {'data': {'id': match.group(1), 'type': "dois", 'attributes': attributes}})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(port=0, prefix="10.5072", fail_rate=0, password=None):
+    """
+    Run the stub endpoint in a background thread. Return the server; its URL is
+    "http://localhost:" + str(server.server_address[1]). Stop it with server.shutdown().
+    """
+    server = ThreadingHTTPServer(("localhost", port), StubHandler)
+    server.dois = {}
+    server.lock = threading.Lock()
+    server.prefix = prefix
+    server.fail_rate = fail_rate
+    server.password = password
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def expand_paths(patterns):
+    """
+    File paths from the command line, expanding wildcards (Windows does not).
+    The DOIs file of a folder (datacite_dois.json) is never sent as a draft.
+    """
+    json_paths = []
+    for pattern in patterns:
+        json_paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    return [json_path for json_path in json_paths if path.basename(json_path) != DOIS_FILE]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create DataCite JSON for DRUM submissions and send it to DataCite as draft DOIs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    render = commands.add_parser("render", help="create a DataCite JSON file for each item")
+    render.add_argument("output_dir")
+    render.add_argument("handle_urls", nargs="+")
+    render.add_argument("--prefix", help="DOI prefix, e.g. 10.13020 (or DATACITE_PREFIX)")
+    render.add_argument("--force", action="store_true", help="create the files even if the items have not changed")
+    dspace_backend.add_arguments(render)
+    submit = commands.add_parser("submit", help="send JSON files to the endpoint as draft DOIs")
+    submit.add_argument("json_paths", nargs="+")
+    submit.add_argument("--endpoint", help="DataCite API, e.g. https://api.datacite.org (default: DATACITE_ENDPOINT or the test API)")
+    submit.add_argument("--repository", help="repository account (or DATACITE_REPOSITORY), e.g. UMN.DRUM")
+    submit.add_argument("--prefix", help="DOI prefix for files that do not have one")
+    submit.add_argument("--workers", type=int, default=WORKERS, help="drafts sent at the same time")
+    submit.add_argument("--rate", type=float, default=RATE, help="most requests per second")
+    submit.add_argument("--failures", help="file to record the files that could not be sent in")
+    stub = commands.add_parser("stub", help="run a local stand-in for the DataCite API")
+    stub.add_argument("--port", type=int, default=8765)
+    stub.add_argument("--fail-rate", type=float, default=0, help="share of requests answered with 503")
+    args = parser.parse_args()
+
+    if args.command == "render":
+        dspace_backend.from_args(args)
+        os.makedirs(args.output_dir, exist_ok=True)
+        for handle_url in args.handle_urls:
+            try:
+                print(datacite_json(handle_url, args.output_dir, args.force, args.prefix or os.environ.get("DATACITE_PREFIX")))
+            except Exception as e:
+                print(handle_url + " could not be created (" + str(e) + ")")
+    elif args.command == "submit":
+        repository_id = args.repository or os.environ.get("DATACITE_REPOSITORY")
+        password = None
+        if repository_id:
+            password = os.environ.get("DATACITE_PASSWORD") or getpass.getpass("DataCite password for " + repository_id + ": ")
+        json_paths = expand_paths(args.json_paths)
+        prefix = args.prefix or os.environ.get("DATACITE_PREFIX")
+        client = DataCiteClient(args.endpoint, repository_id, password, args.workers, args.rate, prefix)
+        failures = retry.FailureLog(args.failures) if args.failures else None
+        print("Sending " + str(len(json_paths)) + " drafts to " + client.endpoint)
+        dois = client.submit_files(json_paths, failures)
+        failed = sum(1 for doi in dois.values() if doi is None)
+        print("Sent " + str(len(dois) - failed) + " drafts. " + str(failed) + " could not be sent.")
+    else:
+        server = start_stub(args.port, fail_rate=args.fail_rate)
+        print("DataCite stub running at http://localhost:" + str(server.server_address[1]) + " (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+script name: datacite_validate.py
+
+description: Check DataCite XML against the DataCite kernel-4 schema before it is
+uploaded, so files with problems (e.g. characters that are not escaped, or no
+creators) are found before DataCite rejects them. The schema is a partial copy of
+kernel-4.4 in datacite_kernel4_subset.xsd, kept with the tools so nothing is
+downloaded. This is a partial check: a file with errors will be rejected, but a
+file without errors may still be rejected by DataCite (e.g. for a relatedItems
+problem, which is not checked). The schema is compiled once per process and reused
+for every file, so a batch of 1,000 files takes seconds. Each file gets a list of
+its errors with line numbers.
+
+The XML made by these tools has an empty identifier, because DataCite assigns the
+DOI when the file is uploaded, so an empty identifier is accepted unless
+--require-doi is given.
+
+datacite_xml() and collection_pipeline.py check each XML file they create and
+print the errors.
+
+example:
+    python datacite_validate.py C:/curation/doi_metadata_*.xml
+    python datacite_validate.py C:/curation/doi_metadata_*.xml --require-doi
+"""
+
+import argparse
+import glob
+import sys
+import threading
+from os import path
+from lxml import etree
+
+
+SCHEMA_PATH = path.join(path.dirname(path.abspath(__file__)), "datacite_kernel4_subset.xsd")
+NAMESPACE = "http://datacite.org/schema/kernel-4"
+XSD_NAMESPACE = "{http://www.w3.org/2001/XMLSchema}"
+
+#Compiled schemas, by require_doi
+_schemas = {}
+_schema_lock = threading.Lock()
+
+
+def get_schema(require_doi=False):
+    """
+    The compiled schema, loaded the first time it is needed in this process. Without
+    require_doi, the identifier may also be empty (a draft that has no DOI yet).
+    """
+    with _schema_lock:
+        if require_doi not in _schemas:
+            document = etree.parse(SCHEMA_PATH)
+            if not require_doi:
+                pattern = document.find(".//" + XSD_NAMESPACE + "simpleType[@name='doiType']/" + XSD_NAMESPACE + "restriction/" + XSD_NAMESPACE + "pattern")
+                pattern.set("value", "(" + pattern.get("value") + ")?")
+            _schemas[require_doi] = etree.XMLSchema(document)
+        return _schemas[require_doi]
+
+
+def validate_datacite_xml(xml_text, require_doi=False):
+    """
+    Return the errors in a DataCite XML document as a list of strings (empty if
+    none were found). With require_doi, an empty identifier is an error.
+    """
+    if isinstance(xml_text, str):
+        xml_text = xml_text.encode("utf-8")
+    #The parser does not read external entities or anything from the network
+    parser = etree.XMLParser(resolve_entities=False, no_network=True)
+    try:
+        document = etree.fromstring(xml_text, parser)
+    except etree.XMLSyntaxError as e:
+        return ["line " + str(e.lineno) + ": " + e.msg]
+    schema = get_schema(require_doi)
+    #The error log belongs to the schema, so one thread validates at a time
+    with _schema_lock:
+        if schema.validate(document):
+            return []
+        #Element names are shown without the namespace, e.g. 'creators' rather than '{http://datacite.org/schema/kernel-4}creators'
+        return ["line " + str(error.line) + ": " + error.message.replace("{" + NAMESPACE + "}", "") for error in schema.error_log]
+
+
+def validation_report(name, errors):
+    """Text listing the errors of one file"""
+    if not errors:
+        return name + ": no errors found (partial check, see datacite_kernel4_subset.xsd)"
+    return name + ": " + str(len(errors)) + " errors\n" + "".join("    " + error + "\n" for error in errors).rstrip("\n")
+
+
+def validate_files(xml_paths, require_doi=False):
+    """Check XML files. Return a dictionary of path -> list of errors."""
+    results = {}
+    for xml_path in xml_paths:
+        try:
+            with open(xml_path, "rb") as f:
+                results[xml_path] = validate_datacite_xml(f.read(), require_doi)
+        except OSError as e:
+            results[xml_path] = ["could not be read (" + str(e) + ")"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check DataCite XML files against a partial copy of the DataCite kernel-4.4 schema.")
+    parser.add_argument("xml_paths", nargs="+", help="XML files (wildcards such as doi_metadata_*.xml can be used)")
+    parser.add_argument("--quiet", action="store_true", help="only list the files with errors")
+    parser.add_argument("--require-doi", action="store_true", help="report an empty identifier as an error (by default a draft without a DOI is accepted)")
+    args = parser.parse_args()
+
+    xml_paths = []
+    for pattern in args.xml_paths:
+        xml_paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    results = validate_files(xml_paths, args.require_doi)
+    invalid = 0
+    for xml_path, errors in results.items():
+        if errors:
+            invalid += 1
+        if errors or not args.quiet:
+            print(validation_report(xml_path, errors))
+    print("Checked " + str(len(results)) + " files. " + str(invalid) + " are not valid.")
+    print("This is a partial check against the kernel-4.4 properties in datacite_kernel4_subset.xsd. DataCite may still reject a file without errors.")
+    sys.exit(1 if invalid else 0)
+
+
+if __name__ == "__main__":
+    main()
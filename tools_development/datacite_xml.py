@@ -4,42 +4,76 @@ Created on Fri Jun  3 11:31:55 2022
 
 @author: kerni016
 """
-import urllib.request
-from bs4 import BeautifulSoup
 from datetime import datetime
+from xml.sax.saxutils import escape
+import datacite_validate
+import dspace_backend
+import fingerprint
 
 
-def datacite_xml(handle_url, outputDir):
-    
+#Change this when the XML template changes, so existing files are created again
+TEMPLATE_VERSION = 2
+
+
+def datacite_xml(handle_url, outputDir, force=False):
+    """
+    Create a DataCite XML file for a submission. The file is not created again if
+    the item has not changed since it was written, unless force is True. The XML
+    does not use the file list, so only the lastModified date of the item is compared.
+    Return the path of the XML file.
+    """
     #Use the handle URL to construct a URL to get to the Dspace endpoint for the item
     handle_split = handle_url.split ("/") [-2:]
     handle = str(handle_split[0]) + "/" + str(handle_split[1])
-    url = "https://conservancy.umn.edu/rest/handle/" + handle
+    backend = dspace_backend.get_backend()
 
-    #Try to access the Dspace endpoint. Return an error message and exit the script if the URL cannot be opened.
+    #Try to access the Dspace endpoint. Return an error message and exit the script if the item cannot be read.
     try:
-        response = urllib.request.urlopen(url)
+        item_dict = backend.find_item(handle)
     except Exception as e:
-        print(url + " could not be opened. (" + str(e) + ")")
+        print(handle + " could not be opened. (" + str(e) + ")")
+        raise
 
-    #Read in the content at the item API endpoint and get the internal id for the item
-    presoup = BeautifulSoup(response, 'lxml')
-    item_info = presoup.p.text
-    item_dict = eval(item_info.replace('null', '"null"'))
-
-    internal_id = item_dict["id"]
-    
-    metadata_url = "https://conservancy.umn.edu/rest/items/" + str(internal_id) + "/metadata"
+    #Skip the item if the existing XML was made from the same inputs
+    item_fingerprint = fingerprint.make_fingerprint(item_dict.get("lastModified"), TEMPLATE_VERSION)
+    existing_path = fingerprint.is_current(outputDir, "datacite_xml", handle_split[1], item_fingerprint)
+    if existing_path and not force:
+        print(handle + " has not changed since " + existing_path + " was created. Skipping.")
+        return existing_path
     
     #Read in the content at the metadata endpoint
-    response = urllib.request.urlopen(metadata_url)
-    soup = BeautifulSoup(response, 'lxml')
-    metadata = soup.p.string
-    list_metadata = eval(metadata.replace('null', '"null"'))
-    
-    
+    list_metadata = backend.metadata(item_dict)
+
+    datacite_schema = render_datacite_xml(list_metadata)
+
+    #Write the schema to an xml file
+    schema_log_path = output_path(outputDir, handle_split[1])
+    f = open(schema_log_path,"w") 
+    f.write(datacite_schema)
+    f.close()
+    fingerprint.record(outputDir, "datacite_xml", handle_split[1], item_fingerprint, schema_log_path)
+
+    #Check the XML against the DataCite schema, so problems are found before it is uploaded
+    errors = datacite_validate.validate_datacite_xml(datacite_schema)
+    if errors:
+        print(datacite_validate.validation_report(schema_log_path, errors))
+    return schema_log_path
+
+
+def output_path(outputDir, handle_number):
+    return outputDir + "/doi_metadata_" + str(handle_number) + ".xml"
+
+
+def render_datacite_xml(list_metadata):
+    """
+    Return the DataCite XML for an item from its metadata list. This does no network
+    requests, so collection_pipeline.py can run it in another process.
+    """
     #Create a list to hold the multi-valued metadata element "author"
     authors_list = []
+    #Missing fields are left empty, and the schema check reports them
+    title = ""
+    abstract = ""
     
     #For each metadata field in Dspace, check if it is something to be included in the XML.
     #If it is, save it to a variable.
@@ -59,14 +93,14 @@ def datacite_xml(handle_url, outputDir):
     for author in authors_list:
         #Split up author name
         author_split = author.split (", ") [:]
-        author_first = author_split[1]
+        author_first = author_split[1] if len(author_split) > 1 else ""
         author_last = author_split[0].strip()
         #loop through authors and append each new XML <creator> block to author_string
         author_string += """
         <creator>
-            <creatorName nameType="Personal">""" + author + """</creatorName>
-            <givenName>""" + author_first + """</givenName>
-            <familyName>""" + author_last + """</familyName>
+            <creatorName nameType="Personal">""" + escape(author) + """</creatorName>
+            <givenName>""" + escape(author_first) + """</givenName>
+            <familyName>""" + escape(author_last) + """</familyName>
         </creator>"""
 
 
@@ -77,7 +111,7 @@ def datacite_xml(handle_url, outputDir):
     <creators> """ + author_string + """
     </creators>
     <titles>
-        <title>""" + title + """</title>
+        <title>""" + escape(title) + """</title>
     </titles>
     <publisher>Data Repository for the University of Minnesota (DRUM)</publisher>
     <publicationYear>""" + str(datetime.now().strftime("%Y")) + """</publicationYear>
@@ -86,12 +120,7 @@ def datacite_xml(handle_url, outputDir):
     <formats/>
     <version/>
     <descriptions>
-        <description descriptionType="Abstract">""" + abstract + """</description>
+        <description descriptionType="Abstract">""" + escape(abstract) + """</description>
     </descriptions>
 </resource>"""
-
-    #Write the schema to an xml file
-    schema_log_path = outputDir + "/doi_metadata_" + str(handle_split[1]) + ".xml"
-    f = open(schema_log_path,"w") 
-    f.write(datacite_schema)
-    f.close()
+    return datacite_schema
@@ -5,37 +5,42 @@ Created on Wed Jun  8 15:45:29 2022
 @author: kerni016
 """
 
-import urllib.request
-from os import mkdir
-from bs4 import BeautifulSoup
+from os import makedirs, mkdir
+from os import path
+from bitstream_writers import safe_relative_path
+from download_filters import BitstreamFilter
+import dspace_backend
+import retry
 
 
 
-def download_files (handle_url, outputDir):
+def download_files (handle_url, outputDir, file_filter=None):
+    """
+    Download the files in the ORIGINAL bundle of a submission to a folder named
+    with the handle number. file_filter (a download_filters.BitstreamFilter) can
+    choose other bundles and only some of the files.
+    """
+    if file_filter is None:
+        file_filter = BitstreamFilter()
+
     #Use the handle URL to construct a URL to get to the Dspace endpoint for the item
     handle_split = handle_url.split ("/") [-2:]
     handle = str(handle_split[0]) + "/" + str(handle_split[1])
-    url = "https://conservancy.umn.edu/rest/handle/" + handle
+    #The download links use the sequenceId of each bitstream, which only the DSpace 6 API has
+    backend = dspace_backend.get_backend("6")
     
-    #Try to access the Dspace endpoint. Return an error message and exit the script if the URL cannot be opened.
+    #Try to access the Dspace endpoint. Return an error message and exit the script if the item cannot be read.
     try:
-        response = urllib.request.urlopen(url)
+        item_dict = backend.find_item(handle)
     except Exception as e:
-        print(url + " could not be opened. (" + str(e) + ")")
-    
-    #Read in the content at the item API endpoint and get the internal id for the item
-    presoup = BeautifulSoup(response, 'lxml')
-    item_info = presoup.p.text
-    item_dict = eval(item_info.replace('null', '"null"'))
-    
-    internal_id = item_dict["id"]
+        print(handle + " could not be opened. (" + str(e) + ")")
+        raise
     
-    bitstream_url = "https://conservancy.umn.edu/rest/items/" + str(internal_id) + "/bitstreams?limit=250"
     end_handle = handle_split[1] 
     
     #Create a folder with the unique handle number of the submission. Return an error if that folder already exists.
     try:
-        download_path = outputDir + "\\" + end_handle + "\\" 
+        download_path = path.join(outputDir, end_handle)
         mkdir(download_path)
         print("Creating directory: " + download_path)
     except Exception as e:
@@ -43,31 +48,23 @@ def download_files (handle_url, outputDir):
         #print ("Folder (" + download_path + ") already exists.")
     
     
-    #Read in the content at the bitstream API endpoint. Default limit is 20 items per page.
-    #Extended to 250 to account for larger data submissions.
-    response = urllib.request.urlopen(bitstream_url)
-    item_soup = BeautifulSoup(response, 'lxml')
-    bitstream = item_soup.p.text
-    list_bitstream = eval(bitstream.replace('null', '"null"'))
+    #Read every page of the bitstream list (see dspace_backend.py)
+    list_bitstream = backend.bitstream_entries(item_dict)
     
-    #For each bitstream in the bundle "ORIGINAL", construct a download link and request the files    
+    #For each bitstream in the bundle "ORIGINAL" (or chosen by the filter), construct a download link and request the files
     for x in list_bitstream:
-        if x['bundleName'] == "ORIGINAL":
+        if file_filter.wants_bundle(x['bundleName']) and file_filter.matches(x['name'], x['sizeBytes']):
             try:
                 filename = x['name']
-                sequenceId = x['sequenceId']
-                #check for white spaces in bitstream filename & replace if needed
-                if ' ' in filename:
-                    newfilename = filename.replace(' ', '%20')
-                    print("New filename: " + newfilename)
-                    
-                    download = "https://conservancy.umn.edu/bitstream/handle/" + handle + "/" + newfilename + "?sequence=" + str(sequenceId) + "&isAllowed=y/"
-                    print (download)
-                    urllib.request.urlretrieve(download, (download_path + "\\" + filename))
-                else:
-                    download = "https://conservancy.umn.edu/bitstream/handle/" + handle + "/" + newfilename + "?sequence=" + str(sequenceId) + "&isAllowed=y/"
-                    print (download)
-                    urllib.request.urlretrieve(download, (download_path + "\\" + filename))
-            except:
-                print ("Cannot download: " + filename + ". There may be spaces in the file name.  Please try downloading manually." )
-                pass
\ No newline at end of file
+                #Names from the API cannot point outside the folder (see bitstream_writers.py)
+                relative_path = safe_relative_path(filename)
+                #Files from other bundles are saved in a folder named after the bundle
+                if x['bundleName'] != "ORIGINAL":
+                    relative_path = safe_relative_path(x['bundleName']) + "/" + relative_path
+                file_path = path.join(download_path, *relative_path.split("/"))
+                makedirs(path.dirname(file_path), exist_ok=True)
+                download = backend.handle_download_url(handle, x)
+                print (download)
+                retry.urlretrieve(download, file_path)
+            except Exception as e:
+                print ("Cannot download: " + filename + ". Please try downloading manually. (" + str(e) + ")")
\ No newline at end of file
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: Choose which bitstreams of a submission to download, using only the
+bitstream list from the API, so no file is requested before it is chosen.
+A BitstreamFilter selects by:
+    bundles     - bundle names, e.g. ORIGINAL (the default), LICENSE or TEXT
+    globs       - filename patterns such as *.txt or README*
+    regexes     - regular expressions searched for in the filename
+    extensions  - file extensions such as csv or .pdf
+    min_size, max_size - limits on sizeBytes
+Names are matched without regard to case. A file has to match at least one of the
+globs, regexes and extensions (if any are given), and be within the size limits.
+
+Bitstreams from bundles other than ORIGINAL are saved in a folder named after the
+bundle, so e.g. LICENSE/license.txt does not replace a license.txt in ORIGINAL.
+"""
+
+import fnmatch
+import re
+
+
+DEFAULT_BUNDLES = ("ORIGINAL",)
+UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+
+def parse_size(text):
+    """Bytes from text such as 500, 20K, 5M or 1.5G"""
+    match = re.fullmatch(r"\s*([0-9.]+)\s*([kmgt]?)b?\s*", str(text).lower())
+    if not match:
+        raise ValueError("Not a file size: " + str(text))
+    return int(float(match.group(1)) * UNITS[match.group(2)])
+
+
+class BitstreamFilter:
+    """Which bundles to list and which of their bitstreams to download"""
+
+    def __init__(self, bundles=DEFAULT_BUNDLES, globs=None, regexes=None, extensions=None, min_size=None, max_size=None):
+        self.bundles = tuple(bundle.upper() for bundle in bundles)
+        self.globs = [glob.lower() for glob in globs or []]
+        self.regexes = [re.compile(regex, re.IGNORECASE) for regex in regexes or []]
+        self.extensions = ["." + extension.lower().lstrip(".") for extension in extensions or []]
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def wants_bundle(self, bundle_name):
+        return bundle_name.upper() in self.bundles
+
+    def matches(self, name, size_bytes):
+        """True if a bitstream with this name and size should be downloaded"""
+        if self.min_size is not None and size_bytes < self.min_size:
+            return False
+        if self.max_size is not None and size_bytes > self.max_size:
+            return False
+        if not (self.globs or self.regexes or self.extensions):
+            return True
+        lower_name = name.lower()
+        return (any(fnmatch.fnmatchcase(lower_name, glob) for glob in self.globs)
+                or any(regex.search(name) for regex in self.regexes)
+                or lower_name.endswith(tuple(self.extensions)))
+
+    def apply(self, bitstreams):
+        """The BitstreamRecords from the API list that match"""
+        return [bitstream for bitstream in bitstreams if self.matches(bitstream.name, bitstream.size)]
+
+    def description(self):
+        """Short text for progress messages, e.g. 'ORIGINAL, *.txt, at most 5.0 MB'"""
+        from file_summary import convert_size
+        parts = [", ".join(self.bundles)]
+        parts += self.globs + [regex.pattern for regex in self.regexes] + ["*" + extension for extension in self.extensions]
+        if self.min_size is not None:
+            parts.append("at least " + convert_size(self.min_size))
+        if self.max_size is not None:
+            parts.append("at most " + convert_size(self.max_size))
+        return ", ".join(parts)
+
+
+def saved_name(bitstream):
+    """Name a bitstream is saved under: in a folder named after its bundle, except for ORIGINAL"""
+    if bitstream.bundle == "ORIGINAL":
+        return bitstream.name
+    return bitstream.bundle + "/" + bitstream.name
+
+
+def add_arguments(parser):
+    """Add the filter options to an argparse parser"""
+    parser.add_argument("--bundles", nargs="+", default=list(DEFAULT_BUNDLES), help="bundles to download from (default: ORIGINAL), e.g. ORIGINAL LICENSE TEXT")
+    parser.add_argument("--glob", nargs="+", dest="globs", help="only download files whose names match one of these patterns, e.g. \"*.txt\" \"README*\"")
+    parser.add_argument("--regex", nargs="+", dest="regexes", help="only download files whose names contain a match for one of these regular expressions")
+    parser.add_argument("--ext", nargs="+", dest="extensions", help="only download files with these extensions, e.g. txt pdf")
+    parser.add_argument("--min-size", type=parse_size, help="skip files smaller than this, e.g. 10K")
+    parser.add_argument("--max-size", type=parse_size, help="skip files larger than this, e.g. 5M")
+
+
+def from_args(args):
+    """Make a BitstreamFilter from the options added by add_arguments, or None if none were used"""
+    file_filter = BitstreamFilter(args.bundles, args.globs, args.regexes, args.extensions, args.min_size, args.max_size)
+    if file_filter.bundles == DEFAULT_BUNDLES and not (args.globs or args.regexes or args.extensions) and args.min_size is None and args.max_size is None:
+        return None
+    return file_filter
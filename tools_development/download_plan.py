@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: Plan a download before any files are written. The sizes of all of the
+bitstreams (their sizes from the API) are added up and compared with the free space
+on the target drive, so a download does not fail halfway through because the drive
+is full. When several files are downloaded at once, the files are ordered so that
+large and small files alternate and the workers are not left waiting behind one
+very large file. A dry run prints the plan with an estimate of how long it will
+take, based on the download speed measured in recent runs.
+"""
+
+import json
+import shutil
+import time
+from os import path
+from file_summary import convert_size
+
+
+#Recent download speeds are kept in the user's home folder
+THROUGHPUT_FILE = path.join(path.expanduser("~"), ".drum_tools_throughput.json")
+#Number of recent runs used for the estimate
+THROUGHPUT_RUNS = 10
+#Extra free space to leave on the drive after the download (bytes)
+SPACE_MARGIN = 100 * 1024 * 1024
+
+
+class InsufficientSpaceError(Exception):
+    """The submission does not fit in the free space on the target drive"""
+
+
+def order_for_throughput(bitstreams):
+    """
+    Order bitstreams largest, smallest, second largest, second smallest, ...
+    so the large files start early and the small files fill in around them.
+    """
+    by_size = sorted(bitstreams, key=lambda b: b.size, reverse=True)
+    ordered = []
+    first = 0
+    last = len(by_size) - 1
+    while first <= last:
+        ordered.append(by_size[first])
+        first += 1
+        if first <= last:
+            ordered.append(by_size[last])
+            last -= 1
+    return ordered
+
+
+def make_plan(bitstreams, target_dir=None, parallel_files=1, store=None):
+    """
+    Return a dictionary describing the download: the files in the order they will
+    be downloaded, the total size, and the free space on the drive of target_dir.
+    Files already in the content store (a content_store.ContentStore) are linked
+    rather than downloaded, so their size is counted separately.
+    """
+    plan = {'files': bitstreams,
+            'total_bytes': sum(b.size for b in bitstreams),
+            'stored_files': 0,
+            'stored_bytes': 0,
+            'free_bytes': None}
+    if store is not None:
+        stored = [b for b in bitstreams if store.find(b) is not None]
+        plan['stored_files'] = len(stored)
+        plan['stored_bytes'] = sum(b.size for b in stored)
+    if parallel_files > 1:
+        plan['files'] = order_for_throughput(bitstreams)
+    if target_dir:
+        plan['free_bytes'] = shutil.disk_usage(target_dir).free
+    return plan
+
+
+def download_bytes(plan):
+    """Bytes that will be downloaded (linked files from the content store are not counted)"""
+    return plan['total_bytes'] - plan['stored_bytes']
+
+
+def check_space(plan):
+    """Raise InsufficientSpaceError if the planned download will not fit on the drive"""
+    if plan['free_bytes'] is not None and download_bytes(plan) + SPACE_MARGIN > plan['free_bytes']:
+        raise InsufficientSpaceError("The submission needs " + convert_size(download_bytes(plan)) + " but only " + convert_size(plan['free_bytes']) + " is free on the target drive.")
+
+
+def load_throughput():
+    """Return the list of recent runs as [bytes, seconds] pairs"""
+    try:
+        with open(THROUGHPUT_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def record_throughput(size_bytes, seconds):
+    """Save the speed of a finished download to use in later estimates"""
+    if size_bytes <= 0 or seconds <= 0:
+        return
+    runs = load_throughput()[-(THROUGHPUT_RUNS - 1):]
+    runs.append([size_bytes, seconds])
+    try:
+        with open(THROUGHPUT_FILE, "w") as f:
+            json.dump(runs, f)
+    except OSError as e:
+        print("Could not save the download speed (" + str(e) + ")")
+
+
+def estimated_seconds(total_bytes):
+    """Estimate the download time from the recent runs, or return None if there are none"""
+    runs = load_throughput()
+    if not runs:
+        return None
+    bytes_per_second = sum(r[0] for r in runs) / sum(r[1] for r in runs)
+    return total_bytes / bytes_per_second
+
+
+def plan_string(plan):
+    """Describe the plan for a dry run"""
+    plan_text = "Files to download: " + str(len(plan['files'])) + " (" + convert_size(plan['total_bytes']) + ")\n"
+    if plan['stored_files']:
+        plan_text += "Already in the content store: " + str(plan['stored_files']) + " (" + convert_size(plan['stored_bytes']) + ")\n"
+    if plan['free_bytes'] is not None:
+        plan_text += "Free space on the target drive: " + convert_size(plan['free_bytes'])
+        if download_bytes(plan) + SPACE_MARGIN > plan['free_bytes']:
+            plan_text += " - NOT ENOUGH SPACE"
+        plan_text += "\n"
+    seconds = estimated_seconds(download_bytes(plan))
+    if seconds is None:
+        plan_text += "Estimated time: unknown (no downloads have been measured yet)\n"
+    else:
+        plan_text += "Estimated time: " + time.strftime("%H:%M:%S", time.gmtime(seconds))
+        if seconds >= 86400:
+            plan_text += " plus " + str(int(seconds // 86400)) + " day(s)"
+        plan_text += " (based on recent download speeds)\n"
+    plan_text += "\nDownload order:\n"
+    for b in plan['files']:
+        plan_text += "\t" + b.name + " (" + convert_size(b.size) + ")\n"
+    return plan_text
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: Item data for the DRUMToolsDspace7 notebook. get_item() returns one
+DrumItem for each link for the whole session, so the curator log, readme and XML
+sections reuse the item, bundle and bitstream data that was already fetched instead
+of requesting it again. get_items() fetches several links at the same time.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from bitstream_iterator import BitstreamPages
+from dspace_backend import get_backend
+
+
+#Number of links fetched at the same time
+WORKERS = 8
+
+_items = {}
+_items_lock = threading.Lock()
+
+
+class DrumItem:
+    """The item, bundle and bitstream data of one DRUM record. Each part is fetched once."""
+
+    def __init__(self, link_url):
+        self.link_url = link_url
+        backend = get_backend("7")
+        self.item_api_url = backend.item_api_url(link_url)
+        self.item_uuid = self.item_api_url.split ("/") [-1]
+        #The item is kept here for the session, so the shared cache is not used
+        self.data = backend.item(self.item_api_url, cache=False)
+        self._bundles = None
+        self._bitstreams = None
+        self._expected_count = None
+        self.lock = threading.Lock()
+
+    @property
+    def bundles(self):
+        """The bundles endpoint of the item (bundlesData in the notebook)"""
+        with self.lock:
+            if self._bundles is None:
+                self._bundles = get_backend("7").bundles(self.data, cache=False)
+            return self._bundles
+
+    @property
+    def bitstreams_url(self):
+        """The bitstreams endpoint of the ORIGINAL bundle"""
+        for bundle in self.bundles['_embedded']['bundles']:
+            if bundle['name'] == "ORIGINAL":
+                return bundle['_links']['bitstreams']['href']
+        return None
+
+    def iter_bitstreams(self):
+        """
+        Yield the bitstreams of the ORIGINAL bundle as BitstreamRecords. The first
+        time, they are yielded as the pages of the list arrive (see bitstream_iterator.py),
+        so a notebook cell can work on them before the whole list is read. They are
+        kept for the later sections.
+        """
+        if self._bitstreams is not None:
+            yield from self._bitstreams
+            return
+        bitstreams_url = self.bitstreams_url
+        if bitstreams_url is None:
+            self._bitstreams = []
+            self._expected_count = 0
+            return
+        listing = BitstreamPages(bitstreams_url)
+        bitstreams = []
+        for record in listing:
+            bitstreams.append(record)
+            yield record
+        with self.lock:
+            self._bitstreams = bitstreams
+            self._expected_count = listing.total
+
+    @property
+    def bitstreams(self):
+        """All of the bitstreams in the ORIGINAL bundle, as BitstreamRecords"""
+        if self._bitstreams is None:
+            for record in self.iter_bitstreams():
+                pass
+        return self._bitstreams
+
+    @property
+    def expected_count(self):
+        """Number of bitstreams the API reports for the ORIGINAL bundle"""
+        self.bitstreams
+        return self._expected_count
+
+    def prefetch(self):
+        """Fetch the bundles and every page of bitstreams now rather than when first used"""
+        self.bitstreams
+        return self
+
+
+def get_item(link_url, refresh=False):
+    """Return the DrumItem for a link, fetching it only the first time (or if refresh is True)"""
+    with _items_lock:
+        item = _items.get(link_url)
+    if item is None or refresh:
+        item = DrumItem(link_url)
+        with _items_lock:
+            _items[link_url] = item
+    return item
+
+
+def get_items(link_urls, workers=WORKERS):
+    """Fetch several links at the same time. Return their DrumItems in the same order."""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda link_url: get_item(link_url).prefetch(), link_urls))
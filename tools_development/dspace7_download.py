@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+script name: dspace7_download.py
+
+description: Download the content files of a DRUM (DSpace 7) submission. This is
+the code behind Dspace7/DRUM_downloadFiles_Dspace7.py, kept separate from the
+tkinter interface so it can be used by other tools. Each file is streamed from
+the server in chunks to a writer from bitstream_writers.py, which saves it in
+the submission folder, in a BagIt bag, or in a ZIP or TAR archive. Bitstreams
+larger than ranged_threshold are downloaded as several byte ranges in parallel
+when saving to a folder or bag (see ranged_download.py). The whole download is
+planned first and checked against the free space on the drive (download_plan.py).
+
+It can also be run from the command line. An archive can be written to stdout
+to pipe it to other storage without saving it locally, e.g.
+    python dspace7_download.py https://hdl.handle.net/11299/226188 - --archive tar | aws s3 cp - s3://bucket/226188.tar
+
+Embargoed and restricted files can only be downloaded after logging in with a
+DRUM account that has access to them (--login, see dspace_session.py). They are
+skipped otherwise.
+
+With --store, files that were already downloaded for another item (the same
+checksum) are linked from a local content store instead of being downloaded again,
+and new files are added to it (see content_store.py).
+"""
+
+import argparse
+import bandwidth
+import requests
+import sys
+import time
+from os import mkdir
+from os import path
+from bitstream_iterator import iter_bitstreams
+from bitstream_writers import CHUNK_SIZE, BagWriter, FolderWriter, TarWriter, ZipWriter
+from concurrent.futures import ThreadPoolExecutor
+from content_store import LINK_MODES, ContentStore
+import dspace_backend
+from dspace_session import LoginError, get_session, login
+from file_summary import convert_size
+import download_filters
+import download_plan
+import retry
+from ranged_download import RANGED_THRESHOLD, WORKERS, RangesNotSupported
+
+
+def get_item_api_url(link_url):
+    """Take a DRUM URL, handle, or DOI and return the API endpoint URL for the item (see dspace_backend.py)"""
+    return dspace_backend.get_backend("7").item_api_url(link_url)
+
+
+def bitstream_download_url(identifier):
+    """Return the link to download a bitstream (see dspace_backend.py)"""
+    return dspace_backend.get_backend("7").bitstream_download_url(identifier)
+
+
+def stream_bitstream(download):
+    """
+    Request a bitstream and return an iterator over its content in chunks. The
+    response is closed once the chunks end, or when the writer stops reading them
+    (e.g. after an error), so its connection goes back to the pool.
+    """
+    response = get_session().get(download, stream=True)
+    try:
+        response.raise_for_status()
+    except Exception:
+        response.close()
+        raise
+    return read_response(response)
+
+
+def read_response(response):
+    try:
+        #The bandwidth cap is kept chunk by chunk while the file streams (see bandwidth.py)
+        for chunk in bandwidth.LIMITER.throttle(response.iter_content(CHUNK_SIZE)):
+            yield chunk
+    finally:
+        response.close()
+
+
+def list_bitstreams(itemData, bundles=("ORIGINAL",)):
+    """
+    Return the bitstreams in the ORIGINAL bundle of an item (or in the given
+    bundles) as a list of BitstreamRecords, reading every page of the list.
+    Use bitstream_iterator.iter_bitstreams to work on them as the pages arrive.
+    """
+    return list(iter_bitstreams(itemData, bundles))
+
+
+def transfer_interrupted(e):
+    """True for a connection that failed during a download, rather than an error response"""
+    return retry.is_transient(e) and not isinstance(e, requests.exceptions.HTTPError)
+
+
+def download_bitstream(writer, bitstream, ranged_threshold=RANGED_THRESHOLD, workers=WORKERS, failures=None, link_url=None, store=None):
+    """
+    Download one bitstream to the writer. Return True if it was downloaded, or
+    False if it was skipped because of an error. Skipped files are recorded in
+    failures (a retry.FailureLog) if one is given. With a store (a
+    content_store.ContentStore), a file that is already in it is taken from the
+    store, and a downloaded file is added to it.
+    """
+    filename = download_filters.saved_name(bitstream)
+    identifier = bitstream.uuid
+    size_bytes = bitstream.size
+    filesize = convert_size(size_bytes)
+    download = bitstream_download_url(identifier)
+
+    def transfer():
+        if ranged_threshold is not None and size_bytes >= ranged_threshold and hasattr(writer, "add_ranged_file"):
+            try:
+                return writer.add_ranged_file(filename, size_bytes, download, workers)
+            except RangesNotSupported:
+                print("The server does not support range requests. Downloading " + filename + " in one stream.")
+        return writer.add_file(filename, size_bytes, stream_bitstream(download))
+
+    try:
+        stored_path = store.find(bitstream) if store is not None else None
+        if stored_path is not None:
+            if hasattr(writer, "add_stored_file"):
+                writer.add_stored_file(filename, size_bytes, stored_path, store)
+            else:
+                writer.add_file(filename, size_bytes, store.read_chunks(stored_path))
+            store.used(bitstream)
+            print(filename + " (" + filesize + ") was taken from the content store")
+            return True
+        print("Now downloading: " + filename + " (" + filesize + ") ...")
+        #Folder and bag writers remove a partial file, so a file whose connection drops
+        #part way can be sent again. An archive cannot take back what was already written
+        #to it. Error responses were already retried by the session.
+        if writer.parallel_safe:
+            file_path = retry.retry_call(transfer, retries=2, retry_if=transfer_interrupted)
+        else:
+            file_path = transfer()
+        print(filename + " has been downloaded")
+        #Only files saved in a folder can be added to the store
+        if store is not None and hasattr(writer, "add_stored_file"):
+            try:
+                store.add(bitstream, file_path)
+            except OSError as e:
+                print("Could not add " + filename + " to the content store (" + str(e) + ")")
+        return True
+    except Exception as e:
+        print ("Cannot download: " + filename + ". Skipping file.  Please try downloading manually. More detail about the error: " + str(e))
+        if failures is not None:
+            failures.add(link_url, e, bitstream)
+        return False
+
+
+def select_bitstreams(itemData, progress=None, only_bitstreams=None, file_filter=None):
+    """The bitstreams of an item to download, after the filter, the files already done and only_bitstreams (see downloadFiles)"""
+    #The bitstreams are filtered as each page of the list arrives. The plan needs the
+    #sizes of all of them before the first file starts, to check the free space.
+    if file_filter is None:
+        bitstreams = iter_bitstreams(itemData)
+    else:
+        bitstreams = (b for b in iter_bitstreams(itemData, file_filter.bundles) if file_filter.matches(b.name, b.size))
+    if progress is not None:
+        bitstreams = (b for b in bitstreams if not progress.is_done(b))
+    if only_bitstreams is not None:
+        bitstreams = (b for b in bitstreams if b.uuid in only_bitstreams)
+    bitstreams = list(bitstreams)
+    if file_filter is not None:
+        print("Downloading " + str(len(bitstreams)) + " files that match: " + file_filter.description())
+    return bitstreams
+
+
+def downloadFiles (link_url, item_api_url, download_path, writer=None, ranged_threshold=RANGED_THRESHOLD, workers=WORKERS, parallel_files=1, dry_run=False, progress=None, failures=None, only_bitstreams=None, file_filter=None, store=None, plan=None):
+    """
+    Scrape information about the deposited files from the item bitstream API endpoint.
+    Construct a download link and stream each file to the writer (by default, a
+    FolderWriter saving files in the submission folder generated by validate_input).
+    Files of at least ranged_threshold bytes are downloaded in `workers` parallel
+    ranges if the writer supports it. Set ranged_threshold to None to turn this off.
+
+    Before anything is downloaded, the sizes of all the files are checked against
+    the free space on the target drive (InsufficientSpaceError is raised if they do
+    not fit). With parallel_files > 1, files are downloaded at the same time in an
+    order that mixes large and small files. With dry_run, the plan is printed and
+    nothing is downloaded.
+
+    progress (e.g. a BitstreamProgress from job_queue.py) records each file as soon
+    as it is downloaded, and files it already has are skipped, so an interrupted
+    download can be restarted. Files that cannot be downloaded are recorded in
+    failures (a retry.FailureLog). only_bitstreams is a set of bitstream ids to
+    download instead of all of them, e.g. the failures of an earlier run.
+    file_filter (a download_filters.BitstreamFilter) chooses the bundles and files
+    from the bitstream list, before any file is requested. With a store (a
+    content_store.ContentStore), files already in it are linked instead of downloaded.
+    A plan made (and checked) before the writer was created can be given with plan
+    (see main), so the bitstreams are not listed again.
+    Return the number of files downloaded and the number skipped.
+    """
+    if writer is None and not dry_run:
+        writer = FolderWriter(download_path)
+
+    itemData = dspace_backend.get_backend("7").item(item_api_url)
+    #Archives are written one file at a time, so they are never downloaded in parallel
+    if writer is not None and not writer.parallel_safe:
+        parallel_files = 1
+    if plan is None:
+        bitstreams = select_bitstreams(itemData, progress, only_bitstreams, file_filter)
+        target_dir = download_path
+        if writer is not None:
+            target_dir = writer.target_dir
+        plan = download_plan.make_plan(bitstreams, target_dir, parallel_files, store)
+        if not dry_run:
+            download_plan.check_space(plan)
+    if dry_run:
+        print(download_plan.plan_string(plan))
+        return 0, 0
+
+    def download(bitstream):
+        result = download_bitstream(writer, bitstream, ranged_threshold, workers, failures, link_url, store)
+        if result and progress is not None:
+            progress.mark_done(bitstream)
+        #A file that failed in an earlier run is only removed from the failures once it is downloaded
+        if result and only_bitstreams is not None and failures is not None:
+            failures.remove(link_url, bitstream.uuid)
+        return result
+
+    start_time = time.time()
+    stored_bytes = store.linked_bytes if store is not None else 0
+    if parallel_files > 1:
+        with ThreadPoolExecutor(max_workers=parallel_files) as executor:
+            results = list(executor.map(download, plan['files']))
+    else:
+        results = [download(b) for b in plan['files']]
+    downloaded_files = results.count(True)
+    passed_files = results.count(False)
+    downloaded_bytes = sum(b.size for b, result in zip(plan['files'], results) if result)
+    #Files taken from the store do not count towards the download speed
+    if store is not None:
+        downloaded_bytes -= store.linked_bytes - stored_bytes
+    download_plan.record_throughput(downloaded_bytes, time.time() - start_time)
+
+    #Finish the output (e.g. write the manifests and bag-info.txt of a BagIt bag)
+    writer.close(itemData)
+    return downloaded_files, passed_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the content files of a DRUM submission.")
+    parser.add_argument("link_url", help="DRUM URL, handle, or DOI of the submission")
+    parser.add_argument("output_dir", help="folder to save the submission folder or archive in, or - to write an archive to stdout")
+    parser.add_argument("--bag", action="store_true", help="save the files as a BagIt bag")
+    parser.add_argument("--archive", choices=["zip", "tar", "tar.gz"], help="save the files in a single archive instead of a folder")
+    parser.add_argument("--compress", action="store_true", help="compress the files in a ZIP archive")
+    parser.add_argument("--ranged-threshold", type=int, default=RANGED_THRESHOLD // (1024 * 1024), help="download files of at least this many MB in parallel byte ranges (0 to turn off)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="number of byte ranges downloaded at the same time")
+    parser.add_argument("--parallel-files", type=int, default=1, help="number of files downloaded at the same time (folders and bags only)")
+    parser.add_argument("--dry-run", action="store_true", help="print the download plan and an estimated time, without downloading anything")
+    download_filters.add_arguments(parser)
+    parser.add_argument("--login", action="store_true", help="log in to download embargoed and restricted files (asks for the password, or uses DRUM_EMAIL and DRUM_PASSWORD)")
+    parser.add_argument("--email", help="email of the DRUM account to log in with")
+    dspace_backend.add_arguments(parser, api=False)
+    parser.add_argument("--bandwidth", help="cap on the download speed, e.g. 5M, or \"Mon-Fri 08:00-18:00=5M\" for business hours only (see bandwidth.py)")
+    parser.add_argument("--store", help="content store folder: files already in it are linked instead of downloaded, and new files are added to it")
+    parser.add_argument("--link", choices=LINK_MODES, default="hardlink", help="how files from --store are placed in the folder (default hardlink)")
+    parser.add_argument("--failures", help="file to record the files that could not be downloaded in")
+    parser.add_argument("--retry-failed", action="store_true", help="only download the files recorded in --failures for this submission, into the existing folder")
+    args = parser.parse_args()
+
+    if args.output_dir == "-" and not args.archive:
+        parser.error("--archive is needed to write to stdout")
+    if args.bag and args.archive:
+        parser.error("--bag and --archive cannot be used together")
+    if args.retry_failed and (not args.failures or args.archive or args.bag):
+        parser.error("--retry-failed needs --failures and saves to a folder")
+    dspace_backend.from_args(args)
+    if args.bandwidth:
+        try:
+            bandwidth.set_schedule(args.bandwidth)
+        except ValueError as e:
+            parser.error(str(e))
+
+    #When the archive goes to stdout, progress messages are printed to stderr instead
+    if args.output_dir == "-":
+        output = sys.stdout.buffer
+        sys.stdout = sys.stderr
+
+    if args.login or args.email:
+        try:
+            login(args.email)
+        except LoginError as e:
+            sys.exit(str(e))
+        print("Logged in as " + get_session().email)
+
+    item_api_url = get_item_api_url(args.link_url)
+    itemData = dspace_backend.get_backend("7").item(item_api_url)
+    handle_number = itemData['metadata']['dc.identifier.uri'][0]['value'].split ("/") [-1]
+
+    ranged_threshold = args.ranged_threshold * 1024 * 1024 if args.ranged_threshold > 0 else None
+    failures = retry.FailureLog(args.failures) if args.failures else None
+    file_filter = download_filters.from_args(args)
+    store = ContentStore(args.store, args.link) if args.store else None
+    only_bitstreams = None
+    if args.retry_failed:
+        only_bitstreams = set(entry.get('bitstream') for entry in failures.find(args.link_url))
+        if not only_bitstreams:
+            sys.exit("No failed files are recorded in " + args.failures + " for " + args.link_url)
+    #Create a folder with the unique handle number of the submission, as the tkinter tool does
+    download_path = None if args.archive else path.join(args.output_dir, handle_number)
+    if download_path is not None and path.isdir(download_path) and not (args.retry_failed or args.dry_run):
+        sys.exit("The folder (" + download_path + ") already exists in the target location. Files will not be (re)downloaded.")
+
+    #The plan and the free space are checked before the folder or archive is created,
+    #so a submission that does not fit leaves nothing behind
+    target_dir = args.output_dir if args.output_dir != "-" else None
+    parallel_files = 1 if args.archive else args.parallel_files
+    plan = download_plan.make_plan(select_bitstreams(itemData, only_bitstreams=only_bitstreams, file_filter=file_filter), target_dir, parallel_files, store)
+    if args.dry_run:
+        print(download_plan.plan_string(plan))
+        return
+    try:
+        download_plan.check_space(plan)
+    except download_plan.InsufficientSpaceError as e:
+        sys.exit(str(e))
+
+    if args.archive:
+        if args.output_dir != "-":
+            output = path.join(args.output_dir, handle_number + "." + args.archive)
+        if args.archive == "zip":
+            writer = ZipWriter(output, handle_number, args.compress)
+        else:
+            writer = TarWriter(output, handle_number, args.archive == "tar.gz")
+    else:
+        if path.isdir(download_path):
+            print("Downloading " + str(len(only_bitstreams)) + " files that failed before into " + download_path)
+        else:
+            mkdir(download_path)
+            print("Creating directory: " + download_path)
+        writer = BagWriter(download_path) if args.bag else FolderWriter(download_path)
+
+    downloaded_files, passed_files = downloadFiles(args.link_url, item_api_url, download_path, writer, ranged_threshold, args.workers, parallel_files,
+                                                   failures=failures, only_bitstreams=only_bitstreams, file_filter=file_filter, store=store, plan=plan)
+    print("Finished downloading " + str(downloaded_files) + " files. " + str(passed_files) + " were skipped due to a download error.")
+    if store is not None:
+        print(store.summary())
+    if passed_files and failures is not None:
+        print("The skipped files are listed in " + args.failures + ". Add --retry-failed to download only those.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: One interface to the DRUM REST API, with a backend for the DSpace 6
+REST API (/rest, read by the metadata log, readme and DataCite tools) and one for
+the DSpace 7 REST API (/server/api, read by the download, verify and watch tools
+and the notebook). Both backends have the same methods for the curation documents:
+
+    find_item(handle)       the item with a handle, e.g. 11299/226188
+    metadata(item)          its metadata as a list of key, value, language dictionaries
+    iter_bitstreams(item)   its bitstreams as BitstreamRecords (see bitstream_record.py)
+    download_url(bitstream) the link to download a bitstream
+
+so the documents can be made from either API (DRUM_API=7 or --api 7 reads them
+from DSpace 7 instead of DSpace 6).
+
+Both backends read JSON through one client: the pooled, retrying session from
+dspace_session.py, with a small in-memory cache so the documents of an item (e.g.
+the log, readme and XML jobs of job_queue.py) read the item once. Every page of a
+list is read. The DSpace 6 bitstream list was requested with limit=250 only, which
+left out the files after the first 250 of larger items.
+
+The server is https://conservancy.umn.edu unless DRUM_URL or --base-url gives
+another, e.g. the staging server https://conservancystage.umn.edu or a local
+mock server.
+"""
+
+import os
+import requests
+import threading
+import time
+from collections import OrderedDict
+from bitstream_record import BitstreamRecord
+from dspace_session import get_session
+
+
+#Versions of the DSpace REST API that have a backend
+API_VERSIONS = ("6", "7")
+#Number of recent responses kept, the seconds each one is used for, and the largest response kept
+CACHE_ENTRIES = 128
+CACHE_SECONDS = 300
+CACHE_MAX_BYTES = 512 * 1024
+#Bitstreams requested per page (both APIs return 20 if no size is given)
+DSPACE6_PAGE_SIZE = 250
+DSPACE7_PAGE_SIZE = 100
+
+_api = os.environ.get("DRUM_API", "6")
+_client = None
+_backends = {}
+_lock = threading.Lock()
+
+
+class JsonClient:
+    """
+    Read JSON from the API through the shared session (see dspace_session.py).
+    Recent responses are kept for CACHE_SECONDS. The data returned from the
+    cache is shared, so it must not be changed.
+    """
+
+    def __init__(self, entries=CACHE_ENTRIES, seconds=CACHE_SECONDS):
+        self.entries = entries
+        self.seconds = seconds
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_json(self, url, params=None, cache=True):
+        """Request a URL and return its JSON. An error response is raised as an HTTPError."""
+        session = get_session()
+        #A logged in session can see files that others cannot
+        key = (url, tuple(sorted(params.items())) if params else None, session.email if session.authenticated else None)
+        if cache:
+            with self.lock:
+                found = self.cache.get(key)
+                if found is not None and time.time() - found[0] < self.seconds:
+                    self.cache.move_to_end(key)
+                    return found[1]
+        response = session.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        if cache and len(response.content) <= CACHE_MAX_BYTES:
+            with self.lock:
+                self.cache[key] = (time.time(), data)
+                self.cache.move_to_end(key)
+                while len(self.cache) > self.entries:
+                    self.cache.popitem(last=False)
+        return data
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+
+class DSpace6Backend:
+    """The DSpace 6 REST API (/rest)"""
+
+    version = "6"
+
+    def __init__(self, client):
+        self.client = client
+
+    @property
+    def rest_url(self):
+        return get_session().base_url + "/rest"
+
+    def find_item(self, handle, cache=True):
+        return self.client.get_json(self.rest_url + "/handle/" + handle, cache=cache)
+
+    def metadata(self, item, cache=True):
+        return self.client.get_json(self.rest_url + "/items/" + str(item["id"]) + "/metadata", cache=cache)
+
+    def bitstream_entries(self, item, cache=True):
+        """Yield the bitstreams of an item as the API lists them (every bundle), reading every page"""
+        bitstream_url = self.rest_url + "/items/" + str(item["id"]) + "/bitstreams"
+        offset = 0
+        first_id = None
+        while True:
+            page = self.client.get_json(bitstream_url, {'limit': DSPACE6_PAGE_SIZE, 'offset': offset}, cache)
+            #A server that ignores the offset sends the first page again
+            if not page or page[0].get('uuid') == first_id:
+                return
+            if first_id is None:
+                first_id = page[0].get('uuid')
+            yield from page
+            if len(page) < DSPACE6_PAGE_SIZE:
+                return
+            offset += DSPACE6_PAGE_SIZE
+
+    def iter_bitstreams(self, item, bundles=None, cache=True):
+        """Yield the bitstreams of an item (of every bundle, or of the given bundles) as BitstreamRecords"""
+        for entry in self.bitstream_entries(item, cache):
+            if bundles is None or entry.get('bundleName') in bundles:
+                yield BitstreamRecord.from_dspace6(entry)
+
+    def download_url(self, bitstream):
+        return get_session().base_url + "/bitstream/" + bitstream.uuid + "/download"
+
+    def handle_download_url(self, handle, entry):
+        """The link to a bitstream under the item handle, used by download_files.py"""
+        return get_session().base_url + "/bitstream/handle/" + handle + "/" + entry['name'].replace(' ', '%20') + "?sequence=" + str(entry['sequenceId']) + "&isAllowed=y/"
+
+
+class DSpace7Backend:
+    """The DSpace 7 REST API (/server/api)"""
+
+    version = "7"
+
+    def __init__(self, client):
+        self.client = client
+
+    @property
+    def server_url(self):
+        return get_session().server_url
+
+    def item_api_url(self, link_url):
+        """
+        Take a DRUM URL, handle, or DOI and return the API endpoint URL for the item.
+        Handles are looked up on the server, and DOIs are resolved to the item URL,
+        to find the item_uuid.
+        """
+        drum_url_split = link_url.rstrip("/").split ("/") [-2:]
+        if drum_url_split[0] == "items":
+            item_uuid = drum_url_split[1]
+        else:
+            if "doi.org" in link_url:
+                #Not through the shared session, so a login is never sent to doi.org
+                response = requests.head(link_url, allow_redirects=True, timeout=60)
+                response.close()
+                item_uuid = response.url.rstrip("/").split ("/") [-1]
+            else:
+                item_uuid = self.find_item("/".join(drum_url_split))['id']
+        return self.server_url + "/core/items/" + item_uuid
+
+    def item(self, item_api_url, cache=True):
+        return self.client.get_json(item_api_url, cache=cache)
+
+    def find_item(self, handle, cache=True):
+        """
+        Return the item of a handle. An item without a handle (e.g. a submission in
+        the workflow) is found by its UUID instead, given as items/<uuid>.
+        """
+        if handle.startswith("items/"):
+            return self.item(self.server_url + "/core/" + handle, cache)
+        return self.client.get_json(self.server_url + "/pid/find", {'id': "hdl:" + handle}, cache)
+
+    def metadata(self, item, cache=True):
+        """The metadata of the item, in the form of the DSpace 6 list"""
+        return [{'key': key, 'value': value['value'], 'language': value.get('language')}
+                for key, values in item['metadata'].items() for value in values]
+
+    def bundles(self, item, cache=True):
+        return self.client.get_json(item['_links']['bundles']['href'], cache=cache)
+
+    def bitstream_page(self, bitstreams_url, page, cache=False):
+        """
+        One page of a bitstreams list. The downloader and drum_item.py read each
+        page once and keep the records made from it, so by default pages are not cached.
+        """
+        return self.client.get_json(bitstreams_url, {'page': page, 'size': DSPACE7_PAGE_SIZE}, cache)
+
+    def iter_bitstreams(self, item, bundles=None, cache=True):
+        """Yield the bitstreams of an item (of every bundle, or of the given bundles) as BitstreamRecords"""
+        from bitstream_iterator import iter_bitstreams
+        return iter_bitstreams(item, bundles, cache=cache)
+
+    def download_url(self, bitstream):
+        return self.bitstream_download_url(bitstream.uuid)
+
+    def bitstream_download_url(self, identifier):
+        """
+        Return the link to download a bitstream. After logging in, files are requested
+        from the REST API, which accepts the bearer token, so restricted files can be read.
+        """
+        session = get_session()
+        if session.authenticated:
+            return session.server_url + "/core/bitstreams/" + identifier + "/content"
+        return session.base_url + "/bitstream/" + identifier + "/download"
+
+    @property
+    def search_url(self):
+        return self.server_url + "/discover/search/objects"
+
+
+BACKENDS = {'6': DSpace6Backend, '7': DSpace7Backend}
+
+
+def get_client():
+    """Return the client shared by the backends in this program"""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = JsonClient()
+        return _client
+
+
+def get_backend(version=None):
+    """Return the backend for a version of the API (by default DRUM_API, or 6)"""
+    version = str(version or _api)
+    if version not in BACKENDS:
+        raise ValueError("Unknown DSpace REST API version: " + version + " (use " + " or ".join(API_VERSIONS) + ")")
+    client = get_client()
+    with _lock:
+        if version not in _backends:
+            _backends[version] = BACKENDS[version](client)
+        return _backends[version]
+
+
+def set_api(version):
+    """Read the curation documents from this version of the API. Worker processes started later use it too."""
+    global _api
+    get_backend(version)
+    _api = str(version)
+    os.environ["DRUM_API"] = _api
+
+
+def set_base_url(base_url):
+    """Use another DSpace server. Worker processes started later use it too."""
+    get_session().set_base_url(base_url)
+    os.environ["DRUM_URL"] = get_session().base_url
+    get_client().clear()
+
+
+def add_arguments(parser, api=True):
+    """Add the server options to an argparse parser"""
+    parser.add_argument("--base-url", help="DSpace server to use instead of https://conservancy.umn.edu, e.g. https://conservancystage.umn.edu (or set DRUM_URL)")
+    if api:
+        parser.add_argument("--api", choices=API_VERSIONS, help="REST API to read the items from (default 6, or set DRUM_API)")
+
+
+def from_args(args):
+    """Apply the options added by add_arguments"""
+    if args.base_url:
+        set_base_url(args.base_url)
+    if getattr(args, "api", None):
+        set_api(args.api)
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: One pooled HTTP session for the DSpace 7 tools, optionally logged in
+so that embargoed and restricted bitstreams can be downloaded. Logging in follows
+the DSpace 7 REST flow: a CSRF token is read from the DSPACE-XSRF-TOKEN header
+(and cookie), then the email and password are posted to /server/api/authn/login
+with the token in X-XSRF-TOKEN. The bearer token in the Authorization header of
+the response is sent with every later request to the DSpace server (and to no
+other host, e.g. doi.org). DSpace sends a new CSRF token from time to time, so the
+latest one is always kept.
+
+The bearer token is refreshed before it expires (or after a 401 response), and is
+cached in the user's home folder so later runs do not need to log in again until
+it expires. The password is never saved. Requests that fail with a transient
+error are retried (see retry.py).
+
+The server is https://conservancy.umn.edu unless the DRUM_URL environment variable
+(or dspace_backend.set_base_url) gives another, e.g. the staging server.
+"""
+
+import base64
+import getpass
+import json
+import os
+import requests
+import threading
+import time
+from requests.adapters import HTTPAdapter
+import retry
+
+
+#The DRUM server. DRUM_URL can point the tools at another, e.g. https://conservancystage.umn.edu
+BASE_URL = os.environ.get("DRUM_URL", "https://conservancy.umn.edu").rstrip("/")
+TOKEN_FILE = os.path.join(os.path.expanduser("~"), ".drum_tools_token.json")
+#Refresh the bearer token when it has less than this many seconds left
+REFRESH_MARGIN = 300
+#Number of connections kept open to the server
+POOL_SIZE = 16
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class LoginError(Exception):
+    """DSpace did not accept the email and password"""
+
+
+def token_expiry(token):
+    """Read the expiry time from a JWT bearer token (0 if it cannot be read)"""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload)).get('exp', 0)
+    except (IndexError, ValueError):
+        return 0
+
+
+class DSpaceSession(requests.Session):
+    """A requests Session with a connection pool, CSRF handling and bearer token login"""
+
+    def __init__(self, base_url=BASE_URL, pool_size=POOL_SIZE):
+        requests.Session.__init__(self)
+        self.set_base_url(base_url)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self.email = None
+        self.password = None
+        self.token = None
+        self.expires = 0
+        #The CSRF and bearer tokens, which are only sent to the DSpace server
+        self.auth_headers = {}
+        self.auth_lock = threading.Lock()
+
+    def set_base_url(self, base_url):
+        """Use another DSpace server, e.g. https://conservancystage.umn.edu (before logging in)"""
+        self.base_url = base_url.rstrip("/")
+        self.server_url = self.base_url + "/server/api"
+
+    @property
+    def authenticated(self):
+        return self.token is not None
+
+    def is_server_url(self, url):
+        return url == self.base_url or url.startswith(self.base_url + "/")
+
+    def request(self, method, url, *args, **kwargs):
+        if self.token is not None and time.time() > self.expires - REFRESH_MARGIN:
+            self.refresh()
+        response = retry.retry_call(self.send_request, method, url, *args, **kwargs)
+        #A token that was revoked or expired early is refreshed once and the request repeated
+        if response.status_code == 401 and self.token is not None and not url.endswith("/authn/login"):
+            sent_token = self.token
+            response.close()
+            self.refresh(expired_token=sent_token)
+            response = retry.retry_call(self.send_request, method, url, *args, **kwargs)
+        return response
+
+    def send_request(self, method, url, *args, **kwargs):
+        """Send one request. A response that is worth retrying (e.g. 503) is raised as an HTTPError."""
+        if self.is_server_url(url):
+            #Read the tokens for each attempt, as a refresh may have changed them
+            kwargs['headers'] = dict(self.auth_headers, **(kwargs.get('headers') or {}))
+        response = requests.Session.request(self, method, url, *args, **kwargs)
+        self.keep_csrf_token(response)
+        if response.status_code in retry.TRANSIENT_STATUS:
+            response.close()
+            response.raise_for_status()
+        return response
+
+    def keep_csrf_token(self, response):
+        csrf_token = response.headers.get("DSPACE-XSRF-TOKEN")
+        if csrf_token:
+            self.auth_headers["X-XSRF-TOKEN"] = csrf_token
+
+    def csrf_token(self):
+        """Ask the server for a CSRF token if there is none yet"""
+        #Newer DSpace versions have an endpoint for this. Older ones send it with any response.
+        for endpoint in ("/security/csrf", "/authn/status"):
+            if "X-XSRF-TOKEN" in self.auth_headers:
+                break
+            self.keep_csrf_token(requests.Session.request(self, "GET", self.server_url + endpoint))
+        return self.auth_headers.get("X-XSRF-TOKEN")
+
+    def set_token(self, token):
+        self.token = token
+        #If the expiry cannot be read from the token, it is refreshed after 30 minutes
+        self.expires = token_expiry(token) or time.time() + 1800
+        self.auth_headers["Authorization"] = "Bearer " + token
+
+    def login(self, email, password):
+        """Log in with a DSpace email and password. Raise LoginError if they are not accepted."""
+        with self.auth_lock:
+            self.email = email
+            self.password = password
+            self._login()
+
+    def _login(self):
+        self.auth_headers.pop("Authorization", None)
+        self.token = None
+        self.csrf_token()
+        response = requests.Session.request(self, "POST", self.server_url + "/authn/login", headers=dict(self.auth_headers),
+                                            data={'user': self.email, 'password': self.password})
+        self.keep_csrf_token(response)
+        token = response.headers.get("Authorization", "")
+        if response.status_code != 200 or not token.startswith("Bearer "):
+            raise LoginError("DSpace did not accept the login for " + str(self.email) + " (HTTP " + str(response.status_code) + ")")
+        self.set_token(token[len("Bearer "):])
+        save_token(self.server_url, self.email, self.token)
+
+    def refresh(self, expired_token=None):
+        """
+        Get a new bearer token by posting the current one to /authn/login. If that
+        fails and the password is known, log in again.
+        """
+        with self.auth_lock:
+            #Another thread may have refreshed the token already
+            if expired_token is not None and self.token != expired_token:
+                return
+            if expired_token is None and time.time() <= self.expires - REFRESH_MARGIN:
+                return
+            self.csrf_token()
+            response = requests.Session.request(self, "POST", self.server_url + "/authn/login", headers=dict(self.auth_headers))
+            self.keep_csrf_token(response)
+            token = response.headers.get("Authorization", "")
+            if response.status_code == 200 and token.startswith("Bearer "):
+                self.set_token(token[len("Bearer "):])
+                save_token(self.server_url, self.email, self.token)
+            elif self.password is not None:
+                self._login()
+            else:
+                raise LoginError("The saved login has expired. Please log in again.")
+
+    def use_cached_token(self, email):
+        """Use a saved bearer token for this email if it has not expired. Return True if there was one."""
+        token = load_token(self.server_url, email)
+        if token is None or token_expiry(token) <= time.time() + REFRESH_MARGIN:
+            return False
+        self.email = email
+        self.set_token(token)
+        return True
+
+
+def load_token(server_url, email):
+    try:
+        with open(TOKEN_FILE) as f:
+            return json.load(f).get(server_url + " " + email)
+    except (OSError, ValueError):
+        return None
+
+
+def save_token(server_url, email, token):
+    """Save the bearer token (not the password) where only the user can read it"""
+    try:
+        with open(TOKEN_FILE) as f:
+            tokens = json.load(f)
+    except (OSError, ValueError):
+        tokens = {}
+    tokens[server_url + " " + str(email)] = token
+    try:
+        descriptor = os.open(TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "w") as f:
+            json.dump(tokens, f)
+    except OSError as e:
+        print("Could not save the login (" + str(e) + ")")
+
+
+def get_session():
+    """Return the session shared by all of the DSpace 7 tools in this program"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = DSpaceSession()
+        return _session
+
+
+def login(email=None, password=None):
+    """
+    Log the shared session in. The email and password are taken from the arguments,
+    the DRUM_EMAIL and DRUM_PASSWORD environment variables, or a prompt. A saved
+    token for the same email is used instead of the password while it is valid.
+    """
+    session = get_session()
+    email = email or os.environ.get("DRUM_EMAIL") or input("DRUM email: ")
+    if password is None and session.use_cached_token(email):
+        return session
+    password = password or os.environ.get("DRUM_PASSWORD") or getpass.getpass("DRUM password: ")
+    session.login(email, password)
+    return session
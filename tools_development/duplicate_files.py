@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: Find files that were uploaded more than once, using the checksums and
+sizes the bitstream API already reports, so nothing needs to be downloaded.
+Files with the same checksum are reported as identical. Files whose names only
+differ by a copy marker (e.g. "data (1).csv" or "data - Copy.csv") but whose
+content differs are reported as possible duplicates. One index can be shared by
+all the items in a batch run to find the same file deposited in several items.
+"""
+
+import re
+from os.path import splitext
+from file_summary import convert_size
+
+
+#Markers added to the end of a filename when a file is copied or downloaded twice
+COPY_MARKER = re.compile(r"(\s*-\s*copy|[\s_]copy|\s*\(\d+\))+$", re.IGNORECASE)
+
+
+def normalize_name(name):
+    """Filename with copy markers removed and in lower case, used to match near duplicates"""
+    stem, extension = splitext(name.split("/")[-1])
+    return COPY_MARKER.sub("", stem).strip().lower() + extension.lower()
+
+
+class DuplicateIndex:
+    """
+    Index of bitstreams by checksum and by normalized filename. Each bitstream
+    is added once, so finding duplicates takes linear time in the number of files.
+    """
+
+    def __init__(self):
+        #(checksum algorithm, checksum, size) -> list of (item, filename)
+        self.by_checksum = {}
+        #item -> normalized filename -> list of (filename, checksum key)
+        self.by_name = {}
+        #item -> checksum keys of its files, so one item can be reported without a full scan
+        self.item_keys = {}
+
+    def add(self, item, name, size_bytes, checksum):
+        """
+        Add one bitstream. checksum is the "checkSum" value from the API,
+        e.g. {'checkSumAlgorithm': 'MD5', 'value': '...'}
+        """
+        key = None
+        if checksum and checksum.get('value'):
+            key = (checksum.get('checkSumAlgorithm', ""), checksum['value'], size_bytes)
+            self.by_checksum.setdefault(key, []).append((item, name))
+            self.item_keys.setdefault(item, []).append(key)
+        self.by_name.setdefault(item, {}).setdefault(normalize_name(name), []).append((name, key))
+
+    def duplicates_string(self, item=None):
+        """
+        Text for the "Possible duplicates" section of a log. If item is given,
+        only groups that include a file from that item are listed.
+        """
+        if item is None:
+            keys = self.by_checksum
+        else:
+            keys = dict.fromkeys(self.item_keys.get(item, []))
+
+        identical = ""
+        for key in keys:
+            algorithm, value, size_bytes = key
+            files = self.by_checksum[key]
+            if len(files) < 2:
+                continue
+            names = []
+            for file_item, name in files:
+                if file_item == item:
+                    names.append(name)
+                else:
+                    names.append(name + " [" + str(file_item) + "]")
+            identical += "\t" + " = ".join(names) + " (" + convert_size(size_bytes) + ", " + algorithm + " " + value + ")\n"
+
+        similar = ""
+        if item is None:
+            name_groups = [files for names in self.by_name.values() for files in names.values()]
+        else:
+            name_groups = self.by_name.get(item, {}).values()
+        for files in name_groups:
+            #Only list names that point to different content. Identical content is listed above.
+            if len(files) < 2 or len(set(f[1] for f in files)) < 2:
+                continue
+            similar += "\t" + ", ".join(f[0] for f in files) + "\n"
+
+        if not identical and not similar:
+            return "No duplicate files found.\n"
+        duplicates = ""
+        if identical:
+            duplicates += "Identical files (same checksum and size):\n" + identical
+        if similar:
+            duplicates += "Same name with a copy marker, but different content:\n" + similar
+        return duplicates
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: Build summary statistics for the "Files received" section of a curator
+log (total size, file count, counts and sizes by extension, the largest files and
+the mix of file formats) while the bitstream list is being read, so that large
+submissions only need one pass over the list.
+"""
+
+import heapq
+import math
+import mimetypes
+from os.path import splitext
+
+
+def convert_size(size_bytes):
+    """Convert file size in bytes to a more human readable format"""
+
+    if size_bytes == 0:
+        return "0B"
+    size_name = ("B", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB")
+    i = int(math.floor(math.log(size_bytes, 1024)))
+    p = math.pow(1024, i)
+    s = round(size_bytes / p, 2)
+    return "%s %s" % (s, size_name[i])
+
+
+class FileSummary:
+    """
+    Running totals for the files in a submission. Call add() once for each
+    bitstream as it is read, then use summary_string() and file_list_string()
+    to write the "Files received" section of the log.
+    """
+
+    def __init__(self, largest=10, prefix_depth=1):
+        self.file_count = 0
+        self.total_bytes = 0
+        #extension -> [number of files, bytes]
+        self.extensions = {}
+        #format -> number of files
+        self.formats = {}
+        #path prefix -> [bytes, list of "name (size)" lines in the order the files were read]
+        self.groups = {}
+        self.lines = []
+        #Smallest-first heap holding only the largest files seen so far
+        self.largest = []
+        self.largest_count = largest
+        self.prefix_depth = prefix_depth
+
+    def add(self, name, size_bytes, file_format=""):
+        """Add one bitstream to the totals"""
+        self.file_count += 1
+        self.total_bytes += size_bytes
+
+        extension = splitext(name)[1].lower() or "(no extension)"
+        totals = self.extensions.setdefault(extension, [0, 0])
+        totals[0] += 1
+        totals[1] += size_bytes
+
+        #Use the format reported by the API if there is one, otherwise guess from the filename
+        if not file_format:
+            file_format = mimetypes.guess_type(name)[0] or "Unknown"
+        self.formats[file_format] = self.formats.get(file_format, 0) + 1
+
+        if len(self.largest) < self.largest_count:
+            heapq.heappush(self.largest, (size_bytes, self.file_count, name))
+        elif size_bytes > self.largest[0][0]:
+            heapq.heapreplace(self.largest, (size_bytes, self.file_count, name))
+
+        line = name + " (" + convert_size(size_bytes) + ")\n"
+        self.lines.append(line)
+        group = self.groups.setdefault(self.path_prefix(name), [0, []])
+        group[0] += size_bytes
+        group[1].append(line)
+
+    def path_prefix(self, name):
+        """Folder path at the start of a filename (e.g. "data/raw/" for "data/raw/site1.csv")"""
+        parts = name.split("/")[:-1]
+        if not parts or self.prefix_depth < 1:
+            return ""
+        return "/".join(parts[:self.prefix_depth]) + "/"
+
+    def summary_string(self, expected_count=None):
+        """Text block with the totals, to be placed above the list of files"""
+        summary = "Total: " + str(self.file_count) + " files (" + convert_size(self.total_bytes) + ")\n"
+        if expected_count is not None and expected_count != self.file_count:
+            summary += "File count looks off! Expected number = " + str(expected_count) + "\n"
+
+        summary += "\nBy extension:\n"
+        for extension, totals in sorted(self.extensions.items(), key=lambda e: e[1][1], reverse=True):
+            summary += "\t" + extension + ": " + str(totals[0]) + " files (" + convert_size(totals[1]) + ")\n"
+
+        summary += "\nFormats:\n"
+        for file_format, count in sorted(self.formats.items(), key=lambda f: f[1], reverse=True):
+            summary += "\t" + file_format + ": " + str(count) + "\n"
+
+        summary += "\nLargest files:\n"
+        for size_bytes, order, name in sorted(self.largest, reverse=True):
+            summary += "\t" + name + " (" + convert_size(size_bytes) + ")\n"
+        return summary
+
+    def file_list_string(self, group_by_prefix=False):
+        """The list of files, either as read or grouped by their path prefix"""
+        if not group_by_prefix:
+            return "".join(self.lines)
+        file_list = []
+        for prefix, (size_bytes, lines) in self.groups.items():
+            file_list.append("\n" + (prefix or "(top level)") + " - " + str(len(lines)) + " files (" + convert_size(size_bytes) + ")\n")
+            file_list.extend("\t" + line for line in lines)
+        return "".join(file_list)
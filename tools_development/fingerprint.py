@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: Fingerprints of the inputs of a curation document (metadata log,
+readme or DataCite XML), so that running a generator again over many items only
+recreates the documents of items that changed, the way make does. A fingerprint
+is made from the lastModified date of the item, a hash of its bitstream list
+(names, sizes and checksums) and the version of the document template. It is
+saved in the .drum_fingerprints folder inside the output folder, one small file
+per document, so several workers can write fingerprints at the same time.
+"""
+
+import hashlib
+import json
+from os import makedirs, replace
+from os import path
+
+
+FINGERPRINT_DIR = ".drum_fingerprints"
+
+
+def bitstreams_hash(list_bitstream):
+    """Hash the name, size and checksum of each bitstream in the ORIGINAL bundle"""
+    entries = []
+    for x in list_bitstream:
+        if x.bundle == "ORIGINAL":
+            entries.append([x.name, x.size, x.checksum_dict()])
+    entries.sort(key=lambda e: json.dumps(e, sort_keys=True))
+    return hashlib.sha256(json.dumps(entries, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def make_fingerprint(last_modified, template_version, list_bitstream=None):
+    """Combine the inputs of a document into one string"""
+    fingerprint = str(last_modified) + "|" + str(template_version)
+    if list_bitstream is not None:
+        fingerprint += "|" + bitstreams_hash(list_bitstream)
+    return fingerprint
+
+
+def fingerprint_path(outputDir, kind, handle_number):
+    return path.join(outputDir, FINGERPRINT_DIR, kind + "_" + str(handle_number) + ".json")
+
+
+def is_current(outputDir, kind, handle_number, fingerprint):
+    """
+    Return the path of the document if it was made from the same inputs and still
+    exists, or None if it needs to be created again.
+    """
+    try:
+        with open(fingerprint_path(outputDir, kind, handle_number)) as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if stored.get('fingerprint') == fingerprint and path.exists(stored.get('path', "")):
+        return stored['path']
+    return None
+
+
+def record(outputDir, kind, handle_number, fingerprint, document_path):
+    """Save the fingerprint of a document that has just been written"""
+    file_path = fingerprint_path(outputDir, kind, handle_number)
+    makedirs(path.dirname(file_path), exist_ok=True)
+    with open(file_path + ".tmp", "w") as f:
+        json.dump({'fingerprint': fingerprint, 'path': document_path}, f)
+    replace(file_path + ".tmp", file_path)
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+script name: job_queue.py
+
+description: A job queue for batch runs, kept in a local SQLite database so that
+progress survives crashes and restarts. Each job is one action (downloading the
+files, or creating the metadata log, readme, DataCite XML or DataCite JSON) for
+one DRUM item. For downloads, each bitstream that finishes is also recorded, so a
+restarted run skips the items and files that are already done and picks up where
+it stopped.
+
+Several worker processes on the same computer can take jobs from the same queue.
+A job is claimed inside a write transaction, so two workers never get the same job.
+Workers update a heartbeat while they run a job. If a worker crashes, its job is
+given to another worker once the heartbeat is older than LEASE_SECONDS. If the
+whole run was stopped (e.g. the computer restarted), "requeue" makes the jobs that
+were running available straight away. A worker only records the result of a job
+it still holds, so a worker that lost its job to another one cannot overwrite it.
+A job that fails is tried again after a wait that doubles each time (RETRY_SECONDS,
+then twice that, ...), up to MAX_ATTEMPTS tries in all.
+
+Downloads from the queue are saved as folders (named with the handle number), the
+same as the download tool. An existing folder is reused rather than skipped.
+With --store, the workers share a content store, so a file that one item shares
+with another is only downloaded once (see content_store.py).
+
+example:
+    python job_queue.py --db drum_jobs.sqlite add C:/curation https://hdl.handle.net/11299/226188 https://hdl.handle.net/11299/228067
+    python job_queue.py --db drum_jobs.sqlite work --processes 3
+    python job_queue.py --db drum_jobs.sqlite work --processes 3 --email curator@umn.edu
+    python job_queue.py --db drum_jobs.sqlite work --processes 3 --store D:/drum_store
+    python job_queue.py --db drum_jobs.sqlite requeue
+    python job_queue.py --db drum_jobs.sqlite status
+"""
+
+import argparse
+import multiprocessing
+import socket
+import sqlite3
+import threading
+import time
+from os import getpid, makedirs
+from os import path
+
+
+#Actions that can be queued for an item
+KINDS = ("download", "metadata_log", "readme", "datacite_xml", "datacite_json")
+#Jobs queued for each item when no kinds are given
+DEFAULT_KINDS = ("download", "metadata_log", "readme", "datacite_xml")
+#A running job whose heartbeat is older than this is given to another worker
+LEASE_SECONDS = 600
+HEARTBEAT_SECONDS = 30
+#Number of times a failed job is tried before it is left as failed
+MAX_ATTEMPTS = 3
+#Seconds before a failed job is tried again, doubled after each attempt
+RETRY_SECONDS = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    link_url TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    output_dir TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    heartbeat REAL,
+    not_before REAL,
+    error TEXT,
+    UNIQUE (link_url, kind, output_dir)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+CREATE TABLE IF NOT EXISTS bitstreams (
+    job_id INTEGER NOT NULL REFERENCES jobs (id),
+    bitstream_id TEXT NOT NULL,
+    name TEXT,
+    size_bytes INTEGER,
+    finished REAL,
+    PRIMARY KEY (job_id, bitstream_id)
+);
+"""
+
+
+def connect(db_path):
+    """Open the queue database, creating the tables if needed"""
+    connection = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    #Queues created before failed jobs waited to be tried again
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(jobs)")]
+    if "not_before" not in columns:
+        connection.execute("ALTER TABLE jobs ADD COLUMN not_before REAL")
+    return connection
+
+
+class JobQueue:
+    """Jobs and finished bitstreams stored in a SQLite database"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = connect(db_path)
+        #The connection is shared by the download threads of one worker
+        self.lock = threading.Lock()
+        self.worker = socket.gethostname() + ":" + str(getpid())
+
+    def add(self, link_url, kind, output_dir):
+        """Queue a job. A job that is already in the queue is left as it is."""
+        with self.lock:
+            self.connection.execute("INSERT OR IGNORE INTO jobs (link_url, kind, output_dir) VALUES (?, ?, ?)",
+                                    (link_url, kind, output_dir))
+
+    def claim(self):
+        """
+        Take the next job that is pending, failed with attempts left and its wait
+        over, or abandoned by a worker that stopped updating its heartbeat. Return
+        None if there is none.
+        """
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.connection.execute(
+                    """SELECT id, link_url, kind, output_dir FROM jobs
+                       WHERE state = 'pending'
+                          OR (state = 'failed' AND attempts < ? AND (not_before IS NULL OR not_before <= ?))
+                          OR (state = 'running' AND heartbeat < ?)
+                       ORDER BY id LIMIT 1""",
+                    (MAX_ATTEMPTS, time.time(), time.time() - LEASE_SECONDS)).fetchone()
+                if row is not None:
+                    self.connection.execute(
+                        "UPDATE jobs SET state = 'running', worker = ?, heartbeat = ?, attempts = attempts + 1 WHERE id = ?",
+                        (self.worker, time.time(), row[0]))
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {'id': row[0], 'link_url': row[1], 'kind': row[2], 'output_dir': row[3]}
+
+    def next_retry(self):
+        """Return the time when the next failed job can be tried again, or None if no failed job has attempts left"""
+        with self.lock:
+            row = self.connection.execute("SELECT MIN(not_before) FROM jobs WHERE state = 'failed' AND attempts < ?",
+                                          (MAX_ATTEMPTS,)).fetchone()
+        return row[0]
+
+    def requeue(self):
+        """Make jobs left running by stopped workers available again. Only use when no workers are running."""
+        with self.lock:
+            self.connection.execute("UPDATE jobs SET state = 'pending', worker = NULL WHERE state = 'running'")
+
+    def heartbeat(self, job_id):
+        with self.lock:
+            self.connection.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ?",
+                                    (time.time(), job_id, self.worker))
+
+    def finish(self, job_id):
+        """Record a job as done. Return False if this worker no longer holds the job (nothing is changed)."""
+        with self.lock:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET state = 'done', error = NULL, heartbeat = ? WHERE id = ? AND worker = ? AND state = 'running'",
+                (time.time(), job_id, self.worker))
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, error):
+        """
+        Record a job as failed, to be tried again after RETRY_SECONDS * 2^(attempts - 1).
+        Return False if this worker no longer holds the job (nothing is changed).
+        """
+        now = time.time()
+        with self.lock:
+            cursor = self.connection.execute(
+                """UPDATE jobs SET state = 'failed', error = ?, heartbeat = ?, not_before = ? + ? * (1 << (attempts - 1))
+                   WHERE id = ? AND worker = ? AND state = 'running'""",
+                (error, now, now, RETRY_SECONDS, job_id, self.worker))
+        return cursor.rowcount == 1
+
+    def bitstream_done(self, job_id, bitstream):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO bitstreams (job_id, bitstream_id, name, size_bytes, finished) VALUES (?, ?, ?, ?, ?)",
+                (job_id, bitstream.uuid, bitstream.name, bitstream.size, time.time()))
+            self.connection.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ?", (time.time(), job_id, self.worker))
+
+    def done_bitstreams(self, job_id):
+        with self.lock:
+            rows = self.connection.execute("SELECT bitstream_id FROM bitstreams WHERE job_id = ?", (job_id,)).fetchall()
+        return set(row[0] for row in rows)
+
+    def status(self):
+        """Return the number of jobs in each state, by kind"""
+        with self.lock:
+            return self.connection.execute("SELECT kind, state, COUNT(*) FROM jobs GROUP BY kind, state ORDER BY kind, state").fetchall()
+
+
+class BitstreamProgress:
+    """
+    Passed to downloadFiles so a download job skips the bitstreams that an earlier
+    run finished and records each bitstream as soon as it is downloaded.
+    """
+
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.job_id = job_id
+        self.done = queue.done_bitstreams(job_id)
+
+    def is_done(self, bitstream):
+        return bitstream.uuid in self.done
+
+    def mark_done(self, bitstream):
+        self.queue.bitstream_done(self.job_id, bitstream)
+        self.done.add(bitstream.uuid)
+
+
+def run_job(queue, job, store=None):
+    """Carry out one job. An exception means the job failed."""
+    if job['kind'] == "download":
+        from dspace_backend import get_backend
+        from dspace7_download import downloadFiles
+
+        backend = get_backend("7")
+        item_api_url = backend.item_api_url(job['link_url'])
+        itemData = backend.item(item_api_url)
+        handle_number = itemData['metadata']['dc.identifier.uri'][0]['value'].split ("/") [-1]
+        download_path = path.join(job['output_dir'], handle_number)
+        makedirs(download_path, exist_ok=True)
+        downloaded_files, passed_files = downloadFiles(job['link_url'], item_api_url, download_path,
+                                                       progress=BitstreamProgress(queue, job['id']), store=store)
+        if passed_files:
+            raise IOError(str(passed_files) + " files could not be downloaded")
+    elif job['kind'] == "metadata_log":
+        import metadata_log
+        metadata_log.metadata_log(job['link_url'], job['output_dir'])
+    elif job['kind'] == "readme":
+        import automated_readme
+        automated_readme.automated_readme(job['link_url'], job['output_dir'])
+    elif job['kind'] == "datacite_xml":
+        import datacite_xml
+        datacite_xml.datacite_xml(job['link_url'], job['output_dir'])
+    elif job['kind'] == "datacite_json":
+        import datacite_json
+        datacite_json.datacite_json(job['link_url'], job['output_dir'])
+    else:
+        raise ValueError("Unknown job type: " + job['kind'])
+
+
+def work(db_path, email=None, bandwidth_schedule=None, processes=1, store_path=None, link_mode="hardlink"):
+    """
+    Take jobs from the queue until there are none left, waiting for failed jobs
+    that will be tried again. With an email, downloads
+    are made with the login saved for that account (see dspace_session.py). A
+    bandwidth schedule is shared equally by the worker processes. With a
+    store_path, downloads use the content store in that folder.
+    """
+    if bandwidth_schedule:
+        import bandwidth
+        bandwidth.set_schedule(bandwidth_schedule, share=processes)
+    if email:
+        from dspace_session import login
+        login(email)
+    store = None
+    if store_path:
+        from content_store import ContentStore
+        store = ContentStore(store_path, link_mode)
+    queue = JobQueue(db_path)
+    while True:
+        job = queue.claim()
+        if job is None:
+            next_retry = queue.next_retry()
+            if next_retry is None:
+                return
+            time.sleep(max(0, next_retry - time.time()))
+            continue
+        print(queue.worker + " starting " + job['kind'] + " for " + job['link_url'])
+
+        #Keep the heartbeat up to date so other workers know this job is still running
+        stop = threading.Event()
+        def beat():
+            while not stop.wait(HEARTBEAT_SECONDS):
+                queue.heartbeat(job['id'])
+        beat_thread = threading.Thread(target=beat, daemon=True)
+        beat_thread.start()
+        try:
+            run_job(queue, job, store)
+            recorded = queue.finish(job['id'])
+            print(queue.worker + " finished " + job['kind'] + " for " + job['link_url'])
+        except Exception as e:
+            recorded = queue.fail(job['id'], str(e))
+            print(queue.worker + " could not finish " + job['kind'] + " for " + job['link_url'] + " (" + str(e) + ")")
+        finally:
+            stop.set()
+            beat_thread.join()
+        #The lease ran out and another worker took the job, so its result is the one kept
+        if not recorded:
+            print(queue.worker + " no longer holds " + job['kind'] + " for " + job['link_url'] + ". The result was not recorded.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue and run DRUM downloads and curation documents so batch runs survive restarts.")
+    parser.add_argument("--db", default="drum_jobs.sqlite", help="path of the queue database")
+    #The workers started below use the same server and API
+    import dspace_backend
+    dspace_backend.add_arguments(parser)
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="queue jobs for one or more items")
+    add.add_argument("output_dir")
+    add.add_argument("link_urls", nargs="+")
+    add.add_argument("--kinds", nargs="+", choices=KINDS, default=list(DEFAULT_KINDS))
+    work_command = commands.add_parser("work", help="run queued jobs")
+    work_command.add_argument("--processes", type=int, default=1)
+    work_command.add_argument("--email", help="log in with this DRUM account to download embargoed and restricted files")
+    work_command.add_argument("--store", help="content store folder shared by the workers, so files already downloaded for another item are linked instead (see content_store.py)")
+    work_command.add_argument("--link", choices=("hardlink", "reflink"), default="hardlink", help="how files from --store are placed in the folders (default hardlink)")
+    work_command.add_argument("--bandwidth", help="cap on the total download speed of all the workers, e.g. \"Mon-Fri 08:00-18:00=5M\" (see bandwidth.py)")
+    commands.add_parser("requeue", help="make jobs left running by a stopped run available again")
+    commands.add_parser("status", help="show the number of jobs in each state")
+    args = parser.parse_args()
+    dspace_backend.from_args(args)
+
+    if args.command == "add":
+        queue = JobQueue(args.db)
+        for link_url in args.link_urls:
+            for kind in args.kinds:
+                queue.add(link_url, kind, args.output_dir)
+    elif args.command == "work":
+        if args.bandwidth:
+            import bandwidth
+            try:
+                bandwidth.parse_schedule(args.bandwidth)
+            except ValueError as e:
+                parser.error(str(e))
+        if args.email:
+            #Log in once here, so the workers use the saved token instead of each asking for the password
+            from dspace_session import login
+            login(args.email)
+        if args.processes > 1:
+            workers = [multiprocessing.Process(target=work, args=(args.db, args.email, args.bandwidth, args.processes, args.store, args.link)) for x in range(args.processes)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        else:
+            work(args.db, args.email, args.bandwidth, 1, args.store, args.link)
+    elif args.command == "requeue":
+        JobQueue(args.db).requeue()
+    for kind, state, count in JobQueue(args.db).status():
+        print(kind + " " + state + ": " + str(count))
+
+
+if __name__ == "__main__":
+    main()
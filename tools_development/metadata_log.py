@@ -5,66 +5,102 @@ Created on Fri Jun  3 11:22:36 2022
 @author: kerni016
 """
 
-import urllib.request
-import math
-from bs4 import BeautifulSoup
+import glob
 from datetime import datetime
+import dspace_backend
+from file_summary import FileSummary, convert_size
+from duplicate_files import DuplicateIndex
+import fingerprint
+import snapshot_diff
 
 
-def convert_size(size_bytes):
-    """Convert file size in bytes to a more human readable format"""
+#Change this when the log template changes, so existing logs are created again
+TEMPLATE_VERSION = 3
 
-    if size_bytes == 0:
-        return "0B"
-    size_name = ("B", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB")
-    i = int(math.floor(math.log(size_bytes, 1024)))
-    p = math.pow(1024, i)
-    s = round(size_bytes / p, 2)
-    return "%s %s" % (s, size_name[i])
 
-def metadata_log(handle_url, outputDir):
+def metadata_log(handle_url, outputDir, group_by_prefix=False, duplicate_index=None, force=False):
+    """
+    Create a curator log for a submission. A DuplicateIndex can be passed in to
+    also find files that are the same as files in items logged earlier in a batch.
+    The log is not created again if the item and its files have not changed since
+    the last log was written (see fingerprint.py), unless force is True.
+    Return the path of the log.
+    """
 
     #Use the handle URL to construct a URL to get to the Dspace endpoint for the item
     handle_split = handle_url.split ("/") [-2:]
     handle = str(handle_split[0]) + "/" + str(handle_split[1])
-    url = "https://conservancy.umn.edu/rest/handle/" + handle
+    backend = dspace_backend.get_backend()
 
-    #Try to access the Dspace endpoint. Return an error message and exit the script if the URL cannot be opened.
+    #Try to access the Dspace endpoint. Return an error message and exit the script if the item cannot be read.
     try:
-        response = urllib.request.urlopen(url)
+        item_dict = backend.find_item(handle)
     except Exception as e:
-        print(url + " could not be opened. (" + str(e) + ")")
+        print(handle + " could not be opened. (" + str(e) + ")")
+        raise
 
-    #Read in the content at the item API endpoint and get the internal id for the item
-    presoup = BeautifulSoup(response, 'lxml')
-    item_info = presoup.p.text
-    item_dict = eval(item_info.replace('null', '"null"'))
+    #Read every page of the bitstream list. Only the fields that are used are kept from each bitstream (see bitstream_record.py).
+    list_bitstream = list(backend.iter_bitstreams(item_dict))
 
-    internal_id = item_dict["id"]
-    
-    bitstream_url = "https://conservancy.umn.edu/rest/items/" + str(internal_id) + "/bitstreams?limit=250"
-    metadata_url = "https://conservancy.umn.edu/rest/items/" + str(internal_id) + "/metadata"
+    #Files are indexed by their checksum to find duplicates without downloading anything
+    if duplicate_index is None:
+        duplicate_index = DuplicateIndex()
+    index_duplicates(duplicate_index, handle, list_bitstream)
 
+    #Skip the item if the existing log was made from the same inputs
+    item_fingerprint = fingerprint.make_fingerprint(item_dict.get("lastModified"), TEMPLATE_VERSION, list_bitstream)
+    existing_path = fingerprint.is_current(outputDir, "metadata_log", handle_split[1], item_fingerprint)
+    if existing_path and not force:
+        print(handle + " has not changed since " + existing_path + " was created. Skipping.")
+        return existing_path
 
-    #Read in the content at the bitstream API endpoint. Default limit is 20 items per page.
-    #Extended to 250 to account for larger data submissions.
-    response = urllib.request.urlopen(bitstream_url)
-    item_soup = BeautifulSoup(response, 'lxml')
-    bitstream = item_soup.p.text
-    list_bitstream = eval(bitstream.replace('null', '"null"'))
 
-    #Create the item bitstream section of the log
-    bitstream_string = ""
-    for x in list_bitstream:
-        if x['bundleName'] == "ORIGINAL":
-            bitstream_string += (x['name'] + " (" + convert_size(x['sizeBytes']) + ")\n")
+    #Read in the content at the metadata endpoint
+    list_metadata = backend.metadata(item_dict)
 
+    #Keep the original metadata and files so changes made during curation can be listed later
+    snapshot_diff.save_snapshot(outputDir, handle_split[1], snapshot_diff.make_snapshot(list_metadata, list_bitstream, item_dict.get("lastModified")))
+
+    metadata_log_template = render_metadata_log(handle, list_bitstream, list_metadata, group_by_prefix, duplicate_index)
+
+    #Write the metadata log to a text file
+    metadata_log_path = output_path(outputDir, handle_split[1])
+    f = open(metadata_log_path,"w")
+    f.write(metadata_log_template)
+    f.close()
+    fingerprint.record(outputDir, "metadata_log", handle_split[1], item_fingerprint, metadata_log_path)
+    return metadata_log_path
+
+
+def output_path(outputDir, handle_number):
+    """Path of the log for an item created today"""
+    return outputDir + "/metadata_" + str(handle_number) + "_" + str(datetime.now().strftime("%Y%m%d")) + ".txt"
 
-    #Read in the content at the metadata endpoint
-    response = urllib.request.urlopen(metadata_url)
-    soup = BeautifulSoup(response, 'lxml')
-    metadata = soup.p.string
-    list_metadata = eval(metadata.replace('null', '"null"'))
+
+def index_duplicates(duplicate_index, handle, list_bitstream):
+    """Add the files in the ORIGINAL bundle of an item to a DuplicateIndex"""
+    for x in list_bitstream:
+        if x.bundle == "ORIGINAL":
+            duplicate_index.add(handle, x.name, x.size, x.checksum_dict())
+
+
+def render_metadata_log(handle, list_bitstream, list_metadata, group_by_prefix=False, duplicate_index=None):
+    """
+    Return the text of the curator log from the item's bitstream records and metadata list.
+    This does no network requests, so collection_pipeline.py can run it in another
+    process. Without a duplicate_index, only duplicates within the item are listed.
+    """
+    if duplicate_index is None:
+        duplicate_index = DuplicateIndex()
+        index_duplicates(duplicate_index, handle, list_bitstream)
+
+    #Create the item bitstream section of the log. Totals, sizes by extension, the
+    #largest files and the format mix are collected in the same pass over the list.
+    summary = FileSummary()
+    for x in list_bitstream:
+        if x.bundle == "ORIGINAL":
+            summary.add(x.name, x.size, x.format or "")
+    bitstream_string = summary.summary_string() + "\n" + summary.file_list_string(group_by_prefix)
 
     #Create the original metadata section of the log
     metadata_string = ""
@@ -86,6 +122,9 @@ Metadata log created: """ + str(datetime.now().strftime("%Y-%m-%d")) + """
 Files received:
 *************************************************\n""" + bitstream_string + """
 *************************************************
+Possible duplicates:
+*************************************************\n""" + duplicate_index.duplicates_string(handle) + """
+*************************************************
 Changes made to files:
 *************************************************
 
@@ -104,10 +143,51 @@ Other issues
 *************************************************
 Original Metadata from Author:
 *************************************************\n"""  + metadata_string
+    return metadata_log_template
+
+
+def metadata_log_batch(handle_urls, outputDir):
+    """
+    Create curator logs for several submissions, sharing one duplicate index so
+    that files deposited in more than one item are found. A report of all the
+    duplicates in the batch is written alongside the logs.
+    """
+    duplicate_index = DuplicateIndex()
+    for handle_url in handle_urls:
+        metadata_log(handle_url, outputDir, duplicate_index=duplicate_index)
+
+    duplicates_path = outputDir + "/duplicates_" + str(datetime.now().strftime("%Y%m%d")) + ".txt"
+    f = open(duplicates_path,"w")
+    f.write(duplicate_index.duplicates_string())
+    f.close()
+
+
+def metadata_changes(handle_url, outputDir):
+    """
+    Compare the item with the snapshot saved when its log was created and write the
+    field and file changes into the "Metadata Changes" section of the latest log.
+    Return the path of the log.
+    """
+    handle_split = handle_url.split ("/") [-2:]
+    handle = str(handle_split[0]) + "/" + str(handle_split[1])
 
-
-    #Write the metadata log to a text file
-    metadata_log_path = outputDir + "/metadata_" + str(handle_split[1]) + "_" + str(datetime.now().strftime("%Y%m%d")) + ".txt"
-    f = open(metadata_log_path,"w")
-    f.write(metadata_log_template)
-    f.close()
\ No newline at end of file
+    #The log file names end with the date they were created, so the last one is the newest
+    log_paths = sorted(glob.glob(glob.escape(outputDir) + "/metadata_" + str(handle_split[1]) + "_*.txt"))
+    if not log_paths:
+        raise FileNotFoundError("No metadata log for " + handle + " in " + outputDir)
+    snapshot = snapshot_diff.load_snapshot(outputDir, handle_split[1])
+
+    #The item is read again rather than from the cache, to see the changes made since the log was created
+    backend = dspace_backend.get_backend()
+    item_dict = backend.find_item(handle, cache=False)
+    list_bitstream = list(backend.iter_bitstreams(item_dict, cache=False))
+    list_metadata = backend.metadata(item_dict, cache=False)
+
+    changes = snapshot_diff.changes_string(snapshot, list_metadata, list_bitstream)
+    f = open(log_paths[-1])
+    log_text = f.read()
+    f.close()
+    f = open(log_paths[-1],"w")
+    f.write(snapshot_diff.fill_changes_section(log_text, changes))
+    f.close()
+    return log_paths[-1]
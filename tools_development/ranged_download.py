@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: Download a large bitstream as several byte ranges at the same time.
+The file is preallocated at its full size (from sizeBytes in the bitstream API)
+and each range is written in place at its own position, so the ranges can arrive
+in any order. If a range fails, only that range is retried, starting from the
+last byte that was written, instead of restarting the whole file. Retries wait a
+growing, randomized time first (see retry.py).
+"""
+
+import os
+import time
+import bandwidth
+import retry
+from concurrent.futures import ThreadPoolExecutor
+from dspace_session import get_session
+
+
+#Bitstreams at least this large are downloaded in ranges
+RANGED_THRESHOLD = 1024 * 1024 * 1024
+#Size of each range, and the number of ranges downloaded at the same time
+SEGMENT_SIZE = 64 * 1024 * 1024
+WORKERS = 4
+#Number of times a range is retried before the download fails
+RETRIES = 5
+CHUNK_SIZE = 1024 * 1024
+
+
+class RangesNotSupported(Exception):
+    """The server sent the whole file instead of the requested range"""
+
+
+def preallocate(file_path, size_bytes):
+    """Create the file at its full size before any of the ranges are written"""
+    with open(file_path, "wb") as f:
+        if size_bytes and hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(f.fileno(), 0, size_bytes)
+        else:
+            f.truncate(size_bytes)
+
+
+def download_segment(download, file_path, start, end, retries=RETRIES):
+    """
+    Download bytes start-end (inclusive) and write them at the same position in
+    the file. After an error the request is repeated for the bytes still missing,
+    after a backoff delay.
+    """
+    position = start
+    attempt = 0
+    #Each segment has its own file handle, so seek() and write() act like a positional write.
+    #os.pwrite is used where it exists (not on Windows).
+    with open(file_path, "r+b") as f:
+        while position <= end:
+            try:
+                #The response is closed when the range ends, including after an error, so its connection goes back to the pool
+                with get_session().get(download, headers={"Range": "bytes=" + str(position) + "-" + str(end)}, stream=True, timeout=60) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise RangesNotSupported(download)
+                    for chunk in bandwidth.LIMITER.throttle(response.iter_content(CHUNK_SIZE)):
+                        chunk = chunk[:end + 1 - position]
+                        if hasattr(os, "pwrite"):
+                            os.pwrite(f.fileno(), chunk, position)
+                        else:
+                            f.seek(position)
+                            f.write(chunk)
+                        position += len(chunk)
+                if position <= end:
+                    raise IOError("connection closed after " + str(position - start) + " bytes of the range")
+            except RangesNotSupported:
+                raise
+            except Exception as e:
+                #Access to the file was refused (e.g. an embargoed file without logging in), so trying again will not help
+                if getattr(getattr(e, "response", None), "status_code", None) in (401, 403):
+                    raise
+                if attempt >= retries:
+                    raise
+                delay = retry.retry_after(e)
+                if delay is None:
+                    delay = retry.backoff_delay(attempt)
+                attempt += 1
+                print("Retrying bytes " + str(position) + "-" + str(end) + " in " + str(round(delay, 1)) + " seconds (" + str(e) + ")")
+                time.sleep(delay)
+    return end + 1 - start
+
+
+def download_ranged(download, file_path, size_bytes, workers=WORKERS, segment_size=SEGMENT_SIZE):
+    """
+    Download a file in ranges of segment_size bytes, with up to `workers` ranges
+    being downloaded at once. Raise RangesNotSupported if the server does not
+    accept Range requests, so the caller can download the file in one stream.
+    """
+    preallocate(file_path, size_bytes)
+    segments = [(start, min(start + segment_size, size_bytes) - 1) for start in range(0, size_bytes, segment_size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(download_segment, download, file_path, start, end) for start, end in segments]
+        try:
+            for future in futures:
+                future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return size_bytes
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: Retries for requests to the DRUM server. Errors that are likely to
+go away (dropped connections, timeouts, HTTP 408, 429 and 5xx) are retried with
+exponential backoff and random jitter, so many workers do not all try again at
+the same moment. A Retry-After header from the server is respected.
+
+All requests in a program share one CircuitBreaker. After several failures in a
+row, every request waits (the whole batch pauses) before trying the server again,
+and the pause doubles each time the server is still down. Other errors (e.g. 404
+or 401) are raised straight away.
+
+FailureLog records the items and files that still failed after the retries, one
+JSON object per line, so a later run can retry only those.
+"""
+
+import http.client
+import json
+import random
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from os import path, replace
+
+try:
+    import requests
+except ImportError:
+    #The DSpace 6 tools only use urllib
+    requests = None
+
+
+RETRIES = 4
+#Delay before the first retry in seconds. It doubles for each retry, up to MAX_DELAY.
+BASE_DELAY = 1
+MAX_DELAY = 60
+#HTTP status codes that are worth trying again
+TRANSIENT_STATUS = (408, 429, 500, 502, 503, 504)
+
+
+def is_transient(e):
+    """Return True if the error is one that may not happen if the request is repeated"""
+    if isinstance(e, urllib.error.HTTPError):
+        return e.code in TRANSIENT_STATUS
+    if requests is not None:
+        if isinstance(e, requests.exceptions.HTTPError):
+            return e.response is not None and e.response.status_code in TRANSIENT_STATUS
+        if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError)):
+            return True
+    return isinstance(e, (urllib.error.URLError, ConnectionError, socket.timeout, TimeoutError, http.client.IncompleteRead, http.client.RemoteDisconnected))
+
+
+def retry_after(e):
+    """Seconds the server asked to wait in a Retry-After header, or None"""
+    headers = getattr(e, "headers", None)
+    response = getattr(e, "response", None)
+    if headers is None and response is not None:
+        headers = response.headers
+    try:
+        return float(headers.get("Retry-After"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+    """Random delay between 0 and base_delay * 2^attempt seconds ("full jitter")"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Count failures in a row across all threads. When there are `threshold` of
+    them, requests wait `pause` seconds before going to the server again. If the
+    server is still failing after the pause, the next pause is twice as long (up
+    to max_pause). A request that succeeds resets it.
+    """
+
+    def __init__(self, threshold=5, pause=30, max_pause=600):
+        self.threshold = threshold
+        self.pause = pause
+        self.max_pause = max_pause
+        self.next_pause = pause
+        self.failures = 0
+        self.open_until = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Wait until the pause is over, if there is one"""
+        with self.lock:
+            delay = self.open_until - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.next_pause = self.pause
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            now = time.time()
+            if self.failures >= self.threshold and now >= self.open_until:
+                self.failures = 0
+                self.open_until = now + self.next_pause
+                print("The server is not responding. Pausing all requests for " + str(self.next_pause) + " seconds.")
+                self.next_pause = min(self.next_pause * 2, self.max_pause)
+
+
+#Shared by all requests in the program
+BREAKER = CircuitBreaker()
+
+
+def retry_call(function, *args, retries=RETRIES, breaker=BREAKER, retry_if=is_transient, **kwargs):
+    """
+    Call function(*args, **kwargs), retrying errors for which retry_if(error) is
+    True up to `retries` times. Return its result, or raise the last error.
+    """
+    attempt = 0
+    while True:
+        breaker.wait()
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            if not retry_if(e):
+                raise
+            breaker.failure()
+            if attempt >= retries:
+                raise
+            delay = retry_after(e)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            print("Request failed (" + str(e) + "). Retrying in " + str(round(delay, 1)) + " seconds.")
+            time.sleep(delay)
+            attempt += 1
+        else:
+            breaker.success()
+            return result
+
+
+def urlopen(url, *args, **kwargs):
+    """urllib.request.urlopen with retries"""
+    return retry_call(urllib.request.urlopen, url, *args, **kwargs)
+
+
+def urlretrieve(url, filename):
+    """urllib.request.urlretrieve with retries"""
+    return retry_call(urllib.request.urlretrieve, url, filename)
+
+
+class FailureLog:
+    """
+    Items and files that could not be processed, one JSON object per line:
+    {"link_url": ..., "error": ..., "bitstream": ..., "name": ...} ("bitstream" and
+    "name" only for files). Use take() or find() in a later run to retry just those.
+    """
+
+    def __init__(self, failures_path):
+        self.path = failures_path
+        self.lock = threading.Lock()
+
+    def add(self, link_url, error, bitstream=None):
+        """Record a failure. A file that failed before keeps only its latest entry."""
+        entry = {'link_url': link_url, 'error': str(error), 'time': time.strftime("%Y-%m-%d %H:%M:%S")}
+        if bitstream is not None:
+            entry['bitstream'] = bitstream.uuid
+            entry['name'] = bitstream.name
+        with self.lock:
+            if bitstream is not None:
+                self._remove(link_url, bitstream.uuid)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def entries(self):
+        if not path.exists(self.path):
+            return []
+        with open(self.path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def find(self, link_url=None):
+        """Return the entries for link_url (or all entries), leaving them in the file"""
+        with self.lock:
+            return [e for e in self.entries() if link_url is None or e['link_url'] == link_url]
+
+    def remove(self, link_url, bitstream_id):
+        """Remove the entry of a file once it has been processed"""
+        with self.lock:
+            self._remove(link_url, bitstream_id)
+
+    def _remove(self, link_url, bitstream_id):
+        entries = self.entries()
+        kept = [e for e in entries if not (e['link_url'] == link_url and e.get('bitstream') == bitstream_id)]
+        if len(kept) < len(entries):
+            self._write(kept)
+
+    def _write(self, entries):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        replace(temp_path, self.path)
+
+    def take(self, link_url=None):
+        """
+        Remove the entries for link_url (or all entries) from the file and return
+        them. Anything that fails again is added back by the new run.
+        """
+        with self.lock:
+            entries = self.entries()
+            taken = [e for e in entries if link_url is None or e['link_url'] == link_url]
+            self._write([e for e in entries if e not in taken])
+        return taken
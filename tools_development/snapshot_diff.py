@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: Compare the metadata and files of an item with a snapshot saved when
+its curator log was created, to fill in the "Metadata Changes" section of the log.
+The snapshot is saved once, the first time a log is created for the item, so it
+keeps the original metadata from the author. Fields are compared by indexing the
+values of each field, so records with many fields are compared in one pass.
+Files are compared by name and by checksum, to find files that were added,
+removed, replaced (same name, different content) or renamed.
+"""
+
+import json
+from datetime import datetime
+from os import makedirs, replace
+from os import path
+
+
+SNAPSHOT_DIR = ".drum_snapshots"
+CHANGES_HEADER = "Generated from the original metadata snapshot"
+CHANGES_END = "(end of generated changes)"
+SECTION_LINE = "*" * 50
+
+
+def snapshot_path(outputDir, handle_number):
+    return path.join(outputDir, SNAPSHOT_DIR, str(handle_number) + ".json")
+
+
+def make_snapshot(list_metadata, list_bitstream, last_modified=None):
+    """Keep the metadata fields and the ORIGINAL bitstreams of an item"""
+    return {'lastModified': last_modified,
+            'saved': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'metadata': [[x['key'], x['value']] for x in list_metadata],
+            'bitstreams': [[x.name, x.size, x.checksum] for x in list_bitstream if x.bundle == "ORIGINAL"]}
+
+
+def save_snapshot(outputDir, handle_number, snapshot, overwrite=False):
+    """Save a snapshot, unless there is one already (the original is kept)"""
+    file_path = snapshot_path(outputDir, handle_number)
+    if path.exists(file_path) and not overwrite:
+        return False
+    makedirs(path.dirname(file_path), exist_ok=True)
+    with open(file_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=1, ensure_ascii=False)
+    replace(file_path + ".tmp", file_path)
+    return True
+
+
+def load_snapshot(outputDir, handle_number):
+    with open(snapshot_path(outputDir, handle_number), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def index_fields(metadata):
+    """Index metadata [key, value] pairs as key -> list of values, in record order"""
+    index = {}
+    for key, value in metadata:
+        index.setdefault(key, []).append(value)
+    return index
+
+
+def diff_metadata(old_metadata, new_metadata):
+    """
+    Return lists of added [key, value], removed [key, value] and edited
+    [key, old value, new value] fields. Values found in both records are unchanged.
+    The remaining values of a field are paired in order as edits, and any values
+    left over are adds or removes.
+    """
+    old_index = index_fields(old_metadata)
+    new_index = index_fields(new_metadata)
+    added = []
+    removed = []
+    edited = []
+    for key in list(old_index) + [k for k in new_index if k not in old_index]:
+        old_values = old_index.get(key, [])
+        new_values = new_index.get(key, [])
+        #Count the values so that repeated values are matched one for one
+        new_counts = {}
+        for value in new_values:
+            new_counts[value] = new_counts.get(value, 0) + 1
+        old_counts = {}
+        for value in old_values:
+            old_counts[value] = old_counts.get(value, 0) + 1
+        only_old = []
+        for value in old_values:
+            if new_counts.get(value, 0) > 0:
+                new_counts[value] -= 1
+            else:
+                only_old.append(value)
+        only_new = []
+        for value in new_values:
+            if old_counts.get(value, 0) > 0:
+                old_counts[value] -= 1
+            else:
+                only_new.append(value)
+        pairs = min(len(only_old), len(only_new))
+        for i in range(pairs):
+            edited.append([key, only_old[i], only_new[i]])
+        removed.extend([key, value] for value in only_old[pairs:])
+        added.extend([key, value] for value in only_new[pairs:])
+    return added, removed, edited
+
+
+def diff_bitstreams(old_bitstreams, new_bitstreams):
+    """
+    Return lists of added, removed, replaced and renamed files. Files are matched
+    by name first. A file that was removed and a file that was added with the same
+    checksum and size are reported as renamed.
+    """
+    old_by_name = {b[0]: b for b in old_bitstreams}
+    new_by_name = {b[0]: b for b in new_bitstreams}
+    replaced = [[name, old_by_name[name], new_by_name[name]] for name in old_by_name
+                if name in new_by_name and (old_by_name[name][1], old_by_name[name][2]) != (new_by_name[name][1], new_by_name[name][2])]
+    only_old = [b for name, b in old_by_name.items() if name not in new_by_name]
+    only_new = [b for name, b in new_by_name.items() if name not in old_by_name]
+
+    #Index the removed files by content to find renames
+    removed_by_content = {}
+    for b in only_old:
+        if b[2]:
+            removed_by_content.setdefault((b[2], b[1]), []).append(b)
+    renamed = []
+    added = []
+    for b in only_new:
+        matches = removed_by_content.get((b[2], b[1])) if b[2] else None
+        if matches:
+            old = matches.pop(0)
+            renamed.append([old[0], b[0]])
+        else:
+            added.append(b)
+    renamed_old = set(r[0] for r in renamed)
+    removed = [b for b in only_old if b[0] not in renamed_old]
+    return added, removed, replaced, renamed
+
+
+def changes_string(snapshot, list_metadata, list_bitstream):
+    """Describe the differences between a snapshot and the current item for the log"""
+    current = make_snapshot(list_metadata, list_bitstream)
+    added, removed, edited = diff_metadata(snapshot['metadata'], current['metadata'])
+    files_added, files_removed, files_replaced, files_renamed = diff_bitstreams(snapshot['bitstreams'], current['bitstreams'])
+
+    changes = CHANGES_HEADER + " (" + snapshot['saved'] + ") on " + datetime.now().strftime("%Y-%m-%d") + ":\n"
+    if not (added or removed or edited or files_added or files_removed or files_replaced or files_renamed):
+        changes += "No changes found.\n"
+    if edited:
+        changes += "Fields edited:\n"
+        for key, old_value, new_value in edited:
+            changes += "\t" + key + "\n\t\twas: " + old_value + "\n\t\tnow: " + new_value + "\n"
+    if added:
+        changes += "Fields added:\n"
+        for key, value in added:
+            changes += "\t" + key + " : " + value + "\n"
+    if removed:
+        changes += "Fields removed:\n"
+        for key, value in removed:
+            changes += "\t" + key + " : " + value + "\n"
+    if files_added:
+        changes += "Files added:\n"
+        for b in files_added:
+            changes += "\t" + b[0] + "\n"
+    if files_removed:
+        changes += "Files removed:\n"
+        for b in files_removed:
+            changes += "\t" + b[0] + "\n"
+    if files_replaced:
+        changes += "Files replaced (same name, different content):\n"
+        for name, old, new in files_replaced:
+            changes += "\t" + name + "\n"
+    if files_renamed:
+        changes += "Files renamed:\n"
+        for old_name, new_name in files_renamed:
+            changes += "\t" + old_name + " -> " + new_name + "\n"
+    return changes + CHANGES_END + "\n"
+
+
+def fill_changes_section(log_text, changes):
+    """
+    Put the changes at the start of the "Metadata Changes" section of a log. A block
+    written by an earlier run is replaced. Notes typed by the curator are kept.
+    """
+    section_start = "Metadata Changes\n" + SECTION_LINE + "\n"
+    start = log_text.find(section_start)
+    if start < 0:
+        raise ValueError("The log has no Metadata Changes section")
+    start += len(section_start)
+    end = log_text.find("\n" + SECTION_LINE + "\n", start)
+    if end < 0:
+        end = len(log_text)
+    section = log_text[start:end]
+
+    block_start = section.find(CHANGES_HEADER)
+    if block_start >= 0:
+        block_end = section.find(CHANGES_END, block_start)
+        block_end = len(section) if block_end < 0 else block_end + len(CHANGES_END) + 1
+        section = section[:block_start] + section[block_end:]
+    notes = section.strip("\n")
+    if notes:
+        notes = "\n" + notes + "\n"
+    return log_text[:start] + changes + notes + log_text[end:]
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+description: Profile a CSV bitstream on the DRUM server without downloading it.
+The header row (variable names) is read from the first block of the file and the
+number of rows is estimated from a few sampled blocks and the bitstream size
+reported by the API, using HTTP Range requests to /bitstream/<id>/download.
+"""
+
+import csv
+import io
+import urllib.request
+import retry
+
+
+#Size of the block read from the start of the file, and of each sampled block
+HEAD_BYTES = 65536
+BLOCK_BYTES = 65536
+
+
+def read_range(download_url, start, end):
+    """
+    Request bytes start-end (inclusive) of a remote file. Return None if the
+    server ignores the Range header for a block that is not at the start of the file.
+    """
+    request = urllib.request.Request(download_url, headers={"Range": "bytes=" + str(start) + "-" + str(end)})
+    with retry.urlopen(request) as response:
+        #A 200 response means the whole file is being sent. That is only usable for the head.
+        if response.status != 206 and start > 0:
+            return None
+        return response.read(end - start + 1)
+
+
+def count_rows(block, drop_first_line):
+    """
+    Count complete lines in a block of bytes and the number of bytes they take up.
+    A block that starts mid-file begins with a partial line, which is skipped.
+    """
+    first = 0
+    if drop_first_line:
+        first = block.find(b"\n") + 1
+        if first == 0:
+            return 0, 0
+    last = block.rfind(b"\n")
+    if last < first:
+        return 0, 0
+    return block.count(b"\n", first, last + 1), last + 1 - first
+
+
+def fetch_csv_samples(download_url, size_bytes, sample_blocks=4):
+    """
+    Read the head of a remote CSV file and blocks spread evenly across the rest of
+    it. Return them with the file size for profile_csv_samples().
+    """
+    head = read_range(download_url, 0, HEAD_BYTES - 1)
+    blocks = []
+    if size_bytes > len(head):
+        for n in range(1, sample_blocks + 1):
+            start = int((size_bytes - BLOCK_BYTES) * n / sample_blocks)
+            if start <= len(head):
+                continue
+            block = read_range(download_url, start, min(start + BLOCK_BYTES, size_bytes) - 1)
+            if block is None:
+                break
+            blocks.append(block)
+    return {'head': head, 'blocks': blocks, 'size_bytes': size_bytes}
+
+
+def profile_csv_samples(samples):
+    """
+    Return a dictionary with the variable names, delimiter and (estimated) number
+    of rows from the samples read by fetch_csv_samples(). This does no network
+    requests, so it can run in another process.
+    """
+    head = samples['head']
+    size_bytes = samples['size_bytes']
+    head_text = head.decode("utf-8", errors="replace").lstrip("\ufeff")
+
+    #Work out the delimiter from the first few lines and read the header row
+    try:
+        delimiter = csv.Sniffer().sniff(head_text[:8192], delimiters=",;\t|").delimiter
+    except csv.Error:
+        delimiter = ","
+    reader = csv.reader(io.StringIO(head_text), delimiter=delimiter)
+    header = next(reader, [])
+    variables = [name.strip() for name in header]
+
+    #Byte length of the header line, so it is not counted as a row
+    header_end = head.find(b"\n") + 1
+    if header_end == 0:
+        header_end = len(head)
+
+    #Small files are read completely by the first request, so the row count is exact
+    if size_bytes <= len(head):
+        rows = sum(1 for row in reader if row)
+        return {'variables': variables, 'delimiter': delimiter, 'rows': rows, 'estimated': False}
+
+    #Measure the average row length in the head and in the blocks spread across the file
+    sampled_rows, sampled_bytes = count_rows(head[header_end:], False)
+    for block in samples['blocks']:
+        rows, row_bytes = count_rows(block, True)
+        sampled_rows += rows
+        sampled_bytes += row_bytes
+
+    rows = None
+    if sampled_rows:
+        rows = int(round((size_bytes - header_end) / (sampled_bytes / sampled_rows)))
+    return {'variables': variables, 'delimiter': delimiter, 'rows': rows, 'estimated': True}
+
+
+def profile_remote_csv(download_url, size_bytes, sample_blocks=4):
+    """
+    Return a dictionary with the variable names, delimiter and (estimated) number
+    of rows for a remote CSV file. The full file is never downloaded.
+    """
+    return profile_csv_samples(fetch_csv_samples(download_url, size_bytes, sample_blocks))
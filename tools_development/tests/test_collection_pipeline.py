@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Checks for collection_pipeline.py: items are written in input order whatever order
+they are fetched in, and unchanged and failed items are counted and reported.
+The network stages are replaced, so nothing is read from DRUM.
+
+Run from the tools_development folder with: python -m unittest discover tests
+"""
+
+import random
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from os import path
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import collection_pipeline
+
+
+def fake_fetch(handle_url, outputDir, kinds, force, profile_csv):
+    """Items take a random time to fetch, so they reach the writer out of order"""
+    number = int(handle_url.split ("/") [-1])
+    time.sleep(random.uniform(0, 0.02))
+    if number % 7 == 3:
+        raise IOError("server error")
+    #Items whose number ends in 5 have not changed
+    kinds = [] if number % 10 == 5 else ["metadata_log"]
+    return {'handle_url': handle_url, 'handle_number': str(number), 'kinds': kinds}
+
+
+def fake_render(record):
+    #Runs in a worker process
+    return {'metadata_log': "log " + record['handle_number']}
+
+
+class FakeFailures:
+    """Stands in for a retry.FailureLog"""
+
+    def __init__(self):
+        self.entries = []
+
+    def add(self, link_url, error, bitstream=None):
+        self.entries.append(link_url)
+
+
+class CollectionPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.written = []
+        self.saved = (collection_pipeline.fetch_item, collection_pipeline.render_item, collection_pipeline.write_item)
+        collection_pipeline.fetch_item = fake_fetch
+        collection_pipeline.render_item = fake_render
+        collection_pipeline.write_item = self.fake_write
+
+    def tearDown(self):
+        collection_pipeline.fetch_item, collection_pipeline.render_item, collection_pipeline.write_item = self.saved
+        self.folder.cleanup()
+
+    def fake_write(self, record, documents, outputDir):
+        if record['handle_number'] == "8":
+            raise OSError("disk full")
+        self.written.append(record['handle_number'])
+        self.assertEqual(documents, {'metadata_log': "log " + record['handle_number']})
+        #Documents are written by the thread that runs the pipeline, not by the stage threads
+        self.assertIs(threading.current_thread(), threading.main_thread())
+        return [path.join(outputDir, record['handle_number'])]
+
+    def test_items_are_written_in_input_order(self):
+        handle_urls = ["https://hdl.handle.net/11299/" + str(number) for number in range(40)]
+        failures = FakeFailures()
+        written, skipped, failed = collection_pipeline.run_pipeline(handle_urls, self.folder.name, fetch_threads=4, processes=2, queue_size=2, failures=failures)
+
+        fetch_failed = [number for number in range(40) if number % 7 == 3]
+        unchanged = [number for number in range(40) if number % 10 == 5 and number not in fetch_failed]
+        expected = [str(number) for number in range(40) if number not in fetch_failed and number not in unchanged and number != 8]
+        self.assertEqual(self.written, expected)
+        self.assertEqual((written, skipped, failed), (len(expected), len(unchanged), len(fetch_failed) + 1))
+        #Failures are recorded in input order too, including the item that could not be written
+        self.assertEqual(failures.entries, ["https://hdl.handle.net/11299/" + str(number) for number in sorted(fetch_failed + [8])])
+
+    def test_empty_input(self):
+        self.assertEqual(collection_pipeline.run_pipeline([], self.folder.name, processes=1), (0, 0, 0))
+        self.assertEqual(self.written, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Checks for download_plan.py: the download order, the totals and the free space check.
+
+Run from the tools_development folder with: python -m unittest discover tests
+"""
+
+import sys
+import tempfile
+import unittest
+from os import path
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import download_plan
+from bitstream_record import BitstreamRecord
+
+
+def record(name, size):
+    return BitstreamRecord(name, name + "-id", size, "md5-" + name, "MD5")
+
+
+class FakeStore:
+    """Stands in for a content_store.ContentStore that holds some of the files"""
+
+    def __init__(self, names):
+        self.names = names
+
+    def find(self, bitstream):
+        return "/store/" + bitstream.name if bitstream.name in self.names else None
+
+
+class DownloadPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        #Estimates read the recent speeds from a file, so each test uses an empty one
+        self.folder = tempfile.TemporaryDirectory()
+        self.throughput_file = download_plan.THROUGHPUT_FILE
+        download_plan.THROUGHPUT_FILE = path.join(self.folder.name, "throughput.json")
+
+    def tearDown(self):
+        download_plan.THROUGHPUT_FILE = self.throughput_file
+        self.folder.cleanup()
+
+    def test_order_alternates_largest_and_smallest(self):
+        files = [record(name, size) for name, size in (("a", 5), ("b", 1), ("c", 4), ("d", 2), ("e", 3))]
+        ordered = download_plan.order_for_throughput(files)
+        self.assertEqual([b.name for b in ordered], ["a", "b", "c", "d", "e"])
+        self.assertEqual(download_plan.order_for_throughput([]), [])
+
+    def test_plan_keeps_the_order_for_one_file_at_a_time(self):
+        files = [record("small", 1), record("large", 100), record("medium", 10)]
+        plan = download_plan.make_plan(files)
+        self.assertEqual([b.name for b in plan['files']], ["small", "large", "medium"])
+        self.assertEqual(plan['total_bytes'], 111)
+        self.assertIsNone(plan['free_bytes'])
+
+    def test_plan_reorders_for_parallel_files(self):
+        files = [record("small", 1), record("large", 100), record("medium", 10)]
+        plan = download_plan.make_plan(files, parallel_files=3)
+        self.assertEqual([b.name for b in plan['files']], ["large", "small", "medium"])
+
+    def test_stored_files_are_not_downloaded(self):
+        files = [record("a", 100), record("b", 50), record("c", 7)]
+        plan = download_plan.make_plan(files, store=FakeStore({"a", "c"}))
+        self.assertEqual(plan['stored_files'], 2)
+        self.assertEqual(plan['stored_bytes'], 107)
+        self.assertEqual(download_plan.download_bytes(plan), 50)
+
+    def test_free_space_is_read_for_the_target(self):
+        plan = download_plan.make_plan([record("a", 1)], self.folder.name)
+        self.assertGreater(plan['free_bytes'], 0)
+
+    def test_check_space(self):
+        plan = download_plan.make_plan([record("a", 1000)])
+        plan['free_bytes'] = 1000 + download_plan.SPACE_MARGIN
+        download_plan.check_space(plan)
+        plan['free_bytes'] -= 1
+        with self.assertRaises(download_plan.InsufficientSpaceError):
+            download_plan.check_space(plan)
+        self.assertIn("NOT ENOUGH SPACE", download_plan.plan_string(plan))
+
+    def test_stored_files_do_not_need_space(self):
+        plan = download_plan.make_plan([record("a", 1000), record("b", 10)], store=FakeStore({"a"}))
+        plan['free_bytes'] = 10 + download_plan.SPACE_MARGIN
+        download_plan.check_space(plan)
+
+    def test_estimate_from_recent_runs(self):
+        plan = download_plan.make_plan([record("a", 1000)])
+        self.assertIn("Estimated time: unknown", download_plan.plan_string(plan))
+        download_plan.record_throughput(100, 1)
+        download_plan.record_throughput(300, 1)
+        self.assertEqual(download_plan.estimated_seconds(1000), 5)
+        self.assertIn("Estimated time: 00:00:05", download_plan.plan_string(plan))
+
+    def test_only_recent_runs_are_kept(self):
+        for n in range(download_plan.THROUGHPUT_RUNS + 5):
+            download_plan.record_throughput(n + 1, 1)
+        runs = download_plan.load_throughput()
+        self.assertEqual(len(runs), download_plan.THROUGHPUT_RUNS)
+        self.assertEqual(runs[-1], [download_plan.THROUGHPUT_RUNS + 5, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Checks for job_queue.py: claiming, leases, which worker may record a result, and
+the wait before a failed job is tried again.
+
+Run from the tools_development folder with: python -m unittest discover tests
+"""
+
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from os import path
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import job_queue
+from bitstream_record import BitstreamRecord
+
+
+class JobQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.db_path = path.join(self.folder.name, "jobs.sqlite")
+        self.first = self.worker("first:1")
+        self.second = self.worker("second:2")
+
+    def tearDown(self):
+        for queue in (self.first, self.second):
+            queue.connection.close()
+        self.folder.cleanup()
+
+    def worker(self, name):
+        queue = job_queue.JobQueue(self.db_path)
+        queue.worker = name
+        return queue
+
+    def job_row(self, job_id):
+        return self.first.connection.execute("SELECT state, worker, attempts, error, not_before FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def expire_lease(self, job_id):
+        self.first.connection.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time() - job_queue.LEASE_SECONDS - 1, job_id))
+
+    def test_each_job_is_claimed_once(self):
+        self.first.add("https://hdl.handle.net/11299/1", "readme", "out")
+        self.first.add("https://hdl.handle.net/11299/1", "readme", "out")
+        self.first.add("https://hdl.handle.net/11299/2", "readme", "out")
+        claimed = [self.first.claim(), self.second.claim(), self.first.claim()]
+        self.assertEqual(sorted(job['link_url'] for job in claimed[:2]), ["https://hdl.handle.net/11299/1", "https://hdl.handle.net/11299/2"])
+        self.assertIsNone(claimed[2])
+        self.assertEqual(self.job_row(claimed[1]['id'])[:3], ("running", "second:2", 1))
+
+    def test_running_job_is_reclaimed_after_the_lease(self):
+        self.first.add("link", "readme", "out")
+        job = self.first.claim()
+        self.assertIsNone(self.second.claim())
+        self.expire_lease(job['id'])
+        self.assertEqual(self.second.claim()['id'], job['id'])
+        self.assertEqual(self.job_row(job['id'])[:3], ("running", "second:2", 2))
+
+    def test_heartbeat_keeps_the_lease(self):
+        self.first.add("link", "readme", "out")
+        job = self.first.claim()
+        self.expire_lease(job['id'])
+        self.first.heartbeat(job['id'])
+        self.assertIsNone(self.second.claim())
+
+    def test_only_the_worker_holding_the_job_records_the_result(self):
+        self.first.add("link", "readme", "out")
+        job = self.first.claim()
+        self.expire_lease(job['id'])
+        self.second.claim()
+        #The first worker lost the job, so neither of its results is kept
+        self.assertFalse(self.first.finish(job['id']))
+        self.assertFalse(self.first.fail(job['id'], "late"))
+        self.assertEqual(self.job_row(job['id'])[:2], ("running", "second:2"))
+        self.assertTrue(self.second.finish(job['id']))
+        self.assertEqual(self.job_row(job['id'])[:2], ("done", "second:2"))
+        #A finished job cannot be finished or failed again
+        self.assertFalse(self.second.fail(job['id'], "again"))
+        self.assertEqual(self.job_row(job['id'])[0], "done")
+
+    def test_lost_heartbeat_does_not_renew_the_lease(self):
+        self.first.add("link", "readme", "out")
+        job = self.first.claim()
+        self.expire_lease(job['id'])
+        self.second.claim()
+        self.expire_lease(job['id'])
+        self.first.heartbeat(job['id'])
+        self.assertLess(self.first.connection.execute("SELECT heartbeat FROM jobs").fetchone()[0], time.time() - job_queue.LEASE_SECONDS)
+
+    def test_failed_job_waits_longer_after_each_attempt(self):
+        self.first.add("link", "readme", "out")
+        waits = []
+        for attempt in range(1, job_queue.MAX_ATTEMPTS + 1):
+            job = self.first.claim()
+            self.assertIsNotNone(job)
+            before = time.time()
+            self.assertTrue(self.first.fail(job['id'], "error " + str(attempt)))
+            state, worker, attempts, error, not_before = self.job_row(job['id'])
+            self.assertEqual((state, attempts, error), ("failed", attempt, "error " + str(attempt)))
+            waits.append(not_before - before)
+            #Not tried again before the wait is over
+            self.assertIsNone(self.second.claim())
+            self.first.connection.execute("UPDATE jobs SET not_before = ?", (time.time() - 1,))
+        for attempt, wait in enumerate(waits):
+            self.assertAlmostEqual(wait, job_queue.RETRY_SECONDS * 2 ** attempt, delta=1)
+        #After MAX_ATTEMPTS the job stays failed
+        self.assertIsNone(self.first.claim())
+        self.assertIsNone(self.first.next_retry())
+
+    def test_next_retry(self):
+        self.assertIsNone(self.first.next_retry())
+        self.first.add("link", "readme", "out")
+        job = self.first.claim()
+        self.first.fail(job['id'], "error")
+        self.assertAlmostEqual(self.first.next_retry(), time.time() + job_queue.RETRY_SECONDS, delta=1)
+
+    def test_requeue(self):
+        self.first.add("link", "readme", "out")
+        job = self.first.claim()
+        self.first.requeue()
+        self.assertEqual(self.job_row(job['id'])[:2], ("pending", None))
+        self.assertEqual(self.second.claim()['id'], job['id'])
+
+    def test_finished_bitstreams_are_remembered(self):
+        self.first.add("link", "download", "out")
+        job = self.first.claim()
+        progress = job_queue.BitstreamProgress(self.first, job['id'])
+        bitstream = BitstreamRecord("a.csv", "uuid-a", 10)
+        self.assertFalse(progress.is_done(bitstream))
+        progress.mark_done(bitstream)
+        #A restarted run reads the finished bitstreams from the database
+        self.assertTrue(job_queue.BitstreamProgress(self.second, job['id']).is_done(bitstream))
+
+    def test_status(self):
+        self.first.add("link", "readme", "out")
+        self.first.add("link", "datacite_xml", "out")
+        self.first.finish(self.first.claim()['id'])
+        self.assertEqual(self.first.status(), [("datacite_xml", "pending", 1), ("readme", "done", 1)])
+
+    def test_old_database_gets_the_new_column(self):
+        old_path = path.join(self.folder.name, "old.sqlite")
+        connection = sqlite3.connect(old_path)
+        connection.executescript(job_queue.SCHEMA.replace("    not_before REAL,\n", ""))
+        connection.close()
+        queue = job_queue.JobQueue(old_path)
+        queue.add("link", "readme", "out")
+        job = queue.claim()
+        self.assertTrue(queue.fail(job['id'], "error"))
+        queue.connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
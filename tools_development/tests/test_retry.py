@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Checks for retry.py: which errors are retried, the backoff, the circuit breaker
+and the failure log.
+
+Run from the tools_development folder with: python -m unittest discover tests
+"""
+
+import io
+import socket
+import sys
+import tempfile
+import unittest
+import urllib.error
+from os import path
+from unittest import mock
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import requests
+import retry
+from bitstream_record import BitstreamRecord
+
+
+def http_error(status, headers=None):
+    """A requests HTTPError with a response of the given status"""
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.exceptions.HTTPError(str(status), response=response)
+
+
+def urllib_error(status):
+    return urllib.error.HTTPError("https://conservancy.umn.edu", status, "error", {}, io.BytesIO())
+
+
+class FakeClock:
+    """Replaces time.time and time.sleep in retry.py, so pauses take no time"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class IsTransientTest(unittest.TestCase):
+
+    def test_status_codes(self):
+        for status in (408, 429, 500, 502, 503, 504):
+            self.assertTrue(retry.is_transient(http_error(status)), status)
+            self.assertTrue(retry.is_transient(urllib_error(status)), status)
+        for status in (400, 401, 403, 404, 410):
+            self.assertFalse(retry.is_transient(http_error(status)), status)
+            self.assertFalse(retry.is_transient(urllib_error(status)), status)
+
+    def test_connection_errors(self):
+        for error in (requests.exceptions.ConnectionError(), requests.exceptions.ReadTimeout(), requests.exceptions.ChunkedEncodingError(),
+                      ConnectionResetError(), socket.timeout(), urllib.error.URLError("down")):
+            self.assertTrue(retry.is_transient(error), repr(error))
+
+    def test_other_errors(self):
+        for error in (ValueError("bad JSON"), KeyError("name"), OSError("disk full")):
+            self.assertFalse(retry.is_transient(error), repr(error))
+
+
+class DelayTest(unittest.TestCase):
+
+    def test_retry_after(self):
+        self.assertEqual(retry.retry_after(http_error(429, {'Retry-After': "7"})), 7)
+        self.assertIsNone(retry.retry_after(http_error(503)))
+        self.assertIsNone(retry.retry_after(http_error(503, {'Retry-After': "Wed, 21 Oct 2026 07:28:00 GMT"})))
+        self.assertIsNone(retry.retry_after(ValueError()))
+
+    def test_backoff_delay_is_capped(self):
+        for attempt in range(10):
+            delay = retry.backoff_delay(attempt, base_delay=1, max_delay=60)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(60, 2 ** attempt))
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.multiple(retry.time, time=self.clock.time, sleep=self.clock.sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = retry.CircuitBreaker(threshold=3, pause=10, max_pause=25)
+
+    def fail(self, times):
+        with mock.patch("builtins.print"):
+            for x in range(times):
+                self.breaker.failure()
+
+    def test_opens_after_threshold_failures_in_a_row(self):
+        self.fail(2)
+        self.breaker.wait()
+        self.assertEqual(self.clock.sleeps, [])
+        self.fail(1)
+        self.breaker.wait()
+        self.assertEqual(self.clock.sleeps, [10])
+
+    def test_success_resets_the_count(self):
+        self.fail(2)
+        self.breaker.success()
+        self.fail(2)
+        self.breaker.wait()
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_pause_doubles_up_to_max_pause(self):
+        for x in range(3):
+            self.fail(3)
+            self.breaker.wait()
+        self.assertEqual(self.clock.sleeps, [10, 20, 25])
+        self.breaker.success()
+        self.fail(3)
+        self.breaker.wait()
+        self.assertEqual(self.clock.sleeps[-1], 10)
+
+    def test_failures_during_a_pause_do_not_extend_it(self):
+        self.fail(3)
+        self.fail(5)
+        self.breaker.wait()
+        self.assertEqual(self.clock.sleeps, [10])
+
+
+class RetryCallTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        for patcher in (mock.patch.multiple(retry.time, time=self.clock.time, sleep=self.clock.sleep),
+                        mock.patch("builtins.print")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.breaker = retry.CircuitBreaker(threshold=100)
+
+    def test_transient_errors_are_retried(self):
+        function = mock.Mock(side_effect=[http_error(503), requests.exceptions.ConnectionError(), "result"])
+        self.assertEqual(retry.retry_call(function, "a", breaker=self.breaker, key="b"), "result")
+        self.assertEqual(function.call_count, 3)
+        function.assert_called_with("a", key="b")
+        self.assertEqual(len(self.clock.sleeps), 2)
+        self.assertEqual(self.breaker.failures, 0)
+
+    def test_other_errors_are_raised_at_once(self):
+        function = mock.Mock(side_effect=http_error(404))
+        with self.assertRaises(requests.exceptions.HTTPError):
+            retry.retry_call(function, breaker=self.breaker)
+        self.assertEqual(function.call_count, 1)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_gives_up_after_the_retries(self):
+        function = mock.Mock(side_effect=http_error(502))
+        with self.assertRaises(requests.exceptions.HTTPError):
+            retry.retry_call(function, retries=2, breaker=self.breaker)
+        self.assertEqual(function.call_count, 3)
+        self.assertEqual(self.breaker.failures, 3)
+
+    def test_retry_after_is_used(self):
+        function = mock.Mock(side_effect=[http_error(429, {'Retry-After': "12"}), "result"])
+        retry.retry_call(function, breaker=self.breaker)
+        self.assertEqual(self.clock.sleeps, [12])
+
+    def test_retry_if(self):
+        function = mock.Mock(side_effect=[http_error(500), "result"])
+        with self.assertRaises(requests.exceptions.HTTPError):
+            retry.retry_call(function, breaker=self.breaker, retry_if=lambda e: False)
+
+
+class FailureLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.log = retry.FailureLog(path.join(self.folder.name, "failures.jsonl"))
+        self.a = BitstreamRecord("a.csv", "uuid-a", 10)
+        self.b = BitstreamRecord("b.csv", "uuid-b", 10)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_empty_log(self):
+        self.assertEqual(self.log.find(), [])
+        self.assertEqual(self.log.take(), [])
+
+    def test_a_file_keeps_only_its_latest_entry(self):
+        self.log.add("item1", "first", self.a)
+        self.log.add("item1", "second", self.a)
+        self.log.add("item1", "other", self.b)
+        entries = self.log.find("item1")
+        self.assertEqual([(e['bitstream'], e['error']) for e in entries], [("uuid-a", "second"), ("uuid-b", "other")])
+        self.assertEqual(entries[0]['name'], "a.csv")
+
+    def test_find_leaves_the_entries_and_remove_drops_one(self):
+        self.log.add("item1", "error", self.a)
+        self.log.add("item2", "error", self.a)
+        self.assertEqual(len(self.log.find("item1")), 1)
+        self.assertEqual(len(self.log.find()), 2)
+        self.log.remove("item1", "uuid-a")
+        self.assertEqual([e['link_url'] for e in self.log.find()], ["item2"])
+
+    def test_take_removes_the_entries(self):
+        self.log.add("item1", "could not be read")
+        self.log.add("item2", "could not be read")
+        self.assertEqual([e['link_url'] for e in self.log.take("item1")], ["item1"])
+        self.assertEqual([e['link_url'] for e in self.log.take()], ["item2"])
+        self.assertEqual(self.log.find(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
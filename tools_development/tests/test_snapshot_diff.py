@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Checks for snapshot_diff.py: field and file differences, and filling the Metadata
+Changes section of a log.
+
+Run from the tools_development folder with: python -m unittest discover tests
+"""
+
+import sys
+import tempfile
+import unittest
+from os import path
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import snapshot_diff
+from bitstream_record import BitstreamRecord
+
+
+class DiffMetadataTest(unittest.TestCase):
+
+    def test_no_changes(self):
+        metadata = [["dc.title", "Data"], ["dc.subject", "a"], ["dc.subject", "b"]]
+        self.assertEqual(snapshot_diff.diff_metadata(metadata, list(metadata)), ([], [], []))
+
+    def test_reordered_values_are_unchanged(self):
+        old = [["dc.subject", "a"], ["dc.subject", "b"]]
+        new = [["dc.subject", "b"], ["dc.subject", "a"]]
+        self.assertEqual(snapshot_diff.diff_metadata(old, new), ([], [], []))
+
+    def test_edits_adds_and_removes(self):
+        old = [["dc.title", "Data"], ["dc.subject", "a"], ["dc.subject", "b"], ["dc.rights", "CC0"]]
+        new = [["dc.title", "Data set"], ["dc.subject", "a"], ["dc.subject", "c"], ["dc.subject", "d"], ["dc.date.issued", "2026"]]
+        added, removed, edited = snapshot_diff.diff_metadata(old, new)
+        self.assertEqual(edited, [["dc.title", "Data", "Data set"], ["dc.subject", "b", "c"]])
+        self.assertEqual(added, [["dc.subject", "d"], ["dc.date.issued", "2026"]])
+        self.assertEqual(removed, [["dc.rights", "CC0"]])
+
+    def test_repeated_values_are_matched_one_for_one(self):
+        old = [["dc.contributor.author", "Doe, Jane"], ["dc.contributor.author", "Doe, Jane"]]
+        new = [["dc.contributor.author", "Doe, Jane"]]
+        self.assertEqual(snapshot_diff.diff_metadata(old, new), ([], [["dc.contributor.author", "Doe, Jane"]], []))
+
+
+class DiffBitstreamsTest(unittest.TestCase):
+
+    def test_added_removed_replaced_and_renamed(self):
+        old = [["same.csv", 10, "aaa"], ["changed.csv", 20, "bbb"], ["old_name.txt", 30, "ccc"], ["gone.txt", 40, "ddd"]]
+        new = [["same.csv", 10, "aaa"], ["changed.csv", 21, "bbx"], ["new_name.txt", 30, "ccc"], ["new.txt", 50, "eee"]]
+        added, removed, replaced, renamed = snapshot_diff.diff_bitstreams(old, new)
+        self.assertEqual(added, [["new.txt", 50, "eee"]])
+        self.assertEqual(removed, [["gone.txt", 40, "ddd"]])
+        self.assertEqual(replaced, [["changed.csv", ["changed.csv", 20, "bbb"], ["changed.csv", 21, "bbx"]]])
+        self.assertEqual(renamed, [["old_name.txt", "new_name.txt"]])
+
+    def test_files_without_checksums_are_never_renames(self):
+        added, removed, replaced, renamed = snapshot_diff.diff_bitstreams([["a.txt", 5, None]], [["b.txt", 5, None]])
+        self.assertEqual((added, removed, renamed), ([["b.txt", 5, None]], [["a.txt", 5, None]], []))
+
+    def test_two_copies_renamed_to_one(self):
+        old = [["a.txt", 5, "same"], ["b.txt", 5, "same"]]
+        new = [["c.txt", 5, "same"]]
+        added, removed, replaced, renamed = snapshot_diff.diff_bitstreams(old, new)
+        self.assertEqual(renamed, [["a.txt", "c.txt"]])
+        self.assertEqual(removed, [["b.txt", 5, "same"]])
+        self.assertEqual(added, [])
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.metadata = [{'key': "dc.title", 'value': "Data"}]
+        self.bitstreams = [BitstreamRecord("a.csv", "1", 10, "aaa", "MD5"),
+                           BitstreamRecord("license.txt", "2", 5, "lll", "MD5", bundle="LICENSE")]
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_only_original_files_are_kept(self):
+        snapshot = snapshot_diff.make_snapshot(self.metadata, self.bitstreams, "2026-10-01")
+        self.assertEqual(snapshot['metadata'], [["dc.title", "Data"]])
+        self.assertEqual(snapshot['bitstreams'], [["a.csv", 10, "aaa"]])
+
+    def test_the_first_snapshot_is_kept(self):
+        first = snapshot_diff.make_snapshot(self.metadata, self.bitstreams)
+        second = snapshot_diff.make_snapshot([{'key': "dc.title", 'value': "Edited"}], self.bitstreams)
+        self.assertTrue(snapshot_diff.save_snapshot(self.folder.name, "123", first))
+        self.assertFalse(snapshot_diff.save_snapshot(self.folder.name, "123", second))
+        self.assertEqual(snapshot_diff.load_snapshot(self.folder.name, "123")['metadata'], [["dc.title", "Data"]])
+
+    def test_changes_string(self):
+        snapshot = snapshot_diff.make_snapshot(self.metadata, self.bitstreams)
+        changes = snapshot_diff.changes_string(snapshot, [{'key': "dc.title", 'value': "Edited"}], self.bitstreams)
+        self.assertIn("Fields edited:\n\tdc.title\n\t\twas: Data\n\t\tnow: Edited\n", changes)
+        self.assertNotIn("Files", changes)
+        self.assertTrue(changes.endswith(snapshot_diff.CHANGES_END + "\n"))
+        self.assertIn("No changes found.", snapshot_diff.changes_string(snapshot, self.metadata, self.bitstreams))
+
+
+class FillChangesSectionTest(unittest.TestCase):
+
+    LOG = ("Curation log\n" + snapshot_diff.SECTION_LINE + "\nMetadata Changes\n" + snapshot_diff.SECTION_LINE + "\n"
+           "{section}\n" + snapshot_diff.SECTION_LINE + "\nCorrespondence Notes\n")
+
+    def test_changes_are_added_before_the_curator_notes(self):
+        log_text = self.LOG.format(section="\nCurator note\n")
+        changes = snapshot_diff.CHANGES_HEADER + ":\nFirst\n" + snapshot_diff.CHANGES_END + "\n"
+        filled = snapshot_diff.fill_changes_section(log_text, changes)
+        self.assertIn(changes + "\nCurator note\n", filled)
+        self.assertTrue(filled.endswith("Correspondence Notes\n"))
+
+    def test_an_earlier_block_is_replaced(self):
+        log_text = self.LOG.format(section="\nCurator note\n")
+        first = snapshot_diff.CHANGES_HEADER + ":\nFirst\n" + snapshot_diff.CHANGES_END + "\n"
+        second = snapshot_diff.CHANGES_HEADER + ":\nSecond\n" + snapshot_diff.CHANGES_END + "\n"
+        filled = snapshot_diff.fill_changes_section(snapshot_diff.fill_changes_section(log_text, first), second)
+        self.assertNotIn("First", filled)
+        self.assertEqual(filled.count(snapshot_diff.CHANGES_HEADER), 1)
+        self.assertIn(second + "\nCurator note\n", filled)
+
+    def test_log_without_the_section(self):
+        with self.assertRaises(ValueError):
+            snapshot_diff.fill_changes_section("Curation log\n", "changes")
+
+
+if __name__ == "__main__":
+    unittest.main()
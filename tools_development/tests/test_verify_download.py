@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Checks for verify_download.py: how the files of a download folder are sorted into
+ok, missing, extra, truncated, corrupted and unreadable. The bitstream lists are
+made here, so nothing is read from DRUM.
+
+Run from the tools_development folder with: python -m unittest discover tests
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import verify_download
+from bitstream_record import BitstreamRecord
+
+
+class VerifyReportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.download_path = self.folder.name
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def write(self, relative_path, content):
+        file_path = path.join(self.download_path, *relative_path.split("/"))
+        os.makedirs(path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(content)
+
+    def bitstream(self, name, content, algorithm="MD5", bundle="ORIGINAL"):
+        checksum = hashlib.new(verify_download.hash_name(algorithm), content).hexdigest() if algorithm else None
+        return BitstreamRecord(name, name + "-id", len(content), checksum, algorithm, bundle=bundle)
+
+    def verify(self, bitstreams):
+        #Threads are enough here: the files are small
+        report, to_hash = verify_download.compare_sizes(bitstreams, self.download_path)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            return verify_download.add_checksums(report, verify_download.submit_checksums(to_hash, executor))
+
+    def test_every_kind_of_problem(self):
+        self.write("ok.csv", b"1,2,3\n")
+        self.write("short.csv", b"1,2")
+        self.write("long.csv", b"1,2,3,4,5\n")
+        self.write("changed.csv", b"9,9,9\n")
+        self.write("notes.txt", b"not in DRUM")
+        report = self.verify([self.bitstream("ok.csv", b"1,2,3\n"), self.bitstream("short.csv", b"1,2,3\n"),
+                              self.bitstream("long.csv", b"1,2,3\n"), self.bitstream("changed.csv", b"1,2,3\n"),
+                              self.bitstream("missing.csv", b"1,2,3\n")])
+        self.assertEqual(report['ok'], ["ok.csv"])
+        self.assertEqual(report['missing'], ["missing.csv"])
+        self.assertEqual(report['extra'], ["notes.txt"])
+        self.assertEqual(report['truncated'], ["short.csv (3 of 6 bytes)"])
+        self.assertEqual(len(report['corrupted']), 2)
+        self.assertTrue(report['corrupted'][0].startswith("long.csv (10 bytes, expected 6)"))
+        self.assertTrue(report['corrupted'][1].startswith("changed.csv (md5 "))
+        self.assertEqual(report['unreadable'], [])
+        self.assertEqual(verify_download.problem_count(report), 5)
+
+    def test_checksum_algorithms(self):
+        self.write("a.bin", b"a" * 100)
+        self.write("b.bin", b"b" * 100)
+        self.write("empty.bin", b"")
+        report = self.verify([self.bitstream("a.bin", b"a" * 100, "SHA-256"), self.bitstream("b.bin", b"b" * 100, "SHA-1"),
+                              self.bitstream("empty.bin", b"")])
+        self.assertEqual(sorted(report['ok']), ["a.bin", "b.bin", "empty.bin"])
+        self.assertEqual(verify_download.problem_count(report), 0)
+
+    def test_upper_case_checksum_from_drum(self):
+        self.write("a.csv", b"data")
+        bitstream = self.bitstream("a.csv", b"data")
+        bitstream.checksum = bitstream.checksum.upper()
+        self.assertEqual(self.verify([bitstream])['ok'], ["a.csv"])
+
+    def test_without_a_checksum_only_the_size_is_checked(self):
+        self.write("a.csv", b"abcd")
+        self.write("b.csv", b"abcd")
+        unknown = self.bitstream("b.csv", b"wxyz", "MD5")
+        unknown.checksum_algorithm = "CRC32"
+        report = self.verify([self.bitstream("a.csv", b"wxyz", None), unknown])
+        self.assertEqual(sorted(report['ok']), ["a.csv", "b.csv"])
+
+    def test_unreadable_file(self):
+        self.write("a.csv", b"data")
+        report, to_hash = verify_download.compare_sizes([self.bitstream("a.csv", b"data")], self.download_path)
+        os.remove(path.join(self.download_path, "a.csv"))
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            report = verify_download.add_checksums(report, verify_download.submit_checksums(to_hash, executor))
+        self.assertEqual(report['ok'], [])
+        self.assertEqual(len(report['unreadable']), 1)
+        self.assertTrue(report['unreadable'][0].startswith("a.csv ("))
+
+    def test_bag_is_checked_in_data(self):
+        self.write(verify_download.BAG_FILE, b"BagIt-Version: 1.0\n")
+        self.write("manifest-md5.txt", b"")
+        self.write("data/a.csv", b"data")
+        report = self.verify([self.bitstream("a.csv", b"data")])
+        self.assertEqual(report['ok'], ["a.csv"])
+        self.assertEqual(report['extra'], [])
+
+    def test_other_bundles_are_checked_in_their_folder(self):
+        self.write("a.csv", b"data")
+        self.write("LICENSE/license.txt", b"CC0")
+        self.write("unknown/b.txt", b"?")
+        self.assertEqual(verify_download.downloaded_bundles(self.download_path), ("ORIGINAL", "LICENSE", "unknown"))
+        report = self.verify([self.bitstream("a.csv", b"data"), self.bitstream("license.txt", b"CC0", bundle="LICENSE")])
+        self.assertEqual(sorted(report['ok']), ["LICENSE/license.txt", "a.csv"])
+        self.assertEqual(report['extra'], ["unknown/b.txt"])
+
+    def test_report_string_lists_only_the_problems(self):
+        self.write("a.csv", b"data")
+        report = self.verify([self.bitstream("a.csv", b"data"), self.bitstream("z.csv", b"1"), self.bitstream("b.csv", b"1")])
+        self.assertEqual(verify_download.report_string(report),
+                         self.download_path + ": 1 files ok\n  Missing:\n    b.csv\n    z.csv")
+
+
+class HashFileTest(unittest.TestCase):
+
+    def test_hash_file_matches_hashlib(self):
+        with tempfile.TemporaryDirectory() as folder:
+            file_path = path.join(folder, "a.bin")
+            content = os.urandom(1000)
+            with open(file_path, "wb") as f:
+                f.write(content)
+            #A small block size, so the file is read in several pieces
+            self.assertEqual(verify_download.hash_file(file_path, "sha256", block_size=64), hashlib.sha256(content).hexdigest())
+            self.assertEqual(verify_download.md5_file(file_path), hashlib.md5(content).hexdigest())
+
+
+if __name__ == "__main__":
+    unittest.main()
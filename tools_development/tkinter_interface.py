@@ -70,7 +70,7 @@ def click_metadata_log():
     outputDir = tkinter.filedialog.askdirectory()
     if handle_url and outputDir:
         try:
-            metadata_log.metadata_log(handle_url, outputDir)
+            metadata_log.metadata_log(handle_url, outputDir, force=True)
             show_results("Finished creating metadata file for: " + handle_url)
         except:
             show_error("Unable to generate metadata log!")
@@ -85,7 +85,7 @@ def click_readme():
     outputDir = tkinter.filedialog.askdirectory()
     if handle_url and outputDir:
         try:
-            automated_readme.automated_readme(handle_url, outputDir)
+            automated_readme.automated_readme(handle_url, outputDir, force=True)
             show_results("Finished creating readme for: " + handle_url)
         except:
             show_error("Unable to generate README!")
@@ -100,7 +100,7 @@ def click_doi():
     outputDir = tkinter.filedialog.askdirectory()
     if handle_url and outputDir:
         try:
-            datacite_xml.datacite_xml(handle_url, outputDir)
+            datacite_xml.datacite_xml(handle_url, outputDir, force=True)
             show_results("Finished creating DataCite DOI metadata for: " + handle_url)
         except:
             show_error("Unable to generate DOI XML!")
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+script name: verify_download.py
+
+description: Check a folder created by dspace7_download.py against DRUM. The
+bitstream list of the item is read from the API, and the size and checksum (with
+the algorithm DRUM reports, normally MD5) of each local file are compared with the
+values DRUM reports. Files are hashed by a pool of processes, largest first,
+reading each one through a memory map (or large buffered reads where a file cannot
+be mapped). The report lists the files that are missing, extra (not in the item),
+truncated (smaller than expected), corrupted (a different size or checksum) and
+unreadable. BagIt bags are checked in data/. Bundles other than ORIGINAL that
+were downloaded with --bundles (saved in a folder named after the bundle) are
+checked too.
+
+A whole mirror of submission folders can be checked at once. Each folder is
+named with the handle number, so the item is found from the folder name.
+
+example:
+    python verify_download.py https://hdl.handle.net/11299/226188 C:/curation/226188
+    python verify_download.py --mirror D:/drum_mirror --processes 8
+"""
+
+import argparse
+import hashlib
+import mmap
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from os import path
+from bitstream_iterator import iter_bitstreams
+from bitstream_writers import safe_relative_path
+from download_filters import DEFAULT_BUNDLES, saved_name
+import dspace_backend
+
+
+#Bytes hashed at a time
+BLOCK_SIZE = 8 * 1024 * 1024
+HANDLE_PREFIX = "https://hdl.handle.net/11299/"
+#Files written by BagWriter next to data/
+BAG_FILE = "bagit.txt"
+#Kinds of problems listed in a report
+PROBLEMS = ("missing", "extra", "truncated", "corrupted", "unreadable")
+
+
+def hash_name(algorithm):
+    """The hashlib name of a checksum algorithm from the API (e.g. MD5, SHA-256), or None if hashlib does not have it"""
+    name = (algorithm or "").lower().replace("-", "")
+    if name in hashlib.algorithms_available:
+        return name
+    return None
+
+
+def md5_file(file_path, block_size=BLOCK_SIZE):
+    """Return the MD5 checksum of a local file. Runs in a worker process."""
+    return hash_file(file_path, "md5", block_size)
+
+
+def hash_file(file_path, algorithm="md5", block_size=BLOCK_SIZE):
+    """Return the checksum of a local file with a hashlib algorithm. Runs in a worker process."""
+    hasher = hashlib.new(algorithm)
+    with open(file_path, "rb") as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                for start in range(0, len(mapped), block_size):
+                    hasher.update(view[start:start + block_size])
+                view.release()
+            return hasher.hexdigest()
+        except (ValueError, OSError):
+            #Empty files and some network drives cannot be mapped
+            pass
+        f.seek(0)
+        buffer = bytearray(block_size)
+        view = memoryview(buffer)
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            hasher.update(view[:size])
+    return hasher.hexdigest()
+
+
+def payload_folder(download_path):
+    """The folder that holds the files: data/ for a BagIt bag"""
+    if path.isfile(path.join(download_path, BAG_FILE)):
+        return path.join(download_path, "data")
+    return download_path
+
+
+def local_files(folder):
+    """Relative path (with /) -> size of every file under a folder"""
+    files = {}
+    for root, dirs, names in os.walk(folder):
+        for name in names:
+            file_path = path.join(root, name)
+            files[path.relpath(file_path, folder).replace(os.sep, "/")] = path.getsize(file_path)
+    return files
+
+
+def downloaded_bundles(download_path):
+    """
+    The bundles a folder was downloaded from: ORIGINAL, and any bundle that has a
+    folder of its own (see download_filters.py). A folder that is not named after
+    a bundle of the item matches nothing.
+    """
+    folder = payload_folder(download_path)
+    if not path.isdir(folder):
+        return DEFAULT_BUNDLES
+    return DEFAULT_BUNDLES + tuple(name for name in sorted(os.listdir(folder)) if path.isdir(path.join(folder, name)) and name not in DEFAULT_BUNDLES)
+
+
+def list_item_bitstreams(link_url, bundles=DEFAULT_BUNDLES):
+    """The bitstreams of the ORIGINAL bundle (or the given bundles) of a DRUM item, yielded as the pages of the list arrive"""
+    backend = dspace_backend.get_backend("7")
+    return iter_bitstreams(backend.item(backend.item_api_url(link_url)), bundles)
+
+
+def compare_sizes(bitstreams, download_path):
+    """
+    Compare the bitstream list with the files in a download folder without reading
+    them. Return the report so far and the files whose checksum still has to be checked.
+    """
+    folder = payload_folder(download_path)
+    files = local_files(folder)
+    report = {'folder': download_path, 'ok': []}
+    for key in PROBLEMS:
+        report[key] = []
+    to_hash = []
+    for bitstream in bitstreams:
+        relative_path = safe_relative_path(saved_name(bitstream))
+        size_bytes = files.pop(relative_path, None)
+        if size_bytes is None:
+            report['missing'].append(relative_path)
+        elif size_bytes < bitstream.size:
+            report['truncated'].append(relative_path + " (" + str(size_bytes) + " of " + str(bitstream.size) + " bytes)")
+        elif size_bytes > bitstream.size:
+            report['corrupted'].append(relative_path + " (" + str(size_bytes) + " bytes, expected " + str(bitstream.size) + ")")
+        else:
+            to_hash.append((relative_path, path.join(folder, relative_path), size_bytes, bitstream.checksum, hash_name(bitstream.checksum_algorithm)))
+    report['extra'] = sorted(files)
+    return report, to_hash
+
+
+def submit_checksums(to_hash, executor):
+    """Start hashing the files in the pool. Return each file with its future."""
+    #Largest files first, so one big file does not keep the pool waiting at the end
+    to_hash = sorted(to_hash, key=lambda entry: entry[2], reverse=True)
+    #Without a checksum from DRUM in an algorithm hashlib has, only the size can be checked
+    return [(entry, executor.submit(hash_file, entry[1], entry[4]) if entry[3] and entry[4] else None) for entry in to_hash]
+
+
+def add_checksums(report, submitted):
+    """Wait for the hashes and add the files to the report as ok, corrupted or unreadable"""
+    for (relative_path, file_path, size_bytes, expected, algorithm), future in submitted:
+        if future is None:
+            report['ok'].append(relative_path)
+            continue
+        try:
+            checksum = future.result()
+        except Exception as e:
+            #e.g. the file was deleted or cannot be read
+            report['unreadable'].append(relative_path + " (" + str(e) + ")")
+            continue
+        if checksum == expected.lower():
+            report['ok'].append(relative_path)
+        else:
+            report['corrupted'].append(relative_path + " (" + algorithm + " " + checksum + ", expected " + expected + ")")
+    return report
+
+
+def verify_download(link_url, download_path, processes=None):
+    """Check one download folder. Return a report dictionary (see report_string)."""
+    report, to_hash = compare_sizes(list_item_bitstreams(link_url, downloaded_bundles(download_path)), download_path)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return add_checksums(report, submit_checksums(to_hash, executor))
+
+
+def verify_mirror(mirror_path, processes=None):
+    """
+    Check every submission folder (named with a handle number) in a mirror. The
+    files of all the folders are hashed by one pool of processes, which keeps
+    working while the bitstream lists of the next folders are read. Return a list
+    of reports.
+    """
+    pending = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for name in sorted(os.listdir(mirror_path)):
+            download_path = path.join(mirror_path, name)
+            if not (name.isdigit() and path.isdir(download_path)):
+                continue
+            try:
+                report, to_hash = compare_sizes(list_item_bitstreams(HANDLE_PREFIX + name, downloaded_bundles(download_path)), download_path)
+            except Exception as e:
+                print(download_path + " could not be checked (" + str(e) + ")")
+                continue
+            pending.append((report, submit_checksums(to_hash, executor)))
+        reports = []
+        for report, submitted in pending:
+            reports.append(add_checksums(report, submitted))
+            print(report_string(report))
+    return reports
+
+
+def problem_count(report):
+    return sum(len(report[key]) for key in PROBLEMS)
+
+
+def report_string(report):
+    """The report as text, listing only the files with a problem"""
+    text = report['folder'] + ": " + str(len(report['ok'])) + " files ok"
+    for key in PROBLEMS:
+        if report[key]:
+            text += "\n  " + key.capitalize() + ":"
+            for entry in sorted(report[key]):
+                text += "\n    " + entry
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check downloaded DRUM submission folders against the sizes and checksums in DRUM.")
+    parser.add_argument("link_url", nargs="?", help="DRUM URL, handle, or DOI of the submission")
+    parser.add_argument("download_path", nargs="?", help="folder the files were downloaded to")
+    parser.add_argument("--mirror", help="folder of submission folders named with handle numbers: check all of them")
+    parser.add_argument("--processes", type=int, help="number of processes hashing files (default: one per CPU)")
+    dspace_backend.add_arguments(parser, api=False)
+    args = parser.parse_args()
+    dspace_backend.from_args(args)
+
+    if args.mirror:
+        reports = verify_mirror(args.mirror, args.processes)
+    elif args.link_url and args.download_path:
+        reports = [verify_download(args.link_url, args.download_path, args.processes)]
+        print(report_string(reports[0]))
+    else:
+        parser.error("give a link and a folder, or --mirror")
+    problems = sum(problem_count(report) for report in reports)
+    print("Checked " + str(len(reports)) + " folders. " + str(problems) + " files have a problem.")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+script name: watch_collection.py
+
+description: Watch a DRUM collection for new and changed submissions and create the
+curation documents for them automatically, so they are ready when the curator
+opens the ticket. The DSpace 7 search API is polled with the results sorted by
+lastModified, newest first, and reading stops at the last modification time seen
+in the previous poll (the cursor), so only the items that changed are fetched.
+For each of them, the metadata log, readme and DataCite XML are created from the
+DSpace 7 API in a folder named with the UUID of the item.
+
+The cursor is saved in watch_state.json in the output folder, so the watch can be
+stopped and started again without missing or repeating items. The first time it
+runs, it only records the current cursor, unless --since is given.
+
+A different search configuration can be watched with --configuration (e.g. the
+workflow queue, for an account that can see it). The documents are made from the
+UUID of the item, so submissions that have no handle yet get them too.
+
+example:
+    python watch_collection.py 7c6bb4d1-8f3c-4cdb-9ec4-4d58ea8ef9b4 C:/curation --poll 600
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+from os import makedirs, replace
+from os import path
+import dspace_backend
+from dspace_session import get_session
+
+
+#Number of search results requested per page
+PAGE_SIZE = 50
+#Seconds between polls
+POLL_SECONDS = 300
+STATE_FILE = "watch_state.json"
+
+
+def parse_date(date_text):
+    """
+    Read a lastModified value from the API (e.g. 2026-10-19T14:02:11.317Z) or a
+    --since date, in UTC. A date without a time zone is taken to be UTC.
+    """
+    date = datetime.fromisoformat(date_text.replace("Z", "+00:00"))
+    if date.tzinfo is None:
+        return date.replace(tzinfo=timezone.utc)
+    return date.astimezone(timezone.utc)
+
+
+def search_page(scope, page, configuration="default", size=PAGE_SIZE):
+    """Return one page of search results for the scope (a collection or community UUID)"""
+    params = {'dsoType': "ITEM",
+              'sort': "lastModified,DESC",
+              'page': page,
+              'size': size,
+              'configuration': configuration}
+    if scope:
+        params['scope'] = scope
+    #Each poll needs the latest results, so they are not cached
+    backend = dspace_backend.get_backend("7")
+    return backend.client.get_json(backend.search_url, params, cache=False)['_embedded']['searchResult']
+
+
+def result_item(result):
+    """
+    Return the item of a search result. Workflow results are tasks, which hold the
+    workflow item, which holds the item. Links that are not embedded are requested.
+    """
+    found = result['_embedded']['indexableObject']
+    for key in ("workflowitem", "item"):
+        if found.get('type') == "item":
+            break
+        if key in found.get('_embedded', {}):
+            found = found['_embedded'][key]
+        elif key in found.get('_links', {}):
+            found = dspace_backend.get_backend("7").client.get_json(found['_links'][key]['href'], cache=False)
+    if found.get('type') != "item":
+        raise ValueError("The search result has no item (" + str(result['_embedded']['indexableObject'].get('type')) + ")")
+    return found
+
+
+def changed_items(scope, cursor=None, seen=(), configuration="default"):
+    """
+    Return the items modified since the cursor, oldest first. Items modified at the
+    same time as the cursor are returned unless their UUID is in seen (already done).
+    Pages are read newest first and reading stops at the cursor.
+    """
+    cursor_date = parse_date(cursor) if cursor else None
+    items = []
+    page = 0
+    while True:
+        searchResult = search_page(scope, page, configuration)
+        results = searchResult['_embedded']['objects']
+        for result in results:
+            item = result_item(result)
+            modified = parse_date(item['lastModified'])
+            if cursor_date is not None and modified < cursor_date:
+                return items[::-1]
+            if cursor_date is not None and modified == cursor_date and item['uuid'] in seen:
+                continue
+            items.append(item)
+        page += 1
+        if not results or page >= searchResult['page']['totalPages']:
+            return items[::-1]
+
+
+def load_state(state_path):
+    try:
+        with open(state_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(state_path, state):
+    #Write to a temporary file first so a crash does not leave a broken state file
+    with open(state_path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    replace(state_path + ".tmp", state_path)
+
+
+def advance(state, item):
+    """Move the cursor to an item that has been processed"""
+    if state['cursor'] == item['lastModified']:
+        state['seen'].append(item['uuid'])
+    else:
+        state['cursor'] = item['lastModified']
+        state['seen'] = [item['uuid']]
+
+
+def item_url(item):
+    """The DRUM link of an item by its UUID, which the document generators accept like a handle URL"""
+    return get_session().base_url + "/items/" + item['uuid']
+
+
+def generate_documents(link_url, item_dir):
+    """Create the metadata log, readme and DataCite XML for one item. Return the list of errors."""
+    import automated_readme
+    import datacite_xml
+    import metadata_log
+
+    errors = []
+    for name, generator in (("metadata log", metadata_log.metadata_log),
+                            ("readme", automated_readme.automated_readme),
+                            ("DataCite XML", datacite_xml.datacite_xml)):
+        try:
+            generator(link_url, item_dir)
+        except Exception as e:
+            errors.append("Could not create the " + name + " (" + str(e) + ")")
+    return errors
+
+
+def poll(scope, outputDir, state, configuration="default"):
+    """Create the documents for every item changed since the cursor. Return the number of items processed."""
+    state_path = path.join(outputDir, STATE_FILE)
+    items = changed_items(scope, state['cursor'], state['seen'], configuration)
+    for item in items:
+        link_url = item_url(item)
+        item_dir = path.join(outputDir, item['uuid'])
+        makedirs(item_dir, exist_ok=True)
+        print("Creating curation documents for " + link_url + " (modified " + item['lastModified'] + ")")
+        for error in generate_documents(link_url, item_dir):
+            print(error)
+        #The cursor is saved after each item so a restart continues from here
+        advance(state, item)
+        save_state(state_path, state)
+    return len(items)
+
+
+def watch(scope, outputDir, since=None, configuration="default", poll_seconds=POLL_SECONDS, once=False):
+    """Poll the scope until stopped (or once), creating documents for new and changed items"""
+    #The watch reads DSpace 7, so the documents are made from DSpace 7 too
+    dspace_backend.set_api("7")
+    state_path = path.join(outputDir, STATE_FILE)
+    state = load_state(state_path)
+    if state is None:
+        state = {'scope': scope, 'cursor': since, 'seen': []}
+        if since is None:
+            #Start from the most recent change, so only items changed from now on are processed
+            for result in search_page(scope, 0, configuration)['_embedded']['objects']:
+                item = result_item(result)
+                if state['cursor'] is not None and item['lastModified'] != state['cursor']:
+                    break
+                advance(state, item)
+            print("Watching for items changed after " + str(state['cursor']))
+        save_state(state_path, state)
+
+    while True:
+        #An error (e.g. the server is down) ends this poll only. The cursor is kept, so the next poll continues from it.
+        try:
+            count = poll(scope, outputDir, state, configuration)
+            print(datetime.now().strftime("%Y-%m-%d %H:%M:%S") + " " + str(count) + " new or changed items")
+        except Exception as e:
+            print(datetime.now().strftime("%Y-%m-%d %H:%M:%S") + " The poll failed and will be tried again (" + str(e) + ")")
+        if once:
+            return
+        time.sleep(poll_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create curation documents for new and changed DRUM submissions.")
+    parser.add_argument("scope", help="UUID of the collection or community to watch")
+    parser.add_argument("output_dir", help="folder for the curation documents and the watch state")
+    parser.add_argument("--since", help="on the first run, process items modified after this date (e.g. 2026-10-01T00:00:00Z)")
+    parser.add_argument("--configuration", default="default", help="search configuration to watch (e.g. workflow)")
+    parser.add_argument("--poll", type=int, default=POLL_SECONDS, help="seconds between polls")
+    parser.add_argument("--once", action="store_true", help="poll once and exit")
+    dspace_backend.add_arguments(parser, api=False)
+    args = parser.parse_args()
+    if args.since:
+        try:
+            parse_date(args.since)
+        except ValueError:
+            parser.error("--since is not a date: " + args.since)
+    dspace_backend.from_args(args)
+    watch(args.scope, args.output_dir, args.since, args.configuration, args.poll, args.once)
+
+
+if __name__ == "__main__":
+    main()